@@ -0,0 +1,91 @@
+"""This file implements the langchain LLM sending prompts to the batched inference server"""
+
+import itertools
+import json
+import socket
+from typing import Any, Dict, Iterator, List, Optional
+
+from langchain_core.callbacks import CallbackManagerForLLMRun
+from langchain_core.language_models.llms import LLM
+from langchain_core.outputs import GenerationChunk
+
+
+class BatchedInferenceClient(LLM):
+    """
+    A langchain LLM generating with the BatchedInferenceServer of the base station, so
+    many devices share one local model.
+
+    Attributes:
+        host (str): Address of the server.
+        port (int): Port of the server.
+        timeout (float): Seconds to wait for the connection and the answer.
+    """
+
+    host: str = "127.0.0.1"
+    port: int = 8765
+    timeout: float = 30.0
+
+    @property
+    def _llm_type(self) -> str:
+        return "batched_inference_client"
+
+    @property
+    def _identifying_params(self) -> Dict[str, Any]:
+        return {"host": self.host, "port": self.port}
+
+    def _responses(self, prompt: str) -> Iterator[Dict[str, Any]]:
+        """
+        Sends a prompt and yields the response lines until the final one.
+
+        Raises:
+            RuntimeError: If the server answered with an error or closed the connection.
+        """
+        request_id = next(_request_ids)
+        request = json.dumps({"id": request_id, "prompt": prompt}, ensure_ascii=False)
+        with socket.create_connection(
+            (self.host, self.port), timeout=self.timeout
+        ) as connection:
+            connection.sendall(request.encode("utf-8") + b"\n")
+            with connection.makefile("rb") as lines:
+                for line in lines:
+                    response = json.loads(line)
+                    if "error" in response:
+                        raise RuntimeError(
+                            f"inference server error: {response['error']}"
+                        )
+                    yield response
+                    if "text" in response:
+                        return
+        raise RuntimeError("the inference server closed the connection")
+
+    def _call(
+        self,
+        prompt: str,
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> str:
+        """
+        Raises:
+            RuntimeError: If the server answered with an error or closed the connection.
+        """
+        for response in self._responses(prompt):
+            if "text" in response:
+                return response["text"]
+
+    def _stream(
+        self,
+        prompt: str,
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> Iterator[GenerationChunk]:
+        for response in self._responses(prompt):
+            if "delta" in response:
+                chunk = GenerationChunk(text=response["delta"])
+                if run_manager is not None:
+                    run_manager.on_llm_new_token(chunk.text, chunk=chunk)
+                yield chunk
+
+
+_request_ids = itertools.count()
@@ -0,0 +1,370 @@
+"""This file implements a dispatcher racing LLM backends under a latency budget"""
+
+import queue
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from langchain_core.runnables import Runnable, RunnableConfig
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class LLMTimeoutError(TimeoutError):
+    """Raised when no backend answered within the latency budget."""
+
+
+class LLMUnavailableError(RuntimeError):
+    """Raised when every backend failed or has its circuit open."""
+
+
+class CircuitBreaker:
+    """
+    Stops sending calls to a backend after failure_threshold consecutive failures, and
+    lets a single trial call through once reset_timeout has elapsed.
+    """
+
+    def __init__(
+        self,
+        failure_threshold: int = 3,
+        reset_timeout: float = 30.0,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.__clock = clock
+        self.__failures = 0
+        self.__opened_at = None
+        self.__trial_running = False
+        self.__lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        with self.__lock:
+            return self.__state()
+
+    def __state(self) -> str:
+        if self.__opened_at is None:
+            return CLOSED
+        if self.__clock() - self.__opened_at >= self.reset_timeout:
+            return HALF_OPEN
+        return OPEN
+
+    def allow(self) -> bool:
+        """
+        Returns:
+            bool: Whether a call may be sent now, reserving the trial call when half open.
+        """
+        with self.__lock:
+            state = self.__state()
+            if state == CLOSED:
+                return True
+            if state == HALF_OPEN and not self.__trial_running:
+                self.__trial_running = True
+                return True
+            return False
+
+    def record_success(self) -> None:
+        with self.__lock:
+            self.__failures = 0
+            self.__opened_at = None
+            self.__trial_running = False
+
+    def record_failure(self) -> None:
+        with self.__lock:
+            self.__failures += 1
+            if self.__trial_running or self.__failures >= self.failure_threshold:
+                self.__opened_at = self.__clock()
+            self.__trial_running = False
+
+
+class BackendMetrics:
+    """
+    Call counters and a sliding window of latencies of one backend.
+    """
+
+    def __init__(self, window: int = 1000):
+        self.__latencies = deque(maxlen=window)
+        self.__counters = {
+            "calls": 0,
+            "wins": 0,
+            "hedges": 0,
+            "failures": 0,
+            "timeouts": 0,
+        }
+        self.__lock = threading.Lock()
+
+    def count(self, counter: str) -> None:
+        with self.__lock:
+            self.__counters[counter] += 1
+
+    def record_latency(self, seconds: float) -> None:
+        with self.__lock:
+            self.__latencies.append(seconds)
+
+    def snapshot(self) -> Dict[str, float]:
+        """
+        Returns:
+            Dict[str, float]: The counters and the p50, p95 and p99 latencies in seconds.
+        """
+        with self.__lock:
+            snapshot = dict(self.__counters)
+            latencies = sorted(self.__latencies)
+        for name, percentile in [("p50", 0.50), ("p95", 0.95), ("p99", 0.99)]:
+            snapshot[name] = (
+                latencies[min(len(latencies) - 1, int(len(latencies) * percentile))]
+                if latencies
+                else None
+            )
+        return snapshot
+
+
+class HedgedLLMDispatcher(Runnable):
+    """
+    A Runnable sending each call to the first backend, and to the next one when no
+    output arrived after hedge_delay seconds or the previous backend failed. The first
+    backend to produce an output wins, and the call fails once latency_budget elapses
+    without any output.
+
+    Backends whose circuit is open are skipped. Latencies are measured up to the first
+    output, the whole answer for invoke and the first chunk for stream. Losing streams
+    are stopped at their next chunk, and a winning stream fails when it stalls for more
+    than chunk_timeout seconds between chunks.
+
+    Attributes:
+        latency_budget (float): Maximum seconds to wait for an output.
+        hedge_delay (float): Seconds to wait before sending the call to the next backend.
+        chunk_timeout (float): Maximum seconds between two chunks of the winning stream.
+    """
+
+    def __init__(
+        self,
+        backends: List[Tuple[str, Runnable]],
+        latency_budget: float = 10.0,
+        hedge_delay: float = 3.0,
+        failure_threshold: int = 3,
+        reset_timeout: float = 30.0,
+        clock: Callable[[], float] = time.monotonic,
+        chunk_timeout: Optional[float] = None,
+    ):
+        """
+        Initializes the dispatcher.
+
+        Parameters:
+            backends (List[Tuple[str, Runnable]]): Named runnables, in order of preference.
+            latency_budget (float): Maximum seconds to wait for an output.
+            hedge_delay (float): Seconds before hedging with the next backend.
+            failure_threshold (int): Consecutive failures opening a backend circuit.
+            reset_timeout (float): Seconds before an open circuit allows a trial call.
+            clock (Callable): Monotonic time source.
+            chunk_timeout (Optional[float]): Maximum seconds between two chunks of the
+                winning stream, latency_budget if None.
+
+        Raises:
+            ValueError: If there is no backend or the delays are not positive.
+        """
+        if not backends:
+            raise ValueError("at least one backend is required")
+        if latency_budget <= 0 or hedge_delay <= 0:
+            raise ValueError("latency_budget and hedge_delay must be positive")
+        self.latency_budget = latency_budget
+        self.hedge_delay = hedge_delay
+        self.chunk_timeout = latency_budget if chunk_timeout is None else chunk_timeout
+        self.__backends = list(backends)
+        self.__clock = clock
+        self.__breakers = {
+            name: CircuitBreaker(failure_threshold, reset_timeout, clock)
+            for name, _ in backends
+        }
+        self.__metrics = {name: BackendMetrics() for name, _ in backends}
+
+    @property
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        """
+        Returns:
+            Dict[str, Dict[str, Any]]: Per backend counters, latency percentiles and circuit state.
+        """
+        stats = dict()
+        for name, _ in self.__backends:
+            stats[name] = self.__metrics[name].snapshot()
+            stats[name]["circuit"] = self.__breakers[name].state
+        return stats
+
+    def _pump(
+        self,
+        name: str,
+        runnable: Runnable,
+        call: str,
+        input: Any,
+        config: Optional[RunnableConfig],
+        deadline: float,
+        outputs: queue.Queue,
+        cancelled: threading.Event,
+    ) -> None:
+        """
+        Runs one backend call on its own thread and forwards its outputs to the queue,
+        closing the stream at its next chunk once the call is cancelled, e.g. when it lost
+        the race, so it stops generating.
+        """
+        started_at = self.__clock()
+        first_output = True
+        results = None
+        try:
+            if call == "invoke":
+                results = iter([runnable.invoke(input, config)])
+            else:
+                results = runnable.stream(input, config)
+            for result in results:
+                if first_output:
+                    first_output = False
+                    self.__record(name, started_at, deadline)
+                if cancelled.is_set():
+                    return
+                outputs.put((name, "output", result))
+            if first_output:
+                self.__record(name, started_at, deadline)
+            outputs.put((name, "end", None))
+        except Exception as error:
+            if first_output:
+                self.__metrics[name].count("failures")
+                self.__breakers[name].record_failure()
+            outputs.put((name, "error", error))
+        finally:
+            if hasattr(results, "close"):
+                results.close()
+
+    def __record(self, name: str, started_at: float, deadline: float) -> None:
+        now = self.__clock()
+        self.__metrics[name].record_latency(now - started_at)
+        if now > deadline:
+            self.__metrics[name].count("timeouts")
+            self.__breakers[name].record_failure()
+        else:
+            self.__breakers[name].record_success()
+
+    def _race(
+        self, call: str, input: Any, config: Optional[RunnableConfig]
+    ) -> Iterator[Any]:
+        started_at = self.__clock()
+        deadline = started_at + self.latency_budget
+        outputs: queue.Queue = queue.Queue()
+        pending = list(self.__backends)
+        running: Dict[str, threading.Event] = dict()
+        failed: List[Exception] = list()
+
+        def launch_next() -> bool:
+            while pending:
+                name, runnable = pending.pop(0)
+                if not self.__breakers[name].allow():
+                    continue
+                cancelled = threading.Event()
+                running[name] = cancelled
+                self.__metrics[name].count("calls")
+                if len(running) > 1:
+                    self.__metrics[name].count("hedges")
+                threading.Thread(
+                    target=self._pump,
+                    args=(
+                        name,
+                        runnable,
+                        call,
+                        input,
+                        config,
+                        deadline,
+                        outputs,
+                        cancelled,
+                    ),
+                    daemon=True,
+                ).start()
+                return True
+            return False
+
+        winner = None
+        next_hedge_at = started_at
+        chunk_deadline = None
+        try:
+            while True:
+                now = self.__clock()
+                if winner is None:
+                    if now >= next_hedge_at:
+                        if launch_next():
+                            next_hedge_at = now + self.hedge_delay
+                        else:
+                            next_hedge_at = deadline
+                        if not running:
+                            raise LLMUnavailableError(
+                                "every LLM backend has its circuit open"
+                            )
+                    if now >= deadline:
+                        raise LLMTimeoutError(
+                            f"no LLM backend answered within {self.latency_budget}s"
+                        )
+                    timeout = min(next_hedge_at, deadline) - now
+                else:
+                    if now >= chunk_deadline:
+                        raise LLMTimeoutError(
+                            f"the LLM stream stalled for more than {self.chunk_timeout}s"
+                        )
+                    timeout = chunk_deadline - now
+                try:
+                    name, kind, payload = outputs.get(timeout=timeout)
+                except queue.Empty:
+                    continue
+
+                if winner is None:
+                    if kind == "error":
+                        failed.append(payload)
+                        del running[name]
+                        if not running and not pending:
+                            raise LLMUnavailableError(
+                                f"every LLM backend failed: {failed[-1]}"
+                            ) from failed[-1]
+                        if not running:
+                            next_hedge_at = self.__clock()
+                        continue
+                    winner = name
+                    self.__metrics[name].count("wins")
+                    for other, cancelled in running.items():
+                        if other != name:
+                            cancelled.set()
+                if name != winner:
+                    continue
+                if kind == "output":
+                    yield payload
+                    chunk_deadline = self.__clock() + self.chunk_timeout
+                elif kind == "end":
+                    return
+                else:
+                    raise payload
+        finally:
+            for cancelled in running.values():
+                cancelled.set()
+
+    def invoke(
+        self, input: Any, config: Optional[RunnableConfig] = None, **kwargs: Any
+    ) -> Any:
+        """
+        Returns:
+            Any: The output of the first backend answering within the budget.
+
+        Raises:
+            LLMTimeoutError: If no backend answered within the latency budget.
+            LLMUnavailableError: If every backend failed or is unavailable.
+        """
+        for output in self._race("invoke", input, config):
+            return output
+
+    def stream(
+        self, input: Any, config: Optional[RunnableConfig] = None, **kwargs: Any
+    ) -> Iterator[Any]:
+        """
+        Streams the chunks of the first backend producing a chunk within the budget.
+
+        Raises:
+            LLMTimeoutError: If no backend produced a chunk within the latency budget.
+            LLMUnavailableError: If every backend failed or is unavailable.
+        """
+        yield from self._race("stream", input, config)
@@ -0,0 +1,197 @@
+"""This file implements a local LlamaCpp backend that reuses the KV state of the static prompt prefix"""
+
+import hashlib
+import json
+import os
+import pickle
+import threading
+from typing import Any, Dict, Iterator, List, Optional
+
+from langchain_core.callbacks import CallbackManagerForLLMRun
+from langchain_core.language_models.llms import LLM
+from langchain_core.outputs import GenerationChunk
+from langchain_core.prompts import PromptTemplate
+from pydantic import ConfigDict, PrivateAttr
+
+
+def prompt_static_prefix(prompt: PromptTemplate) -> str:
+    """
+    Returns:
+        str: The rendered text of a prompt before its first input variable, which is the
+        same for every call.
+    """
+    template = prompt.template
+    first_variable = min(
+        template.index(f"{{{variable}}}") for variable in prompt.input_variables
+    )
+    return template[:first_variable].replace("{{", "{").replace("}}", "}")
+
+
+class PrefixCachedLlamaCpp(LLM):
+    """
+    A langchain LLM running a GGUF model with llama-cpp-python that keeps the model
+    resident and evaluates the static prefix of the prompt only once.
+
+    The KV state after the prefix is saved next to the model, so restarts load it from
+    disk instead of evaluating it again. Before each call the state is restored when the
+    previous sequence diverged from the prefix, and llama.cpp then only evaluates the
+    tokens after the longest common prefix, i.e. the patient context and the command.
+    llama.cpp models are not thread-safe, so calls on one instance run one at a time.
+
+    Attributes:
+        model_path (str): Path to the .gguf model.
+        static_prefix (str): Text every prompt starts with, see prompt_static_prefix.
+        state_dir (Optional[str]): Where the prefix state is saved, the model directory by default.
+        json_schema (Optional[Dict]): When given, generation is constrained by the GBNF
+            grammar of this JSON schema, so the output is always a valid object.
+    """
+
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    model_path: str
+    static_prefix: str = ""
+    state_dir: Optional[str] = None
+    n_ctx: int = 2048
+    n_threads: int = 8
+    n_batch: int = 512
+    temperature: float = 0.7
+    top_p: float = 0.95
+    max_tokens: int = 256
+    stop: List[str] = ["</s>", "User:", "Assistant:"]
+    use_mlock: bool = True
+    json_schema: Optional[Dict[str, Any]] = None
+    client: Any = None
+
+    _prefix_tokens: List[int] = PrivateAttr(default_factory=list)
+    _prefix_state: Any = PrivateAttr(default=None)
+    _grammar: Any = PrivateAttr(default=None)
+    _lock: Any = PrivateAttr(default_factory=threading.Lock)
+
+    def model_post_init(self, __context: Any) -> None:
+        if self.client is None:
+            from llama_cpp import Llama
+
+            self.client = Llama(
+                model_path=self.model_path,
+                n_ctx=self.n_ctx,
+                n_threads=self.n_threads,
+                n_batch=self.n_batch,
+                use_mlock=self.use_mlock,
+                verbose=False,
+            )
+        if self.json_schema is not None:
+            from llama_cpp import LlamaGrammar
+
+            self._grammar = LlamaGrammar.from_json_schema(
+                json.dumps(self.json_schema), verbose=False
+            )
+        if self.static_prefix:
+            self._prepare_prefix()
+
+    @property
+    def _llm_type(self) -> str:
+        return "prefix_cached_llama_cpp"
+
+    @property
+    def _identifying_params(self) -> Dict[str, Any]:
+        return {
+            "model_path": self.model_path,
+            "n_ctx": self.n_ctx,
+            "temperature": self.temperature,
+            "top_p": self.top_p,
+            "max_tokens": self.max_tokens,
+        }
+
+    @property
+    def prefix_state_path(self) -> str:
+        """
+        Returns:
+            str: The file holding the prefix state, named after the model, the prefix and the context size.
+        """
+        digest = hashlib.sha256(
+            f"{self.n_ctx}\0{self.static_prefix}".encode("utf-8")
+        ).hexdigest()[:16]
+        state_dir = self.state_dir or os.path.dirname(os.path.abspath(self.model_path))
+        return os.path.join(
+            state_dir, f"{os.path.basename(self.model_path)}.{digest}.kv"
+        )
+
+    def _evaluated_tokens(self) -> List[int]:
+        return list(self.client.input_ids[: self.client.n_tokens])
+
+    def _prepare_prefix(self) -> None:
+        """
+        Loads the prefix state from disk, or evaluates the prefix and saves its state.
+        """
+        self._prefix_tokens = list(
+            self.client.tokenize(self.static_prefix.encode("utf-8"), add_bos=True)
+        )
+        path = self.prefix_state_path
+        if os.path.exists(path):
+            try:
+                with open(path, "rb") as state_file:
+                    self.client.load_state(pickle.load(state_file))
+                if self._evaluated_tokens() == self._prefix_tokens:
+                    self._prefix_state = self.client.save_state()
+                    return
+            except (OSError, pickle.UnpicklingError, EOFError, ValueError):
+                pass
+
+        self.client.reset()
+        self.client.eval(self._prefix_tokens)
+        self._prefix_state = self.client.save_state()
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temporary_path = f"{path}.tmp"
+        with open(temporary_path, "wb") as state_file:
+            pickle.dump(self._prefix_state, state_file)
+        os.replace(temporary_path, path)
+
+    def _restore_prefix(self, prompt: str) -> None:
+        if self._prefix_state is None or not prompt.startswith(self.static_prefix):
+            return
+        evaluated = self._evaluated_tokens()
+        if evaluated[: len(self._prefix_tokens)] != self._prefix_tokens:
+            self.client.load_state(self._prefix_state)
+
+    def _completion_kwargs(self, stop: Optional[List[str]], **kwargs) -> Dict[str, Any]:
+        completion_kwargs = {
+            "max_tokens": self.max_tokens,
+            "temperature": self.temperature,
+            "top_p": self.top_p,
+            "stop": stop or self.stop,
+        }
+        if self._grammar is not None:
+            completion_kwargs["grammar"] = self._grammar
+        completion_kwargs.update(kwargs)
+        return completion_kwargs
+
+    def _call(
+        self,
+        prompt: str,
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> str:
+        with self._lock:
+            self._restore_prefix(prompt)
+            completion = self.client.create_completion(
+                prompt, **self._completion_kwargs(stop, **kwargs)
+            )
+        return completion["choices"][0]["text"]
+
+    def _stream(
+        self,
+        prompt: str,
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> Iterator[GenerationChunk]:
+        with self._lock:
+            self._restore_prefix(prompt)
+            for part in self.client.create_completion(
+                prompt, stream=True, **self._completion_kwargs(stop, **kwargs)
+            ):
+                chunk = GenerationChunk(text=part["choices"][0]["text"])
+                if run_manager is not None:
+                    run_manager.on_llm_new_token(chunk.text, chunk=chunk)
+                yield chunk
@@ -0,0 +1,157 @@
+"""This file benchmarks the latency of the database tools before and after the index migrations"""
+
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+from typing import Callable, Dict, List
+
+from sqlalchemy import text
+
+CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
+PARENT_DIR = os.path.dirname(CURRENT_DIR)
+PROJECT_DIR = os.path.dirname(PARENT_DIR)
+sys.path.append(PROJECT_DIR)
+
+from llm_interactions.database.engine_registry import get_engine
+from llm_interactions.database.migrations import (apply_migrations,
+                                                  create_schema)
+from llm_interactions.database.patient_context import (
+    POSTGRES_PATIENT_CONTEXT_QUERY, SQLITE_PATIENT_CONTEXT_QUERY,
+    fetch_patient_context)
+from llm_interactions.database.sqlite_backend import create_sqlite_database
+from llm_interactions.database.synthetic_data import seed_synthetic_data
+from llm_interactions.tools.get_compartment_stock_tool import \
+    get_compartment_stock_by_device
+from llm_interactions.tools.get_diagnoses_tool import get_diagnoses_by_device
+from llm_interactions.tools.get_prescripiton_tool import \
+    get_prescriptions_by_device
+
+
+def _tool_call(tool) -> Callable[[str, str], object]:
+    def call(database_url: str, device_id: str) -> object:
+        return tool.invoke({"database_url": database_url, "device_id": device_id})
+
+    return call
+
+
+BENCHMARKED_TOOLS = {
+    "get_diagnoses_by_device": _tool_call(get_diagnoses_by_device),
+    "get_prescriptions_by_device": _tool_call(get_prescriptions_by_device),
+    "get_compartment_stock_by_device": _tool_call(get_compartment_stock_by_device),
+    "fetch_patient_context": fetch_patient_context,
+}
+
+
+def measure_latencies(
+    database_url: str, device_ids: List[str], repeat: int
+) -> Dict[str, Dict[str, float]]:
+    """
+    Calls every benchmarked tool for the given devices and summarizes the latencies.
+
+    Parameters:
+        database_url (str): A SQLAlchemy-compatible database URL.
+        device_ids (List[str]): The devices queried, one call per device and repetition.
+        repeat (int): How many times each device is queried.
+
+    Returns:
+        Dict[str, Dict[str, float]]: mean, p50 and p95 latency in milliseconds per tool.
+    """
+    report = dict()
+    for name, call in BENCHMARKED_TOOLS.items():
+        call(database_url, device_ids[0])
+        latencies = list()
+        for _ in range(repeat):
+            for device_id in device_ids:
+                started_at = time.perf_counter()
+                call(database_url, device_id)
+                latencies.append((time.perf_counter() - started_at) * 1000)
+        latencies.sort()
+        report[name] = {
+            "mean": statistics.fmean(latencies),
+            "p50": latencies[len(latencies) // 2],
+            "p95": latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))],
+        }
+    return report
+
+
+def explain_patient_context(database_url: str, device_id: str) -> str:
+    """
+    Returns the query plan of the patient context query for one device.
+    """
+    with get_engine(database_url).connect() as connection:
+        if connection.dialect.name == "sqlite":
+            query = text(f"EXPLAIN QUERY PLAN {SQLITE_PATIENT_CONTEXT_QUERY.text}")
+        else:
+            query = text(f"EXPLAIN {POSTGRES_PATIENT_CONTEXT_QUERY.text}")
+        rows = connection.execute(query, {"device_id": device_id}).fetchall()
+    return "\n".join(" | ".join(str(column) for column in row) for row in rows)
+
+
+def print_report(
+    before: Dict[str, Dict[str, float]], after: Dict[str, Dict[str, float]]
+) -> None:
+    print(
+        f"{'tool':<34}{'before p50':>12}{'after p50':>12}{'before p95':>12}{'after p95':>12}{'speedup':>10}"
+    )
+    for name in before:
+        speedup = before[name]["mean"] / after[name]["mean"]
+        print(
+            f"{name:<34}{before[name]['p50']:>10.2f}ms{after[name]['p50']:>10.2f}ms"
+            f"{before[name]['p95']:>10.2f}ms{after[name]['p95']:>10.2f}ms{speedup:>9.1f}x"
+        )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "--database-url",
+        help="url of an EMPTY scratch database, the schema and data are created on it. "
+        "Defaults to a new temporary SQLite file",
+    )
+    parser.add_argument("--seniors", type=int, default=5000)
+    parser.add_argument("--prescriptions-per-senior", type=int, default=10)
+    parser.add_argument("--devices", type=int, default=200)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--explain", action="store_true")
+    args = parser.parse_args()
+
+    print(f"[→] Creating schema and seeding {args.seniors} seniors...")
+    if args.database_url is None:
+        args.database_url, device_ids = create_sqlite_database(
+            num_seniors=args.seniors,
+            migrate=False,
+            seed=args.seed,
+            prescriptions_per_senior=args.prescriptions_per_senior,
+        )
+        print(f"[→] Using {args.database_url}")
+    else:
+        create_schema(args.database_url)
+        device_ids = seed_synthetic_data(
+            args.database_url,
+            num_seniors=args.seniors,
+            prescriptions_per_senior=args.prescriptions_per_senior,
+            seed=args.seed,
+        )
+    device_ids = random.Random(args.seed).sample(
+        device_ids, min(args.devices, len(device_ids))
+    )
+
+    if args.explain:
+        print(explain_patient_context(args.database_url, device_ids[0]))
+    before = measure_latencies(args.database_url, device_ids, args.repeat)
+
+    for migration in apply_migrations(args.database_url):
+        print(f"[✓] Applied {migration}")
+
+    if args.explain:
+        print(explain_patient_context(args.database_url, device_ids[0]))
+    after = measure_latencies(args.database_url, device_ids, args.repeat)
+    print_report(before, after)
+
+
+if __name__ == "__main__":
+    main()
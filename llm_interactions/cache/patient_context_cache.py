@@ -0,0 +1,283 @@
+"""This file implements a per-device cache for the patient context used in the prompts"""
+
+import os
+import sys
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
+PARENT_DIR = os.path.dirname(CURRENT_DIR)
+PROJECT_DIR = os.path.dirname(PARENT_DIR)
+sys.path.append(PROJECT_DIR)
+
+from llm_interactions.database.fleet_context import fetch_fleet_context
+from llm_interactions.database.patient_context import (PatientContext,
+                                                       fetch_patient_context)
+from llm_interactions.tools.async_db_tools import gather_patient_context
+from llm_interactions.tools.get_diagnoses_tool import get_diagnoses_by_device
+from llm_interactions.tools.get_prescripiton_tool import \
+    get_prescriptions_by_device
+
+
+def _tool_loader(tool) -> Callable[[str, str], Any]:
+    def load(database_url: str, device_id: str) -> Any:
+        return tool.invoke({"database_url": database_url, "device_id": device_id})
+
+    return load
+
+
+DEFAULT_LOADERS = {
+    "diagnoses": _tool_loader(get_diagnoses_by_device),
+    "prescriptions": _tool_loader(get_prescriptions_by_device),
+    "context": fetch_patient_context,
+}
+
+DEFAULT_ASYNC_LOADERS = {
+    "context": gather_patient_context,
+}
+
+_MISSING = object()
+
+
+def _is_cacheable(value: Any) -> bool:
+    """
+    The tools report failures as plain strings and unknown devices as None,
+    those must never be cached.
+    """
+    if value is None:
+        return False
+    return not (isinstance(value, str) and value.startswith("Error"))
+
+
+class PatientContextCache:
+    """
+    An in-memory, TTL bounded and LRU evicted cache of patient context sections
+    (diagnoses, prescriptions, ...) keyed by device id.
+
+    Attributes:
+        ttl_seconds (float): How long a cached section stays valid.
+        max_devices (int): Maximum number of devices kept before evicting the least recently used.
+    """
+
+    def __init__(
+        self,
+        ttl_seconds: float = 300.0,
+        max_devices: int = 128,
+        loaders: Optional[Dict[str, Callable[[str, str], Any]]] = None,
+        async_loaders: Optional[Dict[str, Callable[[str, str], Any]]] = None,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        """
+        Initializes the cache.
+
+        Parameters:
+            ttl_seconds (float): Time to live of each cached section, in seconds.
+            max_devices (int): Maximum number of devices held in memory.
+            loaders (Optional[Dict]): Maps a section name to a function(database_url, device_id)
+                that loads it on a miss. Defaults to the diagnoses and prescriptions tools.
+            async_loaders (Optional[Dict]): Same as loaders, with coroutine functions used by aget.
+            clock (Callable): Monotonic time source, replaceable in tests.
+
+        Raises:
+            ValueError: If ttl_seconds or max_devices are not positive.
+        """
+        if ttl_seconds <= 0:
+            raise ValueError(f"ttl_seconds must be positive, got {ttl_seconds}")
+        if max_devices <= 0:
+            raise ValueError(f"max_devices must be positive, got {max_devices}")
+        self.ttl_seconds = ttl_seconds
+        self.max_devices = max_devices
+        self.loaders = dict(DEFAULT_LOADERS if loaders is None else loaders)
+        self.async_loaders = dict(
+            DEFAULT_ASYNC_LOADERS if async_loaders is None else async_loaders
+        )
+        self.__clock = clock
+        self.__entries: "OrderedDict[str, Dict[str, tuple]]" = OrderedDict()
+        self.__listeners: List[
+            Tuple[Callable[[Optional[str]], None], Optional[Sequence[str]]]
+        ] = list()
+        self.__lock = threading.RLock()
+        self.__stats = {"hits": 0, "misses": 0, "evictions": 0, "invalidations": 0}
+
+    @property
+    def stats(self) -> Dict[str, int]:
+        """
+        Returns:
+            Dict[str, int]: hits, misses, evictions, invalidations and cached devices.
+        """
+        with self.__lock:
+            stats = dict(self.__stats)
+            stats["devices"] = len(self.__entries)
+        return stats
+
+    def get(self, section: str, database_url: str, device_id: str) -> Any:
+        """
+        Returns a context section for a device, loading it from the database on a miss.
+
+        Parameters:
+            section (str): The section name, e.g. 'diagnoses' or 'prescriptions'.
+            database_url (str): The database access url.
+            device_id (str): The device identifier associated with the patient.
+
+        Returns:
+            Any: The cached or freshly loaded section value.
+
+        Raises:
+            KeyError: If there is no loader for the section.
+        """
+        value = self.__lookup(section, device_id)
+        if value is not _MISSING:
+            return value
+
+        value = self.loaders[section](database_url, device_id)
+        if _is_cacheable(value):
+            self.put(section, device_id, value)
+        return value
+
+    async def aget(self, section: str, database_url: str, device_id: str) -> Any:
+        """
+        Asyncio equivalent of get, loading misses with the async loaders.
+
+        Raises:
+            KeyError: If there is no async loader for the section.
+        """
+        value = self.__lookup(section, device_id)
+        if value is not _MISSING:
+            return value
+
+        value = await self.async_loaders[section](database_url, device_id)
+        if _is_cacheable(value):
+            self.put(section, device_id, value)
+        return value
+
+    def __lookup(self, section: str, device_id: str) -> Any:
+        with self.__lock:
+            entry = self.__entries.get(device_id)
+            if entry is not None and section in entry:
+                value, stored_at = entry[section]
+                if self.__clock() - stored_at < self.ttl_seconds:
+                    self.__entries.move_to_end(device_id)
+                    self.__stats["hits"] += 1
+                    return value
+            self.__stats["misses"] += 1
+        return _MISSING
+
+    def get_diagnoses(self, database_url: str, device_id: str) -> Any:
+        """
+        Cached equivalent of the get_diagnoses_by_device tool.
+        """
+        return self.get("diagnoses", database_url, device_id)
+
+    def get_prescriptions(self, database_url: str, device_id: str) -> Any:
+        """
+        Cached equivalent of the get_prescriptions_by_device tool.
+        """
+        return self.get("prescriptions", database_url, device_id)
+
+    def get_context(
+        self, database_url: str, device_id: str
+    ) -> Optional[PatientContext]:
+        """
+        Cached equivalent of fetch_patient_context, one round trip on a miss.
+        """
+        return self.get("context", database_url, device_id)
+
+    async def aget_context(
+        self, database_url: str, device_id: str
+    ) -> Optional[PatientContext]:
+        """
+        Cached equivalent of gather_patient_context, concurrent queries on a miss.
+        """
+        return await self.aget("context", database_url, device_id)
+
+    def put(self, section: str, device_id: str, value: Any) -> None:
+        """
+        Stores a section value for a device, evicting the least recently used device if needed.
+
+        Parameters:
+            section (str): The section name.
+            device_id (str): The device identifier.
+            value (Any): The value to store.
+        """
+        with self.__lock:
+            entry = self.__entries.setdefault(device_id, dict())
+            entry[section] = (value, self.__clock())
+            self.__entries.move_to_end(device_id)
+            while len(self.__entries) > self.max_devices:
+                self.__entries.popitem(last=False)
+                self.__stats["evictions"] += 1
+
+    def warm_up(self, database_url: str, device_ids: Optional[List[str]] = None) -> int:
+        """
+        Preloads the context of many devices with the bulk fleet queries, meant to be
+        called once at boot by base stations serving several devices.
+
+        Only the max_devices most recent devices stay cached, size the cache to the fleet.
+
+        Parameters:
+            database_url (str): The database access url.
+            device_ids (Optional[List[str]]): The devices to preload, or None for the whole fleet.
+
+        Returns:
+            int: The number of devices whose context was loaded.
+        """
+        fleet_context = fetch_fleet_context(database_url, device_ids)
+        for device_id, context in fleet_context.items():
+            self.put("context", device_id, context)
+        return len(fleet_context)
+
+    def invalidate(self, device_id: str, section: Optional[str] = None) -> None:
+        """
+        Drops the cached context of a device, call it whenever its data is written.
+
+        Parameters:
+            device_id (str): The device identifier.
+            section (Optional[str]): Only drop this section, or every section if None.
+        """
+        with self.__lock:
+            entry = self.__entries.get(device_id)
+            if entry is not None:
+                if section is None:
+                    del self.__entries[device_id]
+                else:
+                    entry.pop(section, None)
+            self.__stats["invalidations"] += 1
+        self.__notify(device_id, section)
+
+    def invalidate_all(self) -> None:
+        """
+        Drops the cached context of every device.
+        """
+        with self.__lock:
+            self.__entries.clear()
+            self.__stats["invalidations"] += 1
+        self.__notify(None)
+
+    def add_invalidation_listener(
+        self,
+        listener: Callable[[Optional[str]], None],
+        sections: Optional[Sequence[str]] = None,
+    ) -> None:
+        """
+        Registers a callback run after every invalidation, useful for caches derived
+        from the patient context.
+
+        Parameters:
+            listener (Callable): Called with the invalidated device id, or None for all devices.
+            sections (Optional[Sequence[str]]): Only notify the invalidations of these
+                sections, or of whole devices, instead of every invalidation.
+        """
+        self.__listeners.append((listener, sections))
+
+    def __notify(self, device_id: Optional[str], section: Optional[str] = None) -> None:
+        for listener, sections in list(self.__listeners):
+            if section is None or sections is None or section in sections:
+                listener(device_id)
+
+
+patient_context_cache = PatientContextCache(
+    ttl_seconds=float(os.getenv("PATIENT_CONTEXT_TTL", "300")),
+    max_devices=int(os.getenv("PATIENT_CONTEXT_MAX_DEVICES", "128")),
+)
@@ -0,0 +1,240 @@
+"""This file implements a cache of the LLM answers to repeated patient commands"""
+
+import hashlib
+import os
+import sys
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional, Sequence
+
+import numpy as np
+
+CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
+PARENT_DIR = os.path.dirname(CURRENT_DIR)
+PROJECT_DIR = os.path.dirname(PARENT_DIR)
+sys.path.append(PROJECT_DIR)
+
+from llm_interactions.cache.patient_context_cache import patient_context_cache
+from medicine_recognizer.medication_name_index import fold_text
+
+
+def normalize_command(command: str) -> str:
+    """
+    Returns:
+        str: The command lower-cased, without accents and punctuation, so that
+        'Estou com dor de cabeça!' and 'estou com dor de cabeca' share a cache entry.
+    """
+    return fold_text(command)
+
+
+def context_fingerprint(prompt_inputs: Dict[str, str]) -> str:
+    """
+    Hashes the patient context sent to the LLM, any change in the diagnoses or
+    prescriptions yields a different fingerprint.
+
+    Parameters:
+        prompt_inputs (Dict[str, str]): The context inputs of the prompt, e.g. diagnoses and prescriptions.
+
+    Returns:
+        str: The sha256 hex digest of the inputs.
+    """
+    digest = hashlib.sha256()
+    for name in sorted(prompt_inputs):
+        digest.update(name.encode("utf-8"))
+        digest.update(b"\0")
+        digest.update(str(prompt_inputs[name]).encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+class LLMResponseCache:
+    """
+    An in-memory, TTL bounded and LRU evicted cache of parsed LLM responses keyed by the
+    normalized command and the fingerprint of the patient context.
+
+    When an embedding function is given, a command missing the exact lookup is matched
+    against the cached commands of the same context by cosine similarity.
+
+    Attributes:
+        ttl_seconds (float): How long a cached response stays valid.
+        max_entries (int): Maximum number of responses kept before evicting the least recently used.
+        similarity_threshold (float): Minimum cosine similarity of a semantic hit.
+    """
+
+    def __init__(
+        self,
+        ttl_seconds: float = 3600.0,
+        max_entries: int = 512,
+        embed: Optional[Callable[[str], Sequence[float]]] = None,
+        similarity_threshold: float = 0.92,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        """
+        Initializes the cache.
+
+        Parameters:
+            ttl_seconds (float): Time to live of each response, in seconds.
+            max_entries (int): Maximum number of responses held in memory.
+            embed (Optional[Callable]): Maps a normalized command to its embedding vector,
+                e.g. the embed_query method of a langchain Embeddings. Disables the
+                similarity lookup if None.
+            similarity_threshold (float): Minimum cosine similarity, between 0 and 1.
+            clock (Callable): Monotonic time source, replaceable in tests.
+
+        Raises:
+            ValueError: If ttl_seconds or max_entries are not positive, or the threshold
+                is not between 0 and 1.
+        """
+        if ttl_seconds <= 0:
+            raise ValueError(f"ttl_seconds must be positive, got {ttl_seconds}")
+        if max_entries <= 0:
+            raise ValueError(f"max_entries must be positive, got {max_entries}")
+        if not 0 <= similarity_threshold <= 1:
+            raise ValueError(
+                f"similarity_threshold must be between 0 and 1, got {similarity_threshold}"
+            )
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.similarity_threshold = similarity_threshold
+        self.__embed = embed
+        self.__clock = clock
+        self.__entries: "OrderedDict[tuple, Dict[str, Any]]" = OrderedDict()
+        self.__lock = threading.RLock()
+        self.__stats = {
+            "hits": 0,
+            "semantic_hits": 0,
+            "misses": 0,
+            "evictions": 0,
+            "invalidations": 0,
+        }
+
+    @property
+    def stats(self) -> Dict[str, int]:
+        """
+        Returns:
+            Dict[str, int]: hits, semantic_hits, misses, evictions, invalidations and cached entries.
+        """
+        with self.__lock:
+            stats = dict(self.__stats)
+            stats["entries"] = len(self.__entries)
+        return stats
+
+    def _embedding(self, normalized_command: str) -> Optional[np.ndarray]:
+        if self.__embed is None:
+            return None
+        vector = np.asarray(self.__embed(normalized_command), dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def get(self, command: str, context_hash: str) -> Optional[Dict[str, Any]]:
+        """
+        Looks up the response to a command for a patient context.
+
+        Parameters:
+            command (str): The command transcribed from the patient.
+            context_hash (str): The context_fingerprint of the prompt inputs.
+
+        Returns:
+            Optional[Dict[str, Any]]: A copy of the cached parsed response, or None on a miss.
+        """
+        normalized = normalize_command(command)
+        with self.__lock:
+            self.__drop_expired()
+            key = (context_hash, normalized)
+            if key in self.__entries:
+                self.__entries.move_to_end(key)
+                self.__stats["hits"] += 1
+                return dict(self.__entries[key]["response"])
+            has_candidates = any(
+                entry_key[0] == context_hash for entry_key in self.__entries
+            )
+
+        if self.__embed is not None and has_candidates:
+            query = self._embedding(normalized)
+            with self.__lock:
+                best_key, best_similarity = None, self.similarity_threshold
+                for entry_key, entry in self.__entries.items():
+                    if entry_key[0] != context_hash or entry["embedding"] is None:
+                        continue
+                    similarity = float(np.dot(query, entry["embedding"]))
+                    if similarity >= best_similarity:
+                        best_key, best_similarity = entry_key, similarity
+                if best_key is not None:
+                    self.__entries.move_to_end(best_key)
+                    self.__stats["semantic_hits"] += 1
+                    return dict(self.__entries[best_key]["response"])
+
+        with self.__lock:
+            self.__stats["misses"] += 1
+        return None
+
+    def put(
+        self,
+        command: str,
+        context_hash: str,
+        response: Dict[str, Any],
+        device_id: Optional[str] = None,
+    ) -> None:
+        """
+        Stores the parsed response to a command, evicting the least recently used entry if needed.
+
+        Parameters:
+            command (str): The command transcribed from the patient.
+            context_hash (str): The context_fingerprint of the prompt inputs.
+            response (Dict[str, Any]): The parsed LLM response.
+            device_id (Optional[str]): The device the command came from, used by invalidate.
+        """
+        normalized = normalize_command(command)
+        embedding = self._embedding(normalized)
+        with self.__lock:
+            key = (context_hash, normalized)
+            self.__entries[key] = {
+                "response": dict(response),
+                "device_id": device_id,
+                "stored_at": self.__clock(),
+                "embedding": embedding,
+            }
+            self.__entries.move_to_end(key)
+            while len(self.__entries) > self.max_entries:
+                self.__entries.popitem(last=False)
+                self.__stats["evictions"] += 1
+
+    def invalidate(self, device_id: Optional[str] = None) -> None:
+        """
+        Drops the cached responses of a device, or every response if device_id is None.
+        Registered as an invalidation listener of the diagnoses and prescriptions of the
+        patient context cache, stock changes after dispensing keep the responses.
+
+        Parameters:
+            device_id (Optional[str]): The device whose context changed.
+        """
+        with self.__lock:
+            if device_id is None:
+                self.__entries.clear()
+            else:
+                for key in [
+                    key
+                    for key, entry in self.__entries.items()
+                    if entry["device_id"] == device_id
+                ]:
+                    del self.__entries[key]
+            self.__stats["invalidations"] += 1
+
+    def __drop_expired(self) -> None:
+        now = self.__clock()
+        for key in [
+            key
+            for key, entry in self.__entries.items()
+            if now - entry["stored_at"] >= self.ttl_seconds
+        ]:
+            del self.__entries[key]
+
+
+response_cache = LLMResponseCache(
+    ttl_seconds=float(os.getenv("RESPONSE_CACHE_TTL", "3600")),
+    max_entries=int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "512")),
+)
+patient_context_cache.add_invalidation_listener(
+    response_cache.invalidate, sections=("diagnoses", "prescriptions")
+)
@@ -2,6 +2,7 @@
 
 import os
 import sys
+from typing import Any
 
 from dotenv import load_dotenv
 from langchain.chat_models import ChatHuggingFace
@@ -13,22 +14,68 @@ load_dotenv()
 model_path = os.path.join(
     os.path.dirname(__file__), "models", "Nous-Hermes-2-Mistral-7B-DPO.Q4_K_M.gguf"
 )
-"""
-llm = LlamaCpp(
-    model_path=model_path,
-    n_ctx=1024,
-    n_threads=8,
-    temperature=0.7,
-    top_p=0.95,
-    stop=["</s>", "User:", "Assistant:"],
-    chat_format="chatml",
-    verbose=False,
-    use_mlock=True,
-    f16_kv=True,
-    n_batch=512,
-)
-"""
-llm = ChatGoogleGenerativeAI(model="gemini-2.0-flash", temperature=0)
+
+LLM_BACKEND = os.getenv("LLM_BACKEND", "gemini").lower()
+llm_structured_output = os.getenv("LLM_STRUCTURED_OUTPUT", "true").lower() == "true"
+
+LLM_FALLBACK_BACKEND = os.getenv("LLM_FALLBACK_BACKEND", "").lower()
+llm_latency_budget = float(os.getenv("LLM_LATENCY_BUDGET", "10"))
+llm_hedge_delay = float(os.getenv("LLM_HEDGE_DELAY", "3"))
+
+
+def build_llm(backend: str) -> Any:
+    """
+    Parameters:
+        backend (str): 'gemini', 'llamacpp' or 'server', the batched inference server of the base station.
+
+    Returns:
+        Any: The langchain LLM or chat model of the backend.
+
+    Raises:
+        ValueError: If the backend is unknown.
+    """
+    if backend == "llamacpp":
+        from llm_interactions.backends.prefix_cached_llama import (
+            PrefixCachedLlamaCpp, prompt_static_prefix)
+        from llm_interactions.prompt_templates.user_interaction_schema import \
+            USER_INTERACTION_JSON_SCHEMA
+        from llm_interactions.prompt_templates.user_interaction_template import \
+            user_interaction_prompt
+
+        return PrefixCachedLlamaCpp(
+            model_path=os.getenv("LLAMA_MODEL_PATH", model_path),
+            static_prefix=prompt_static_prefix(user_interaction_prompt),
+            n_ctx=2048,
+            n_threads=int(os.getenv("LLAMA_THREADS", "8")),
+            temperature=0.7,
+            top_p=0.95,
+            stop=["</s>", "User:", "Assistant:"],
+            use_mlock=True,
+            n_batch=512,
+            json_schema=USER_INTERACTION_JSON_SCHEMA if llm_structured_output else None,
+        )
+    if backend == "server":
+        from llm_interactions.backends.batched_inference_client import \
+            BatchedInferenceClient
+
+        host, port = os.getenv("LLM_SERVER_ADDRESS", "127.0.0.1:8765").rsplit(":", 1)
+        return BatchedInferenceClient(host=host, port=int(port))
+    if backend == "gemini":
+        return ChatGoogleGenerativeAI(model="gemini-2.0-flash", temperature=0)
+    raise ValueError(
+        f"Unknown LLM backend '{backend}', use 'gemini', 'llamacpp' or 'server'"
+    )
+
+
+llm = build_llm(LLM_BACKEND)
+# Backends raced by the hedged dispatcher, in order of preference
+llm_backends = [(LLM_BACKEND, llm)]
+if LLM_FALLBACK_BACKEND and LLM_FALLBACK_BACKEND != LLM_BACKEND:
+    llm_backends.append((LLM_FALLBACK_BACKEND, build_llm(LLM_FALLBACK_BACKEND)))
+
+# Streaming speaks the suggestion while the answer is generated, and turns off the
+# native structured output of chat models that only yields complete answers
+llm_streaming = os.getenv("LLM_STREAMING", "true").lower() == "true"
 
 
 device_id = "SERENA001"
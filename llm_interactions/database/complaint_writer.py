@@ -0,0 +1,322 @@
+"""This file implements a write-behind queue for the complaint rows logged by the assistant"""
+
+import atexit
+import json
+import os
+import queue
+import sys
+import threading
+import time
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from sqlalchemy import bindparam, text
+from sqlalchemy.exc import InterfaceError, OperationalError
+
+CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
+PARENT_DIR = os.path.dirname(CURRENT_DIR)
+PROJECT_DIR = os.path.dirname(PARENT_DIR)
+sys.path.append(PROJECT_DIR)
+
+from llm_interactions.database.engine_registry import get_session
+
+DEFAULT_SPOOL_PATH = os.path.join(PARENT_DIR, "spool", "complaints.jsonl")
+DEFAULT_DEAD_LETTER_PATH = os.path.join(PARENT_DIR, "spool", "complaints.dead.jsonl")
+
+INSERT_COMPLAINT_QUERY = text(
+    """
+    INSERT INTO complaint (symptom, serena_llm_response, create_time, senior_senior_id, senior_user_user_id)
+    SELECT :symptom, :suggestion, :timestamp, senior_senior_id, senior_user_id
+    FROM serena_device
+    WHERE serena_device_code = :device_id
+    """
+)
+
+KNOWN_DEVICES_QUERY = text(
+    """
+    SELECT serena_device_code
+    FROM serena_device
+    WHERE serena_device_code IN :device_ids
+    """
+).bindparams(bindparam("device_ids", expanding=True))
+
+
+class ComplaintWriteBehindQueue:
+    """
+    Takes complaint rows off the voice path: submit() only enqueues, a background
+    thread inserts them in batches, rows that cannot be written are appended to a
+    local spool file and replayed one by one after the next successful batch. Rows
+    rejected by the database max_attempts times, or whose device is unknown, are moved
+    to a dead letter file, so a bad row never blocks the others.
+
+    Attributes:
+        database_url (str): The database access url.
+        batch_size (int): Maximum number of rows inserted per executemany.
+        flush_interval (float): Maximum time, in seconds, a row waits in memory.
+        spool_path (str): JSON lines file holding the rows not yet written.
+        dead_letter_path (str): JSON lines file holding the rows given up on.
+        max_attempts (int): Replays of a spooled row before it is given up on.
+    """
+
+    def __init__(
+        self,
+        database_url: str,
+        batch_size: int = 50,
+        flush_interval: float = 1.0,
+        spool_path: str = DEFAULT_SPOOL_PATH,
+        dead_letter_path: str = DEFAULT_DEAD_LETTER_PATH,
+        max_attempts: int = 3,
+    ):
+        """
+        Initializes the queue, call start() to launch the writer thread.
+
+        Parameters:
+            database_url (str): The database access url.
+            batch_size (int): Maximum number of rows inserted per executemany.
+            flush_interval (float): Maximum time, in seconds, a row waits in memory.
+            spool_path (str): JSON lines file holding the rows not yet written.
+            dead_letter_path (str): JSON lines file holding the rows given up on.
+            max_attempts (int): Replays of a spooled row before it is given up on.
+
+        Raises:
+            ValueError: If batch_size, flush_interval or max_attempts are not positive.
+        """
+        if batch_size <= 0:
+            raise ValueError(f"batch_size must be positive, got {batch_size}")
+        if flush_interval <= 0:
+            raise ValueError(f"flush_interval must be positive, got {flush_interval}")
+        if max_attempts <= 0:
+            raise ValueError(f"max_attempts must be positive, got {max_attempts}")
+        self.database_url = database_url
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.spool_path = spool_path
+        self.dead_letter_path = dead_letter_path
+        self.max_attempts = max_attempts
+        self.__queue: "queue.Queue[Optional[Dict[str, str]]]" = queue.Queue()
+        self.__thread: Optional[threading.Thread] = None
+        self.__stats = {
+            "submitted": 0,
+            "written": 0,
+            "spooled": 0,
+            "replayed": 0,
+            "dead_lettered": 0,
+            "batches": 0,
+        }
+
+    @property
+    def stats(self) -> Dict[str, int]:
+        """
+        Returns:
+            Dict[str, int]: submitted, written, spooled, replayed and dead lettered rows and the number of batches.
+        """
+        return dict(self.__stats)
+
+    def start(self) -> "ComplaintWriteBehindQueue":
+        """
+        Starts the writer thread and registers close() to run at interpreter exit.
+
+        Returns:
+            ComplaintWriteBehindQueue: The queue itself.
+        """
+        if self.__thread is None:
+            self.__thread = threading.Thread(
+                target=self.__run, name="complaint-writer", daemon=True
+            )
+            self.__thread.start()
+            atexit.register(self.close)
+        return self
+
+    def submit(self, device_id: str, symptom: str, suggestion: str) -> None:
+        """
+        Enqueues a complaint without touching the database.
+
+        Parameters:
+            device_id (str): Device identifier associated with the patient.
+            symptom (str): Symptom reported by the patient.
+            suggestion (str): Assistant's recommendation or treatment suggestion.
+        """
+        self.__stats["submitted"] += 1
+        self.__queue.put(
+            {
+                "device_id": device_id,
+                "symptom": symptom,
+                "suggestion": suggestion,
+                "timestamp": datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S"),
+            }
+        )
+
+    def flush(self) -> None:
+        """
+        Blocks until every submitted row was written or spooled.
+        """
+        if self.__thread is None:
+            self.__write(self.__drain())
+            return
+        self.__queue.join()
+
+    def close(self) -> None:
+        """
+        Flushes the pending rows and stops the writer thread.
+        """
+        if self.__thread is None:
+            self.flush()
+            return
+        self.__queue.put(None)
+        self.__thread.join()
+        self.__thread = None
+        atexit.unregister(self.close)
+
+    def __drain(self) -> List[Dict[str, str]]:
+        rows = list()
+        while True:
+            try:
+                row = self.__queue.get_nowait()
+            except queue.Empty:
+                return rows
+            self.__queue.task_done()
+            if row is not None:
+                rows.append(row)
+
+    def __run(self) -> None:
+        stopping = False
+        while not stopping:
+            rows = list()
+            deadline = None
+            while len(rows) < self.batch_size:
+                timeout = None if deadline is None else deadline - time.monotonic()
+                if timeout is not None and timeout <= 0:
+                    break
+                try:
+                    row = self.__queue.get(timeout=timeout)
+                except queue.Empty:
+                    break
+                if row is None:
+                    stopping = True
+                    self.__queue.task_done()
+                    break
+                rows.append(row)
+                if deadline is None:
+                    deadline = time.monotonic() + self.flush_interval
+            self.__write(rows)
+            for _ in rows:
+                self.__queue.task_done()
+
+    def __write(self, rows: List[Dict[str, str]]) -> None:
+        if rows:
+            session = None
+            try:
+                session = get_session(self.database_url)
+                known_devices = {
+                    device_id
+                    for (device_id,) in session.execute(
+                        KNOWN_DEVICES_QUERY,
+                        {"device_ids": sorted({row["device_id"] for row in rows})},
+                    )
+                }
+                known = [row for row in rows if row["device_id"] in known_devices]
+                unknown = [row for row in rows if row["device_id"] not in known_devices]
+                if known:
+                    session.execute(INSERT_COMPLAINT_QUERY, known)
+                    session.commit()
+            except Exception as e:
+                print(f"Error logging complaints, spooling {len(rows)} rows: {e}")
+                self.__append_spool(rows)
+                self.__stats["spooled"] += len(rows)
+                return
+            finally:
+                if session is not None:
+                    session.close()
+            if unknown:
+                self.__dead_letter(
+                    [json.dumps(row, ensure_ascii=False) for row in unknown],
+                    "unknown device",
+                )
+            self.__stats["written"] += len(known)
+            self.__stats["batches"] += 1
+        self.__replay_spool()
+
+    def __replay_spool(self) -> None:
+        """
+        Inserts the spooled rows one by one, keeping in the spool the ones that failed
+        and moving to the dead letter file the ones that failed max_attempts times,
+        whose device is unknown or that could not be parsed. The spool is rewritten
+        after each row, so a replay interrupted halfway never inserts a row twice. The
+        replay stops without counting an attempt when the database is unreachable.
+        """
+        if not os.path.exists(self.spool_path):
+            return
+        with open(self.spool_path, encoding="utf-8") as spool:
+            lines = [line.strip() for line in spool if line.strip()]
+        kept = list()
+        session = None
+        try:
+            session = get_session(self.database_url)
+            for index, line in enumerate(lines):
+                remaining = lines[index + 1 :]
+                try:
+                    row = json.loads(line)
+                except json.JSONDecodeError:
+                    self.__dead_letter([line], "unparsable row")
+                    self.__rewrite_spool(kept + remaining)
+                    continue
+                values = {key: value for key, value in row.items() if key != "attempts"}
+                try:
+                    result = session.execute(INSERT_COMPLAINT_QUERY, values)
+                    if result.rowcount == 0:
+                        session.rollback()
+                        self.__dead_letter([line], f"unknown device {values}")
+                        self.__rewrite_spool(kept + remaining)
+                        continue
+                    session.commit()
+                except (OperationalError, InterfaceError) as e:
+                    session.rollback()
+                    print(f"Error replaying complaints, keeping the spool: {e}")
+                    self.__rewrite_spool(kept + lines[index:])
+                    return
+                except Exception as e:
+                    session.rollback()
+                    row["attempts"] = row.get("attempts", 0) + 1
+                    if row["attempts"] >= self.max_attempts:
+                        self.__dead_letter(
+                            [json.dumps(row, ensure_ascii=False)],
+                            f"complaint row {values}: {e}",
+                        )
+                    else:
+                        kept.append(json.dumps(row, ensure_ascii=False))
+                    self.__rewrite_spool(kept + remaining)
+                    continue
+                self.__rewrite_spool(kept + remaining)
+                self.__stats["written"] += 1
+                self.__stats["replayed"] += 1
+        except Exception as e:
+            print(f"Error replaying complaints, keeping the spool: {e}")
+        finally:
+            if session is not None:
+                session.close()
+
+    def __rewrite_spool(self, lines: List[str]) -> None:
+        if not lines:
+            if os.path.exists(self.spool_path):
+                os.remove(self.spool_path)
+            return
+        temporary_path = f"{self.spool_path}.tmp"
+        with open(temporary_path, "w", encoding="utf-8") as spool:
+            spool.writelines(line + "\n" for line in lines)
+        os.replace(temporary_path, self.spool_path)
+
+    def __dead_letter(self, lines: List[str], reason: str) -> None:
+        print(f"Giving up on {len(lines)} complaint rows, {reason}")
+        self.__append_lines(self.dead_letter_path, lines)
+        self.__stats["dead_lettered"] += len(lines)
+
+    def __append_spool(self, rows: List[Dict[str, str]]) -> None:
+        self.__append_lines(
+            self.spool_path, [json.dumps(row, ensure_ascii=False) for row in rows]
+        )
+
+    @staticmethod
+    def __append_lines(path: str, lines: List[str]) -> None:
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path, "a", encoding="utf-8") as spool:
+            spool.writelines(line + "\n" for line in lines)
@@ -0,0 +1,249 @@
+"""This file implements a process-wide registry of pooled SQLAlchemy engines"""
+
+import os
+import threading
+import time
+from typing import Any, Dict, Optional
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import Engine, make_url
+from sqlalchemy.ext.asyncio import (AsyncEngine, AsyncSession,
+                                    async_sessionmaker, create_async_engine)
+from sqlalchemy.orm import Session, sessionmaker
+
+DEFAULT_POOL_OPTIONS = {
+    "pool_size": int(os.getenv("DB_POOL_SIZE", "5")),
+    "max_overflow": int(os.getenv("DB_POOL_MAX_OVERFLOW", "5")),
+    "pool_pre_ping": os.getenv("DB_POOL_PRE_PING", "true").lower() == "true",
+    "pool_recycle": int(os.getenv("DB_POOL_RECYCLE", "1800")),
+    "echo": os.getenv("DB_ECHO", "false").lower() == "true",
+}
+
+ASYNC_DRIVERS = {
+    "postgresql": "postgresql+asyncpg",
+    "sqlite": "sqlite+aiosqlite",
+}
+
+_lock = threading.Lock()
+_pool_options: Dict[str, Any] = dict(DEFAULT_POOL_OPTIONS)
+_engines: Dict[str, Engine] = dict()
+_sessionmakers: Dict[str, sessionmaker] = dict()
+_async_engines: Dict[str, AsyncEngine] = dict()
+_async_sessionmakers: Dict[str, async_sessionmaker] = dict()
+_stats: Dict[str, Dict[str, float]] = dict()
+
+
+def _new_stats() -> Dict[str, float]:
+    return {
+        "engine_hits": 0,
+        "engine_misses": 0,
+        "checkouts": 0,
+        "connects": 0,
+        "connect_time_total": 0.0,
+    }
+
+
+def _engine_options(database_url: str) -> Dict[str, Any]:
+    """
+    Builds the create_engine keyword arguments for the given url.
+
+    SQLite in-memory databases use a SingletonThreadPool, which does not accept
+    the QueuePool sizing options, so those are dropped for them.
+    """
+    options = dict(_pool_options)
+    url = make_url(database_url)
+    if url.get_backend_name() == "sqlite" and url.database in (None, "", ":memory:"):
+        options.pop("pool_size", None)
+        options.pop("max_overflow", None)
+        options.pop("pool_recycle", None)
+    return options
+
+
+def _attach_listeners(engine: Engine, stats: Dict[str, float]) -> None:
+    """
+    Registers pool events that feed the checkout and connect counters.
+    """
+
+    @event.listens_for(engine, "do_connect")
+    def _on_do_connect(dialect, connection_record, cargs, cparams):
+        connection_record.info["connect_started_at"] = time.perf_counter()
+
+    @event.listens_for(engine, "connect")
+    def _on_connect(dbapi_connection, connection_record):
+        started_at = connection_record.info.pop("connect_started_at", None)
+        stats["connects"] += 1
+        if started_at is not None:
+            stats["connect_time_total"] += time.perf_counter() - started_at
+
+    @event.listens_for(engine, "checkout")
+    def _on_checkout(dbapi_connection, connection_record, connection_proxy):
+        stats["checkouts"] += 1
+
+
+def configure_pool(**pool_options: Any) -> None:
+    """
+    Overrides the pool options used for engines created from now on.
+
+    Parameters:
+        pool_options: Any of pool_size, max_overflow, pool_pre_ping, pool_recycle or echo.
+
+    Raises:
+        ValueError: If an unknown option is given.
+    """
+    unknown = set(pool_options) - set(DEFAULT_POOL_OPTIONS)
+    if unknown:
+        raise ValueError(f"unknown pool options: {sorted(unknown)}")
+    with _lock:
+        _pool_options.update(pool_options)
+
+
+def get_engine(database_url: str) -> Engine:
+    """
+    Returns the shared engine for a database url, creating it on first use.
+
+    Parameters:
+        database_url (str): A SQLAlchemy-compatible database URL.
+
+    Returns:
+        Engine: The pooled engine shared by every caller using the same url.
+    """
+    engine = _engines.get(database_url)
+    if engine is not None:
+        _stats[database_url]["engine_hits"] += 1
+        return engine
+
+    with _lock:
+        engine = _engines.get(database_url)
+        if engine is not None:
+            _stats[database_url]["engine_hits"] += 1
+            return engine
+        stats = _stats.setdefault(database_url, _new_stats())
+        engine = create_engine(database_url, **_engine_options(database_url))
+        _attach_listeners(engine, stats)
+        stats["engine_misses"] += 1
+        _engines[database_url] = engine
+        _sessionmakers[database_url] = sessionmaker(bind=engine)
+        return engine
+
+
+def get_session(database_url: str) -> Session:
+    """
+    Opens a new session bound to the shared engine of the given url.
+
+    Parameters:
+        database_url (str): A SQLAlchemy-compatible database URL.
+
+    Returns:
+        Session: A session whose connections come from the shared pool.
+    """
+    get_engine(database_url)
+    return _sessionmakers[database_url]()
+
+
+def to_async_url(database_url: str) -> str:
+    """
+    Rewrites a database url so that it uses the asyncio driver of its backend.
+
+    Parameters:
+        database_url (str): A SQLAlchemy-compatible database URL.
+
+    Returns:
+        str: The same url using asyncpg for Postgres or aiosqlite for SQLite.
+
+    Raises:
+        ValueError: If the backend has no known asyncio driver.
+    """
+    url = make_url(database_url)
+    backend = url.get_backend_name()
+    if backend not in ASYNC_DRIVERS:
+        raise ValueError(f"no asyncio driver known for backend '{backend}'")
+    return url.set(drivername=ASYNC_DRIVERS[backend]).render_as_string(
+        hide_password=False
+    )
+
+
+def get_async_engine(database_url: str) -> AsyncEngine:
+    """
+    Returns the shared asyncio engine for a database url, creating it on first use.
+
+    Its counters are reported by get_pool_stats under the asyncio url.
+
+    Parameters:
+        database_url (str): A SQLAlchemy-compatible database URL, sync or async.
+
+    Returns:
+        AsyncEngine: The pooled asyncio engine shared by every caller using the same url.
+    """
+    async_url = to_async_url(database_url)
+    engine = _async_engines.get(async_url)
+    if engine is not None:
+        _stats[async_url]["engine_hits"] += 1
+        return engine
+
+    with _lock:
+        engine = _async_engines.get(async_url)
+        if engine is not None:
+            _stats[async_url]["engine_hits"] += 1
+            return engine
+        stats = _stats.setdefault(async_url, _new_stats())
+        engine = create_async_engine(async_url, **_engine_options(async_url))
+        _attach_listeners(engine.sync_engine, stats)
+        stats["engine_misses"] += 1
+        _async_engines[async_url] = engine
+        _async_sessionmakers[async_url] = async_sessionmaker(bind=engine)
+        return engine
+
+
+def get_async_session(database_url: str) -> AsyncSession:
+    """
+    Opens a new asyncio session bound to the shared asyncio engine of the given url.
+
+    Parameters:
+        database_url (str): A SQLAlchemy-compatible database URL, sync or async.
+
+    Returns:
+        AsyncSession: A session to be used as an async context manager.
+    """
+    get_async_engine(database_url)
+    return _async_sessionmakers[to_async_url(database_url)]()
+
+
+def get_pool_stats(database_url: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Returns the pool counters, for one url or for every registered url.
+
+    Parameters:
+        database_url (Optional[str]): The url to report on, or None for all of them.
+
+    Returns:
+        Dict[str, Any]: engine hits/misses, checkouts, connects, total and mean connect
+        time in seconds, and the current pool status string.
+    """
+    if database_url is None:
+        return {url: get_pool_stats(url) for url in list(_stats)}
+
+    stats = dict(_stats.get(database_url, _new_stats()))
+    connects = stats["connects"]
+    stats["connect_time_mean"] = (
+        stats["connect_time_total"] / connects if connects else 0.0
+    )
+    engine = _engines.get(database_url) or _async_engines.get(database_url)
+    stats["pool_status"] = engine.pool.status() if engine is not None else None
+    return stats
+
+
+def dispose_engines() -> None:
+    """
+    Disposes every registered engine and clears the registry and its counters.
+
+    Asyncio engines are only dropped, their connections belong to the event loop
+    that opened them and are closed when it is.
+    """
+    with _lock:
+        for engine in _engines.values():
+            engine.dispose()
+        _engines.clear()
+        _sessionmakers.clear()
+        _async_engines.clear()
+        _async_sessionmakers.clear()
+        _stats.clear()
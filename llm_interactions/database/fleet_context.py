@@ -0,0 +1,145 @@
+"""This file implements the bulk patient context queries used by base stations"""
+
+import os
+import sys
+from typing import Dict, List, Optional
+
+from sqlalchemy import bindparam, text
+
+CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
+PARENT_DIR = os.path.dirname(CURRENT_DIR)
+PROJECT_DIR = os.path.dirname(PARENT_DIR)
+sys.path.append(PROJECT_DIR)
+
+from llm_interactions.database.engine_registry import get_session
+from llm_interactions.database.patient_context import (CompartmentStock,
+                                                       Diagnosis,
+                                                       PatientContext,
+                                                       PrescriptionItem)
+
+MAX_DEVICES_PER_QUERY = 10000
+
+FLEET_DEVICES_QUERY = """
+    SELECT sd.serena_device_code,
+            sd.senior_senior_id,
+            sd.senior_user_id
+    FROM serena_device sd
+    {where}
+    """
+
+FLEET_DIAGNOSES_QUERY = """
+    SELECT sd.serena_device_code,
+            dd.disease_name,
+            dd.diagnosed_at
+    FROM serena_device sd
+    JOIN disease_diagnosis dd ON dd.senior_senior_id = sd.senior_senior_id
+    {where}
+    ORDER BY dd.disease_diagnosis_id
+    """
+
+FLEET_PRESCRIPTIONS_QUERY = """
+    SELECT sd.serena_device_code,
+            p.prescription_id,
+            pi.medicine_name,
+            pi.dosage,
+            pi.duration_time
+    FROM serena_device sd
+    JOIN prescription p ON p.senior_senior_id = sd.senior_senior_id
+    JOIN prescription_item pi ON p.prescription_id = pi.prescription_prescription_id
+    {where}
+    ORDER BY p.prescription_id, pi.prescription_item_id
+    """
+
+FLEET_STOCK_QUERY = """
+    SELECT sd.serena_device_code,
+            c.stock_id,
+            c.medicine_name,
+            c.amount
+    FROM serena_device sd
+    JOIN compartment c ON c.serena_device_serena_device_code = sd.serena_device_code
+    {where}
+    ORDER BY c.stock_id
+    """
+
+
+def _fleet_query(query: str, filtered: bool):
+    if not filtered:
+        return text(query.format(where=""))
+    return text(
+        query.format(where="WHERE sd.serena_device_code IN :device_ids")
+    ).bindparams(bindparam("device_ids", expanding=True))
+
+
+def _fetch_chunk(session, device_ids: Optional[List[str]]) -> Dict[str, PatientContext]:
+    filtered = device_ids is not None
+    params = {"device_ids": device_ids} if filtered else dict()
+
+    devices = session.execute(
+        _fleet_query(FLEET_DEVICES_QUERY, filtered), params
+    ).fetchall()
+    diagnoses = {row[0]: list() for row in devices}
+    prescriptions = {row[0]: list() for row in devices}
+    stock = {row[0]: list() for row in devices}
+
+    for row in session.execute(_fleet_query(FLEET_DIAGNOSES_QUERY, filtered), params):
+        diagnoses[row[0]].append(Diagnosis(disease_name=row[1], diagnosed_at=row[2]))
+    for row in session.execute(
+        _fleet_query(FLEET_PRESCRIPTIONS_QUERY, filtered), params
+    ):
+        prescriptions[row[0]].append(
+            PrescriptionItem(
+                prescription_id=row[1],
+                medication_name=row[2],
+                dosage=row[3],
+                duration_time=row[4],
+            )
+        )
+    for row in session.execute(_fleet_query(FLEET_STOCK_QUERY, filtered), params):
+        stock[row[0]].append(
+            CompartmentStock(stock_id=row[1], medicine_name=row[2], amount=row[3])
+        )
+
+    return {
+        row[0]: PatientContext(
+            device_id=row[0],
+            senior_id=row[1],
+            user_id=row[2],
+            diagnoses=diagnoses[row[0]],
+            prescriptions=prescriptions[row[0]],
+            stock=stock[row[0]],
+        )
+        for row in devices
+        if row[1] is not None
+    }
+
+
+def fetch_fleet_context(
+    database_url: str, device_ids: Optional[List[str]] = None
+) -> Dict[str, PatientContext]:
+    """
+    Fetches the patient context of many devices with four queries (devices, diagnoses,
+    prescriptions, stock), whatever the number of devices.
+
+    Lists longer than MAX_DEVICES_PER_QUERY are split to stay under the bound
+    parameter limits of the drivers.
+
+    Parameters:
+        database_url (str): A SQLAlchemy-compatible database URL.
+        device_ids (Optional[List[str]]): The device codes to fetch, or None for every device.
+
+    Returns:
+        Dict[str, PatientContext]: The context of every requested device that has a senior.
+    """
+    session = get_session(database_url)
+    try:
+        if device_ids is None:
+            return _fetch_chunk(session, None)
+        fleet_context = dict()
+        unique_ids = list(dict.fromkeys(device_ids))
+        for start in range(0, len(unique_ids), MAX_DEVICES_PER_QUERY):
+            fleet_context.update(
+                _fetch_chunk(session, unique_ids[start : start + MAX_DEVICES_PER_QUERY])
+            )
+        return fleet_context
+    finally:
+        session.close()
@@ -0,0 +1,162 @@
+"""This file implements the schema creation and the versioned migrations runner"""
+
+import os
+import re
+import sys
+from typing import List
+
+from sqlalchemy import text
+
+CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
+PARENT_DIR = os.path.dirname(CURRENT_DIR)
+PROJECT_DIR = os.path.dirname(PARENT_DIR)
+sys.path.append(PROJECT_DIR)
+
+from llm_interactions.database.engine_registry import get_engine
+
+SCHEMA_PATH = os.path.join(PROJECT_DIR, "serana_database.sql")
+MIGRATIONS_DIR = os.path.join(PROJECT_DIR, "migrations")
+MIGRATION_FILE_PATTERN = re.compile(r"^V(\d+)__\w+\.sql$")
+
+# SQLite only aliases the rowid, and so auto-generates ids, for INTEGER PRIMARY KEY columns
+SQLITE_REWRITES = [
+    (re.compile(r"\bSERIAL PRIMARY KEY\b", re.IGNORECASE), "INTEGER PRIMARY KEY")
+]
+
+
+def split_sql_statements(sql: str) -> List[str]:
+    """
+    Splits a SQL script into its statements, dropping '--' comments.
+
+    Parameters:
+        sql (str): The SQL script.
+
+    Returns:
+        List[str]: The non empty statements, without the trailing ';'.
+    """
+    lines = [line.split("--", 1)[0] for line in sql.splitlines()]
+    statements = "\n".join(lines).split(";")
+    return [statement.strip() for statement in statements if statement.strip()]
+
+
+def adapt_statement(statement: str, dialect_name: str) -> str:
+    """
+    Rewrites the PostgreSQL-only parts of a statement for another dialect.
+
+    Parameters:
+        statement (str): The SQL statement, written for PostgreSQL.
+        dialect_name (str): The SQLAlchemy dialect name, e.g. 'postgresql' or 'sqlite'.
+
+    Returns:
+        str: The statement to run on that dialect.
+    """
+    if dialect_name == "sqlite":
+        for pattern, replacement in SQLITE_REWRITES:
+            statement = pattern.sub(replacement, statement)
+    return statement
+
+
+def run_sql_file(database_url: str, path: str) -> None:
+    """
+    Executes every statement of a SQL file in one transaction, adapted to the dialect.
+
+    Parameters:
+        database_url (str): A SQLAlchemy-compatible database URL.
+        path (str): Path to the SQL file.
+    """
+    with open(path, encoding="utf-8") as sql_file:
+        statements = split_sql_statements(sql_file.read())
+    with get_engine(database_url).begin() as connection:
+        for statement in statements:
+            connection.execute(
+                text(adapt_statement(statement, connection.dialect.name))
+            )
+
+
+def create_schema(database_url: str, schema_path: str = SCHEMA_PATH) -> None:
+    """
+    Creates the SERENA tables on an empty database.
+
+    Parameters:
+        database_url (str): A SQLAlchemy-compatible database URL.
+        schema_path (str): Path to the schema script, serana_database.sql by default.
+    """
+    run_sql_file(database_url, schema_path)
+
+
+def list_migrations(migrations_dir: str = MIGRATIONS_DIR) -> List[str]:
+    """
+    Returns the migration files of a directory ordered by version.
+
+    Parameters:
+        migrations_dir (str): Directory holding the V<version>__<name>.sql files.
+
+    Returns:
+        List[str]: The migration file names.
+    """
+    migrations = [
+        name
+        for name in os.listdir(migrations_dir)
+        if MIGRATION_FILE_PATTERN.match(name)
+    ]
+    return sorted(
+        migrations, key=lambda name: int(MIGRATION_FILE_PATTERN.match(name).group(1))
+    )
+
+
+def apply_migrations(
+    database_url: str, migrations_dir: str = MIGRATIONS_DIR
+) -> List[str]:
+    """
+    Applies, in version order, every migration not yet recorded in schema_migrations.
+
+    Parameters:
+        database_url (str): A SQLAlchemy-compatible database URL.
+        migrations_dir (str): Directory holding the V<version>__<name>.sql files.
+
+    Returns:
+        List[str]: The migrations applied by this call.
+    """
+    engine = get_engine(database_url)
+    with engine.begin() as connection:
+        connection.execute(
+            text(
+                """
+                CREATE TABLE IF NOT EXISTS schema_migrations (
+                    version VARCHAR(255) PRIMARY KEY,
+                    applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+                """
+            )
+        )
+        applied = {
+            row[0]
+            for row in connection.execute(text("SELECT version FROM schema_migrations"))
+        }
+
+    newly_applied = list()
+    for name in list_migrations(migrations_dir):
+        if name in applied:
+            continue
+        with open(os.path.join(migrations_dir, name), encoding="utf-8") as sql_file:
+            statements = split_sql_statements(sql_file.read())
+        with engine.begin() as connection:
+            for statement in statements:
+                connection.execute(
+                    text(adapt_statement(statement, connection.dialect.name))
+                )
+            connection.execute(
+                text("INSERT INTO schema_migrations (version) VALUES (:version)"),
+                {"version": name},
+            )
+        newly_applied.append(name)
+    return newly_applied
+
+
+if __name__ == "__main__":
+    from dotenv import load_dotenv
+
+    load_dotenv()
+    DB_URL = f"postgresql://{os.getenv('DB_USER')}:{os.getenv('DB_PASSWORD')}@{os.getenv('DB_HOST')}:{os.getenv('DB_PORT')}/{os.getenv('DB_NAME')}"
+    for migration in apply_migrations(DB_URL):
+        print(f"[✓] Applied {migration}")
@@ -0,0 +1,252 @@
+"""This file implements the single round trip patient context query"""
+
+import json
+import os
+import sys
+from dataclasses import asdict, dataclass, field
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import text
+
+CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
+PARENT_DIR = os.path.dirname(CURRENT_DIR)
+PROJECT_DIR = os.path.dirname(PARENT_DIR)
+sys.path.append(PROJECT_DIR)
+
+from llm_interactions.database.engine_registry import get_session
+
+
+@dataclass(frozen=True)
+class Diagnosis:
+    disease_name: str
+    diagnosed_at: Optional[str]
+
+
+@dataclass(frozen=True)
+class PrescriptionItem:
+    prescription_id: int
+    medication_name: str
+    dosage: Optional[str]
+    duration_time: Optional[int]
+
+
+@dataclass(frozen=True)
+class CompartmentStock:
+    stock_id: int
+    medicine_name: str
+    amount: int
+
+
+@dataclass(frozen=True)
+class PatientContext:
+    """
+    Everything the assistant needs to know about the patient behind a device.
+
+    Attributes:
+        device_id (str): The serena_device_code.
+        senior_id (int): The senior associated with the device.
+        user_id (Optional[int]): The user of the senior, used when logging complaints.
+        diagnoses (List[Diagnosis]): The diseases diagnosed for the senior.
+        prescriptions (List[PrescriptionItem]): Every prescription item of the senior.
+        stock (List[CompartmentStock]): The compartments of the device.
+    """
+
+    device_id: str
+    senior_id: int
+    user_id: Optional[int]
+    diagnoses: List[Diagnosis] = field(default_factory=list)
+    prescriptions: List[PrescriptionItem] = field(default_factory=list)
+    stock: List[CompartmentStock] = field(default_factory=list)
+
+    def diagnoses_json(self) -> str:
+        """
+        Returns:
+            str: The diagnoses in the same JSON layout as the get_diagnoses_by_device tool.
+        """
+        return json.dumps(
+            [asdict(diagnosis) for diagnosis in self.diagnoses],
+            indent=2,
+            ensure_ascii=False,
+        )
+
+    def prescriptions_json(self) -> str:
+        """
+        Returns:
+            str: The prescriptions in the same JSON layout as the get_prescriptions_by_device tool.
+        """
+        if not self.prescriptions:
+            return (
+                f"No prescriptions found for senior with device ID '{self.device_id}'."
+            )
+        return json.dumps(
+            [asdict(item) for item in self.prescriptions],
+            indent=2,
+            ensure_ascii=False,
+        )
+
+    def stock_list(self) -> List[Dict[str, Any]]:
+        """
+        Returns:
+            List[Dict[str, Any]]: The compartments in the layout expected by get_stock_ids_by_name.
+        """
+        return [asdict(compartment) for compartment in self.stock]
+
+
+POSTGRES_PATIENT_CONTEXT_QUERY = text(
+    """
+    WITH device AS (
+        SELECT senior_senior_id AS senior_id,
+                senior_user_id AS user_id
+        FROM serena_device
+        WHERE serena_device_code = :device_id
+    )
+    SELECT d.senior_id,
+            d.user_id,
+            (
+                SELECT COALESCE(json_agg(json_build_object(
+                            'disease_name', dd.disease_name,
+                            'diagnosed_at', dd.diagnosed_at
+                        ) ORDER BY dd.disease_diagnosis_id), '[]'::json)
+                FROM disease_diagnosis dd
+                WHERE dd.senior_senior_id = d.senior_id
+            ) AS diagnoses,
+            (
+                SELECT COALESCE(json_agg(json_build_object(
+                            'prescription_id', p.prescription_id,
+                            'medication_name', pi.medicine_name,
+                            'dosage', pi.dosage,
+                            'duration_time', pi.duration_time
+                        ) ORDER BY p.prescription_id, pi.prescription_item_id), '[]'::json)
+                FROM prescription p
+                JOIN prescription_item pi ON p.prescription_id = pi.prescription_prescription_id
+                WHERE p.senior_senior_id = d.senior_id
+            ) AS prescriptions,
+            (
+                SELECT COALESCE(json_agg(json_build_object(
+                            'stock_id', c.stock_id,
+                            'medicine_name', c.medicine_name,
+                            'amount', c.amount
+                        ) ORDER BY c.stock_id), '[]'::json)
+                FROM compartment c
+                WHERE c.serena_device_serena_device_code = :device_id
+            ) AS stock
+    FROM device d
+    """
+)
+
+SQLITE_PATIENT_CONTEXT_QUERY = text(
+    """
+    WITH device AS (
+        SELECT senior_senior_id AS senior_id,
+                senior_user_id AS user_id
+        FROM serena_device
+        WHERE serena_device_code = :device_id
+    )
+    SELECT d.senior_id,
+            d.user_id,
+            (
+                SELECT json_group_array(json_object(
+                            'disease_name', dd.disease_name,
+                            'diagnosed_at', dd.diagnosed_at
+                        ))
+                FROM (
+                    SELECT disease_name, diagnosed_at
+                    FROM disease_diagnosis
+                    WHERE senior_senior_id = d.senior_id
+                    ORDER BY disease_diagnosis_id
+                ) dd
+            ) AS diagnoses,
+            (
+                SELECT json_group_array(json_object(
+                            'prescription_id', pp.prescription_id,
+                            'medication_name', pp.medicine_name,
+                            'dosage', pp.dosage,
+                            'duration_time', pp.duration_time
+                        ))
+                FROM (
+                    SELECT p.prescription_id,
+                            pi.medicine_name,
+                            pi.dosage,
+                            pi.duration_time
+                    FROM prescription p
+                    JOIN prescription_item pi ON p.prescription_id = pi.prescription_prescription_id
+                    WHERE p.senior_senior_id = d.senior_id
+                    ORDER BY p.prescription_id, pi.prescription_item_id
+                ) pp
+            ) AS prescriptions,
+            (
+                SELECT json_group_array(json_object(
+                            'stock_id', c.stock_id,
+                            'medicine_name', c.medicine_name,
+                            'amount', c.amount
+                        ))
+                FROM (
+                    SELECT stock_id, medicine_name, amount
+                    FROM compartment
+                    WHERE serena_device_serena_device_code = :device_id
+                    ORDER BY stock_id
+                ) c
+            ) AS stock
+    FROM device d
+    """
+)
+
+
+def _load_json_column(value: Any) -> List[Dict[str, Any]]:
+    """
+    Postgres drivers decode json columns, SQLite returns them as text.
+    """
+    if value is None:
+        return list()
+    if isinstance(value, str):
+        return json.loads(value)
+    return value
+
+
+def build_patient_context(device_id: str, row: Any) -> PatientContext:
+    """
+    Builds a PatientContext from a row of the patient context query.
+
+    Parameters:
+        device_id (str): The device identifier the row belongs to.
+        row: A row with senior_id, user_id, diagnoses, prescriptions and stock columns.
+
+    Returns:
+        PatientContext: The typed patient context.
+    """
+    return PatientContext(
+        device_id=device_id,
+        senior_id=row[0],
+        user_id=row[1],
+        diagnoses=[Diagnosis(**item) for item in _load_json_column(row[2])],
+        prescriptions=[PrescriptionItem(**item) for item in _load_json_column(row[3])],
+        stock=[CompartmentStock(**item) for item in _load_json_column(row[4])],
+    )
+
+
+def fetch_patient_context(
+    database_url: str, device_id: str
+) -> Optional[PatientContext]:
+    """
+    Resolves the senior, diagnoses, prescriptions and compartment stock of a device
+    in a single statement.
+
+    Parameters:
+        database_url (str): A SQLAlchemy-compatible database URL.
+        device_id (str): The code of the Serena device (serena_device_code).
+
+    Returns:
+        Optional[PatientContext]: The patient context, or None if no senior uses the device.
+    """
+    session = get_session(database_url)
+    try:
+        if session.get_bind().dialect.name == "sqlite":
+            query = SQLITE_PATIENT_CONTEXT_QUERY
+        else:
+            query = POSTGRES_PATIENT_CONTEXT_QUERY
+        row = session.execute(query, {"device_id": device_id}).fetchone()
+        if row is None:
+            return None
+        return build_patient_context(device_id, row)
+    finally:
+        session.close()
@@ -0,0 +1,92 @@
+"""This file implements an offline SQLite stand-in for the SERENA PostgreSQL database"""
+
+import argparse
+import os
+import sys
+import tempfile
+from typing import List, Optional, Tuple
+
+CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
+PARENT_DIR = os.path.dirname(CURRENT_DIR)
+PROJECT_DIR = os.path.dirname(PARENT_DIR)
+sys.path.append(PROJECT_DIR)
+
+from llm_interactions.database.engine_registry import dispose_engines
+from llm_interactions.database.migrations import (apply_migrations,
+                                                  create_schema)
+from llm_interactions.database.synthetic_data import seed_synthetic_data
+
+
+def sqlite_url(path: str) -> str:
+    """
+    Returns:
+        str: The SQLAlchemy url of a SQLite database file.
+    """
+    return f"sqlite:///{os.path.abspath(path)}"
+
+
+def create_sqlite_database(
+    path: Optional[str] = None,
+    num_seniors: int = 100,
+    migrate: bool = True,
+    overwrite: bool = False,
+    seed: int = 0,
+    **generator_options,
+) -> Tuple[str, List[str]]:
+    """
+    Creates a SQLite database from serana_database.sql and fills it with synthetic data,
+    so the tools, caches and benchmarks can run without any database server.
+
+    Parameters:
+        path (Optional[str]): Path of the database file, a new temporary file if None.
+        num_seniors (int): Number of synthetic seniors, and devices, to create. 0 leaves
+            only the doctor, caregiver and medications.
+        migrate (bool): Whether to apply the versioned migrations after creating the schema.
+        overwrite (bool): Whether to replace an existing file at path.
+        seed (int): Seed of the synthetic data generator.
+        **generator_options: Any other argument of seed_synthetic_data, e.g.
+            prescriptions_per_senior.
+
+    Returns:
+        Tuple[str, List[str]]: The database url and the codes of the created devices.
+
+    Raises:
+        FileExistsError: If path already exists and overwrite is False.
+    """
+    if path is None:
+        path = os.path.join(tempfile.mkdtemp(prefix="serena_"), "serena.db")
+    elif os.path.exists(path):
+        if not overwrite:
+            raise FileExistsError(f"{path} already exists, pass overwrite=True")
+        dispose_engines()
+        os.remove(path)
+
+    database_url = sqlite_url(path)
+    create_schema(database_url)
+    if migrate:
+        apply_migrations(database_url)
+    device_ids = seed_synthetic_data(
+        database_url, num_seniors=num_seniors, seed=seed, **generator_options
+    )
+    return database_url, device_ids
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--path", default="serena_dev.db")
+    parser.add_argument("--seniors", type=int, default=1000)
+    parser.add_argument("--prescriptions-per-senior", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--no-migrations", action="store_true")
+    parser.add_argument("--overwrite", action="store_true")
+    args = parser.parse_args()
+
+    database_url, device_ids = create_sqlite_database(
+        args.path,
+        num_seniors=args.seniors,
+        migrate=not args.no_migrations,
+        overwrite=args.overwrite,
+        seed=args.seed,
+        prescriptions_per_senior=args.prescriptions_per_senior,
+    )
+    print(f"[✓] Created {len(device_ids)} devices, export DATABASE_URL={database_url}")
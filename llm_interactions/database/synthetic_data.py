@@ -0,0 +1,259 @@
+"""This file implements a synthetic data generator for the SERENA schema"""
+
+import os
+import random
+import sys
+from datetime import datetime, timedelta
+from typing import List
+
+from sqlalchemy import text
+
+CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
+PARENT_DIR = os.path.dirname(CURRENT_DIR)
+PROJECT_DIR = os.path.dirname(PARENT_DIR)
+sys.path.append(PROJECT_DIR)
+
+from llm_interactions.database.engine_registry import get_engine
+
+MEDICATION_NAMES = [
+    "Paracetamol",
+    "Dipirona",
+    "Ibuprofeno",
+    "Loratadina",
+    "Cetirizina",
+    "Omeprazol",
+    "Losartana",
+    "Captopril",
+    "Atenolol",
+    "Hidroclorotiazida",
+    "Metformina",
+    "Sinvastatina",
+    "Levotiroxina",
+    "Amoxicilina",
+    "Dexclorfeniramina",
+    "Escopolamina",
+]
+
+DISEASE_NAMES = [
+    "Hipertensão",
+    "Diabetes tipo 2",
+    "Rinite alérgica",
+    "Artrite",
+    "Gastrite",
+    "Hipotireoidismo",
+    "Enxaqueca",
+    "Asma",
+    "Colesterol alto",
+    "Insônia",
+]
+
+DOSAGES = ["1 comprimido", "2 comprimidos", "5 ml", "10 gotas", "1 cápsula"]
+
+
+def device_code(senior_id: int) -> str:
+    """
+    Returns:
+        str: The serena_device_code given to the device of a synthetic senior.
+    """
+    return f"SERENA{senior_id:03d}"
+
+
+def _insert(connection, query: str, rows: List[dict], chunk_size: int = 5000) -> None:
+    statement = text(query)
+    for start in range(0, len(rows), chunk_size):
+        connection.execute(statement, rows[start : start + chunk_size])
+
+
+def seed_synthetic_data(
+    database_url: str,
+    num_seniors: int = 1000,
+    diagnoses_per_senior: int = 3,
+    prescriptions_per_senior: int = 10,
+    items_per_prescription: int = 2,
+    compartments_per_device: int = 6,
+    seed: int = 0,
+) -> List[str]:
+    """
+    Fills an empty SERENA database with one doctor, one caregiver and num_seniors
+    seniors, each with a device, diagnoses, prescriptions and stocked compartments.
+
+    Parameters:
+        database_url (str): A SQLAlchemy-compatible database URL whose schema already exists.
+        num_seniors (int): Number of seniors, and devices, to create.
+        diagnoses_per_senior (int): Diseases diagnosed for each senior.
+        prescriptions_per_senior (int): Prescriptions written for each senior.
+        items_per_prescription (int): Prescription items per prescription.
+        compartments_per_device (int): Stocked compartments per device.
+        seed (int): Seed of the random generator, the same seed yields the same data.
+
+    Returns:
+        List[str]: The codes of the created devices.
+    """
+    rng = random.Random(seed)
+    now = datetime(2025, 1, 1, 8, 0, 0)
+
+    users = [
+        {"user_id": 1, "name": "Dra. Serena", "email": "doctor@serena.com"},
+        {"user_id": 2, "name": "Cuidador Serena", "email": "caregiver@serena.com"},
+    ]
+    seniors, devices, diagnoses, compartments = list(), list(), list(), list()
+    prescriptions, items = list(), list()
+    for senior_id in range(1, num_seniors + 1):
+        user_id = senior_id + 2
+        users.append(
+            {
+                "user_id": user_id,
+                "name": f"Paciente {senior_id}",
+                "email": f"paciente{senior_id}@serena.com",
+            }
+        )
+        seniors.append(
+            {"senior_id": senior_id, "user_id": user_id, "age": rng.randint(60, 100)}
+        )
+        devices.append(
+            {
+                "code": device_code(senior_id),
+                "senior_id": senior_id,
+                "user_id": user_id,
+            }
+        )
+        for disease_name in rng.sample(
+            DISEASE_NAMES, min(diagnoses_per_senior, len(DISEASE_NAMES))
+        ):
+            diagnoses.append(
+                {
+                    "id": len(diagnoses) + 1,
+                    "disease_name": disease_name,
+                    "senior_id": senior_id,
+                    "user_id": user_id,
+                    "diagnosed_at": (
+                        now - timedelta(days=rng.randint(1, 3650))
+                    ).strftime("%Y-%m-%d"),
+                }
+            )
+        for _ in range(prescriptions_per_senior):
+            prescription_id = len(prescriptions) + 1
+            create_time = now - timedelta(days=rng.randint(1, 365))
+            prescriptions.append(
+                {
+                    "id": prescription_id,
+                    "senior_id": senior_id,
+                    "user_id": user_id,
+                    "create_time": create_time,
+                    "validation_time": (create_time + timedelta(days=180)).date(),
+                }
+            )
+            for medicine_name in rng.sample(
+                MEDICATION_NAMES, min(items_per_prescription, len(MEDICATION_NAMES))
+            ):
+                items.append(
+                    {
+                        "id": len(items) + 1,
+                        "dosage": rng.choice(DOSAGES),
+                        "frequency_time": rng.choice([6, 8, 12, 24]),
+                        "duration_time": rng.randint(1, 30),
+                        "prescription_id": prescription_id,
+                        "medicine_name": medicine_name,
+                    }
+                )
+        for medicine_name in rng.sample(
+            MEDICATION_NAMES, min(compartments_per_device, len(MEDICATION_NAMES))
+        ):
+            compartments.append(
+                {
+                    "id": len(compartments) + 1,
+                    "medicine_name": medicine_name,
+                    "amount": rng.randint(0, 60),
+                    "code": device_code(senior_id),
+                }
+            )
+
+    engine = get_engine(database_url)
+    with engine.begin() as connection:
+        _insert(
+            connection,
+            'INSERT INTO "user" (user_id, name, email, password, create_time) '
+            "VALUES (:user_id, :name, :email, 'serena', :create_time)",
+            [dict(user, create_time=now) for user in users],
+        )
+        _insert(
+            connection,
+            "INSERT INTO doctor (doctor_id, user_id, crm_number) VALUES (1, 1, 'CRM-0001')",
+            [dict()],
+        )
+        _insert(
+            connection,
+            "INSERT INTO caregiver (caregiver_id, user_id) VALUES (1, 2)",
+            [dict()],
+        )
+        _insert(
+            connection,
+            "INSERT INTO medication (medication_id, medication_name) VALUES (:id, :name)",
+            [
+                {"id": index + 1, "name": name}
+                for index, name in enumerate(MEDICATION_NAMES)
+            ],
+        )
+        _insert(
+            connection,
+            "INSERT INTO senior (senior_id, user_user_id, caregiver_caregiver_id, caregiver_user_id, age) "
+            "VALUES (:senior_id, :user_id, 1, 2, :age)",
+            seniors,
+        )
+        _insert(
+            connection,
+            "INSERT INTO serena_device (serena_device_code, senior_senior_id, senior_user_id) "
+            "VALUES (:code, :senior_id, :user_id)",
+            devices,
+        )
+        _insert(
+            connection,
+            "INSERT INTO disease_diagnosis (disease_diagnosis_id, disease_name, senior_senior_id, senior_user_user_id, diagnosed_at) "
+            "VALUES (:id, :disease_name, :senior_id, :user_id, :diagnosed_at)",
+            diagnoses,
+        )
+        _insert(
+            connection,
+            "INSERT INTO prescription (prescription_id, doctor_doctor_id, doctor_user_id, senior_senior_id, senior_user_id, create_time, validation_time) "
+            "VALUES (:id, 1, 1, :senior_id, :user_id, :create_time, :validation_time)",
+            prescriptions,
+        )
+        _insert(
+            connection,
+            "INSERT INTO prescription_item (prescription_item_id, dosage, frequency_unit, frequency_time, duration_unit, duration_time, prescription_prescription_id, description, medicine_name) "
+            "VALUES (:id, :dosage, 'hour', :frequency_time, 'day', :duration_time, :prescription_id, NULL, :medicine_name)",
+            items,
+        )
+        _insert(
+            connection,
+            "INSERT INTO compartment (stock_id, medicine_name, amount, serena_device_serena_device_code) "
+            "VALUES (:id, :medicine_name, :amount, :code)",
+            compartments,
+        )
+        if connection.dialect.name == "postgresql":
+            _sync_postgres_sequences(connection)
+
+    return [device["code"] for device in devices]
+
+
+def _sync_postgres_sequences(connection) -> None:
+    """
+    The rows above carry explicit ids, move the SERIAL sequences past them.
+    """
+    for table, column in [
+        ('"user"', "user_id"),
+        ("caregiver", "caregiver_id"),
+        ("doctor", "doctor_id"),
+        ("medication", "medication_id"),
+        ("senior", "senior_id"),
+        ("disease_diagnosis", "disease_diagnosis_id"),
+        ("prescription", "prescription_id"),
+        ("prescription_item", "prescription_item_id"),
+        ("compartment", "stock_id"),
+    ]:
+        connection.execute(
+            text(
+                f"SELECT setval(pg_get_serial_sequence('{table}', '{column}'), "
+                f"COALESCE((SELECT MAX({column}) FROM {table}), 1))"
+            )
+        )
@@ -0,0 +1,255 @@
+"""This file implements the compact encoder of the patient context sent in the prompts"""
+
+import math
+import os
+import sys
+from dataclasses import dataclass, field
+from datetime import date, datetime, timezone
+from typing import Callable, Dict, List, Optional
+
+CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
+PARENT_DIR = os.path.dirname(CURRENT_DIR)
+PROJECT_DIR = os.path.dirname(PARENT_DIR)
+sys.path.append(PROJECT_DIR)
+
+from llm_interactions.database.patient_context import (Diagnosis,
+                                                       PatientContext,
+                                                       PrescriptionItem)
+
+try:
+    import tiktoken
+
+    _ENCODING = tiktoken.get_encoding("cl100k_base")
+except ImportError:
+    _ENCODING = None
+
+EMPTY_SECTION = "nenhum"
+OMITTED_ROWS = "... (+{} omitidos)"
+DIAGNOSES_HEADER = "doença|desde"
+PRESCRIPTIONS_HEADER = "medicamento|dose|dias"
+DIAGNOSIS_DATE_FORMATS = (
+    "%d/%m/%Y",
+    "%m/%d/%Y",
+    "%d/%m/%Y %H:%M:%S",
+    "%m/%d/%Y %H:%M:%S",
+)
+
+
+def count_tokens(text: str) -> int:
+    """
+    Counts the tokens of a text with tiktoken when it is installed, otherwise estimates
+    them as one token every four characters.
+
+    Parameters:
+        text (str): The text to measure.
+
+    Returns:
+        int: The number of tokens.
+    """
+    if _ENCODING is not None:
+        return len(_ENCODING.encode(text))
+    return math.ceil(len(text) / 4)
+
+
+@dataclass(frozen=True)
+class EncodedContext:
+    """
+    The patient context rendered for a prompt.
+
+    Attributes:
+        diagnoses (str): The diagnoses table, newest first, undated ones last.
+        prescriptions (str): The deduplicated prescriptions table.
+        token_counts (Dict[str, int]): Tokens used by each section.
+        dropped_diagnoses (int): Oldest diagnoses left out to fit the budget.
+    """
+
+    diagnoses: str
+    prescriptions: str
+    token_counts: Dict[str, int] = field(default_factory=dict)
+    dropped_diagnoses: int = 0
+
+    @property
+    def total_tokens(self) -> int:
+        return sum(self.token_counts.values())
+
+    def prompt_inputs(self) -> Dict[str, str]:
+        """
+        Returns:
+            Dict[str, str]: The diagnoses and prescriptions inputs of user_interaction_prompt.
+        """
+        return {"diagnoses": self.diagnoses, "prescriptions": self.prescriptions}
+
+
+def _cell(value) -> str:
+    return "-" if value is None else str(value).replace("|", "/").strip()
+
+
+def _render(header: str, rows: List[str], omitted: int = 0) -> str:
+    """
+    Renders a table, ending with how many rows were left out so that a truncated
+    section is never mistaken for a complete or empty one.
+    """
+    if not rows and not omitted:
+        return EMPTY_SECTION
+    lines = [header] + rows
+    if omitted:
+        lines.append(OMITTED_ROWS.format(omitted))
+    return "\n".join(lines)
+
+
+def _diagnosis_date(value) -> Optional[datetime]:
+    """
+    Parses a diagnosis date, a datetime from the driver or a string in ISO format or
+    in the day/month/year format used in Brazil, month/day/year when the day is over 12.
+
+    Returns:
+        Optional[datetime]: The naive UTC date, or None if it cannot be parsed.
+    """
+    if isinstance(value, datetime):
+        parsed = value
+    elif isinstance(value, date):
+        parsed = datetime(value.year, value.month, value.day)
+    elif isinstance(value, str):
+        text = value.strip()
+        parsed = None
+        try:
+            parsed = datetime.fromisoformat(text[:-1] if text.endswith("Z") else text)
+        except ValueError:
+            for date_format in DIAGNOSIS_DATE_FORMATS:
+                try:
+                    parsed = datetime.strptime(text, date_format)
+                    break
+                except ValueError:
+                    continue
+        if parsed is None:
+            return None
+    else:
+        return None
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
+
+def _diagnosis_rows(diagnoses: List[Diagnosis]) -> List[str]:
+    dates = [_diagnosis_date(diagnosis.diagnosed_at) for diagnosis in diagnoses]
+    newest_first = [
+        diagnosis
+        for _, diagnosis in sorted(
+            zip(dates, diagnoses),
+            key=lambda pair: (pair[0] is not None, pair[0] or datetime.min),
+            reverse=True,
+        )
+    ]
+    rows = list()
+    seen = set()
+    for diagnosis in newest_first:
+        if diagnosis.disease_name in seen:
+            continue
+        seen.add(diagnosis.disease_name)
+        rows.append(f"{_cell(diagnosis.disease_name)}|{_cell(diagnosis.diagnosed_at)}")
+    return rows
+
+
+def _prescription_rows(prescriptions: List[PrescriptionItem]) -> List[str]:
+    """
+    One row per medication and dosage, from the newest prescription, keeping the
+    longest duration among the duplicates.
+    """
+    durations: Dict[tuple, Optional[int]] = dict()
+    for item in sorted(
+        prescriptions, key=lambda item: item.prescription_id, reverse=True
+    ):
+        key = (item.medication_name, item.dosage)
+        if key not in durations:
+            durations[key] = item.duration_time
+        elif item.duration_time is not None:
+            durations[key] = max(durations[key] or 0, item.duration_time)
+    return [
+        f"{_cell(medication_name)}|{_cell(dosage)}|{_cell(duration)}"
+        for (medication_name, dosage), duration in durations.items()
+    ]
+
+
+class ContextEncoder:
+    """
+    ContextEncoder renders the diagnoses and prescriptions of a patient as small
+    pipe-separated tables that fit a token budget, instead of the indented JSON returned
+    by the tools.
+
+    The prescriptions are always kept in full since the recommended medication must
+    come from them, even if they alone exceed the budget. The diagnoses use the
+    remaining budget, the oldest ones are dropped first and the table says how many
+    were left out.
+
+    Attributes:
+        token_budget (int): Maximum tokens of the diagnoses and prescriptions together.
+    """
+
+    def __init__(
+        self,
+        token_budget: int = 400,
+        token_counter: Callable[[str], int] = count_tokens,
+    ):
+        """
+        Initializes the encoder.
+
+        Parameters:
+            token_budget (int): Maximum tokens of the rendered context.
+            token_counter (Callable[[str], int]): Function counting the tokens of a text.
+
+        Raises:
+            ValueError: If token_budget is not positive.
+        """
+        if token_budget <= 0:
+            raise ValueError(f"token_budget must be positive, got {token_budget}")
+        self.token_budget = token_budget
+        self.__count = token_counter
+
+    def _fit(self, header: str, rows: List[str], budget: int) -> tuple:
+        """
+        Returns:
+            tuple: The rendered section with as many leading rows as fit the budget,
+            its token count and the number of rows dropped.
+        """
+        kept = len(rows)
+        rendered = _render(header, rows)
+        tokens = self.__count(rendered)
+        while kept > 0 and tokens > budget:
+            kept -= 1
+            rendered = _render(header, rows[:kept], len(rows) - kept)
+            tokens = self.__count(rendered)
+        return rendered, tokens, len(rows) - kept
+
+    def encode(self, context: PatientContext) -> EncodedContext:
+        """
+        Renders the patient context for user_interaction_prompt.
+
+        Parameters:
+            context (PatientContext): The context of the patient.
+
+        Returns:
+            EncodedContext: The rendered sections and their token counts.
+        """
+        prescriptions = _render(
+            PRESCRIPTIONS_HEADER, _prescription_rows(context.prescriptions)
+        )
+        prescription_tokens = self.__count(prescriptions)
+        diagnoses, diagnosis_tokens, dropped_diagnoses = self._fit(
+            DIAGNOSES_HEADER,
+            _diagnosis_rows(context.diagnoses),
+            max(self.token_budget - prescription_tokens, 0),
+        )
+        return EncodedContext(
+            diagnoses=diagnoses,
+            prescriptions=prescriptions,
+            token_counts={
+                "diagnoses": diagnosis_tokens,
+                "prescriptions": prescription_tokens,
+            },
+            dropped_diagnoses=dropped_diagnoses,
+        )
+
+
+context_encoder = ContextEncoder(
+    token_budget=int(os.getenv("PROMPT_CONTEXT_TOKEN_BUDGET", "400"))
+)
@@ -0,0 +1,81 @@
+"""This file implements the structured output schema of the user interaction prompt"""
+
+from typing import Any, Dict
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.prompts import PromptTemplate
+from langchain_core.runnables import Runnable
+from pydantic import BaseModel, Field
+
+RESPONSE_FIELDS = ["sugestão", "sintoma", "medicamento_recomendado", "dose"]
+
+USER_INTERACTION_JSON_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "sugestão": {"type": "string"},
+        "sintoma": {"type": "string"},
+        "medicamento_recomendado": {"type": "string"},
+        "dose": {"type": "string"},
+    },
+    "required": RESPONSE_FIELDS,
+    "additionalProperties": False,
+}
+
+
+class UserInteractionResponse(BaseModel):
+    """Resposta da assistente Serena ao comando do paciente."""
+
+    sugestao: str = Field(
+        description="Explicação clínica curta, dica de saúde ou resposta ao comando"
+    )
+    sintoma: str = Field(
+        description="Sintoma relatado extraído do comando, ou 'nenhum'"
+    )
+    medicamento_recomendado: str = Field(
+        description="Nome do medicamento exatamente como nas prescrições, ou 'nenhum'"
+    )
+    dose: str = Field(
+        description="Dose recomendada, como '1 comprimido', '5 ml', ou 'nenhuma'"
+    )
+
+    def to_response(self) -> Dict[str, str]:
+        """
+        Returns:
+            Dict[str, str]: The response with the same keys as the JSON asked in user_interaction_prompt.
+        """
+        return {
+            "sugestão": self.sugestao,
+            "sintoma": self.sintoma,
+            "medicamento_recomendado": self.medicamento_recomendado,
+            "dose": self.dose,
+        }
+
+
+def build_user_interaction_agent(
+    prompt: PromptTemplate, llm: Any, structured: bool = True, streaming: bool = False
+) -> Runnable:
+    """
+    Chains the user interaction prompt with the LLM.
+
+    In structured mode chat models answer through their native structured output
+    (function calling for Gemini) and yield UserInteractionResponse objects. Text
+    completion models, like the local LlamaCpp backend, are constrained by their own
+    JSON schema grammar and are chained as they are.
+
+    Native structured output only yields the answer once it is complete, so a
+    streaming agent keeps chat models on the JSON asked in the prompt, parsed field by
+    field to speak the suggestion while the rest is generated. This trades the
+    validation of function calling for a shorter time to the first spoken word.
+
+    Parameters:
+        prompt (PromptTemplate): The user interaction prompt.
+        llm (Any): The configured langchain LLM or chat model.
+        structured (bool): Whether to use the native structured output of chat models.
+        streaming (bool): Whether the answer is streamed, which turns structured off.
+
+    Returns:
+        Runnable: prompt | llm, or prompt | llm.with_structured_output(UserInteractionResponse).
+    """
+    if structured and not streaming and isinstance(llm, BaseChatModel):
+        return prompt | llm.with_structured_output(UserInteractionResponse)
+    return prompt | llm
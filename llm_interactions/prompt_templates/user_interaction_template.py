@@ -39,10 +39,10 @@ Comando relatado pelo paciente:
 ### FORMATO DE RESPOSTA OBRIGATÓRIO:
 
 {{
+  "sugestão": "<explicação clínica curta, dica de saúde ou resposta ao comando>",
   "sintoma": "<sintoma relatado extraído do comando, ou 'nenhum'>",
   "medicamento_recomendado": "<nome do medicamento exatamente como nas prescrições, ou 'nenhum'>",
-  "dose": "<dose recomendada, como '1 comprimido', '5 ml', ou 'nenhuma'>",
-  "sugestão": "<explicação clínica curta, dica de saúde ou resposta ao comando>"
+  "dose": "<dose recomendada, como '1 comprimido', '5 ml', ou 'nenhuma'>"
 }}
 """,
 )
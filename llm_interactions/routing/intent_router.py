@@ -0,0 +1,322 @@
+"""This file implements the intent router answering simple commands without the LLM"""
+
+import os
+import re
+import sys
+import threading
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
+PARENT_DIR = os.path.dirname(CURRENT_DIR)
+PROJECT_DIR = os.path.dirname(PARENT_DIR)
+sys.path.append(PROJECT_DIR)
+
+from llm_interactions.database.patient_context import PatientContext
+from medicine_recognizer.medication_name_index import (MedicationNameIndex,
+                                                       fold_text)
+
+LIST_PRESCRIPTIONS = "list_prescriptions"
+LIST_STOCK = "list_stock"
+STOCK_QUERY = "stock_query"
+TAKE_MEDICATION = "take_medication"
+
+# Commands mentioning a symptom always go to the LLM, even if they also match a rule
+SYMPTOM_WORDS = set(
+    """
+    dor doi doendo dores sinto sentindo febre tosse enjoo enjoado enjoada
+    tontura tonto tonta crise coceira alergia mal nausea vomito gripe gripado
+    gripada espirro espirrando ansiedade insonia inchado inchada queimando
+    ardendo
+    """.split()
+)
+
+# Taking a medication is only handed out without the LLM for explicit requests, never
+# for negations, past doses, permissions, conditions or questions about how, when or
+# how much to take it, since speech-to-text transcripts rarely carry a question mark
+NOT_A_REQUEST = re.compile(
+    r"\b(nao|nunca|ja tomei|ja tomou|posso|pode|podia|poderia|devo|deveria|se eu"
+    r"|como|quando|quanto|quantos|quantas|qual|quais|o que|por que|porque"
+    r"|pra que|para que)\b"
+)
+
+MEDICATION_WORDS = (
+    r"(remedios?|medicamentos?|medicacao|medicacoes|prescricao|prescricoes|receitas?)"
+)
+# Stock questions are checked before requests to take a medication, e.g. 'quantos
+# paracetamol tenho para tomar'
+RULES = [
+    (
+        LIST_PRESCRIPTIONS,
+        re.compile(r"\bo que (eu )?(tomo|devo tomar|estou tomando)\b"),
+    ),
+    (
+        STOCK_QUERY,
+        re.compile(
+            r"\b(quanto|quantos|quantas)\b.*\b(tenho|tem|resta|restam|sobra|sobrou)\b"
+            r"|\b(resta|restam|sobrou|sobraram|estoque|ainda tem)\b"
+        ),
+    ),
+    (
+        TAKE_MEDICATION,
+        re.compile(
+            r"\b(quero|preciso|vou) tomar\b"
+            r"|\b(liberar|libera|dispensar|dispensa|separar|separa)\b"
+            r"|\bme (da|de|entrega|entregue)\b"
+        ),
+    ),
+    (LIST_STOCK, re.compile(r"\b(dispenser|dispensador|compartimentos?)\b")),
+    (
+        LIST_PRESCRIPTIONS,
+        re.compile(rf"\b(quais|qual|meus|minhas|lista)\b.*\b{MEDICATION_WORDS}\b"),
+    ),
+]
+
+INTENT_EXAMPLES = {
+    LIST_PRESCRIPTIONS: [
+        "quais sao meus remedios",
+        "quais medicamentos eu tomo",
+        "me fala minhas prescricoes",
+    ],
+    LIST_STOCK: [
+        "o que tem no dispensador",
+        "quais remedios estao guardados",
+    ],
+    STOCK_QUERY: [
+        "quanto tenho de paracetamol",
+        "ainda tem loratadina",
+    ],
+    TAKE_MEDICATION: [
+        "quero tomar paracetamol",
+        "me da o remedio de pressao",
+    ],
+}
+
+
+@dataclass(frozen=True)
+class RoutedAnswer:
+    """
+    The deterministic answer to a routed command.
+
+    Attributes:
+        intent (str): The recognized intent.
+        speech (str): What the assistant says.
+        response (Optional[Dict[str, str]]): An answer in the LLM response format when the
+            interaction continues, e.g. to dispense a medication, None otherwise.
+    """
+
+    intent: str
+    speech: str
+    response: Optional[Dict[str, str]] = None
+
+
+def _join(items: List[str]) -> str:
+    if len(items) <= 1:
+        return "".join(items)
+    return f"{', '.join(items[:-1])} e {items[-1]}"
+
+
+class IntentRouter:
+    """
+    IntentRouter answers the commands that only need the patient context (listing the
+    prescriptions, the compartment stock, asking for a prescribed medication) with
+    rules, and lets every command mentioning a symptom fall through to the LLM.
+
+    Commands missed by the rules can be matched against example phrases with an
+    optional embedding function.
+
+    Attributes:
+        similarity_threshold (float): Minimum cosine similarity of an embedding match.
+    """
+
+    def __init__(
+        self,
+        embed: Optional[Callable[[str], Sequence[float]]] = None,
+        examples: Optional[Dict[str, List[str]]] = None,
+        similarity_threshold: float = 0.85,
+    ):
+        """
+        Initializes the router.
+
+        Parameters:
+            embed (Optional[Callable]): Maps a folded command to its embedding vector, the
+                embedding lookup is disabled if None.
+            examples (Optional[Dict[str, List[str]]]): Example phrases per intent, INTENT_EXAMPLES by default.
+            similarity_threshold (float): Minimum cosine similarity, between 0 and 1.
+        """
+        self.similarity_threshold = similarity_threshold
+        self.__embed = embed
+        self.__examples = dict(INTENT_EXAMPLES if examples is None else examples)
+        self.__example_vectors = None
+        self.__lock = threading.Lock()
+        self.__stats = {"fallthrough": 0}
+        self.__stats.update(
+            {
+                intent: 0
+                for intent in [
+                    LIST_PRESCRIPTIONS,
+                    LIST_STOCK,
+                    STOCK_QUERY,
+                    TAKE_MEDICATION,
+                ]
+            }
+        )
+
+    @property
+    def stats(self) -> Dict[str, float]:
+        """
+        Returns:
+            Dict[str, float]: Commands routed per intent, fallthrough to the LLM and hit_rate.
+        """
+        with self.__lock:
+            stats = dict(self.__stats)
+        routed = sum(count for name, count in stats.items() if name != "fallthrough")
+        total = routed + stats["fallthrough"]
+        stats["hit_rate"] = routed / total if total else 0.0
+        return stats
+
+    def _vector(self, text: str) -> np.ndarray:
+        vector = np.asarray(self.__embed(text), dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def _classify(self, folded: str) -> Optional[str]:
+        for intent, pattern in RULES:
+            if pattern.search(folded):
+                return intent
+        if self.__embed is None:
+            return None
+        if self.__example_vectors is None:
+            self.__example_vectors = [
+                (intent, self._vector(fold_text(example)))
+                for intent, phrases in self.__examples.items()
+                for example in phrases
+            ]
+        query = self._vector(folded)
+        best_intent, best_similarity = None, self.similarity_threshold
+        for intent, vector in self.__example_vectors:
+            similarity = float(np.dot(query, vector))
+            if similarity >= best_similarity:
+                best_intent, best_similarity = intent, similarity
+        return best_intent
+
+    def route(self, command: str, context: PatientContext) -> Optional[RoutedAnswer]:
+        """
+        Answers a command from the patient context when it does not need the LLM.
+
+        Parameters:
+            command (str): The command transcribed from the patient.
+            context (PatientContext): The cached context of the patient.
+
+        Returns:
+            Optional[RoutedAnswer]: The answer, or None when the command must go to the LLM.
+        """
+        folded = fold_text(command)
+        answer = None
+        if folded and not SYMPTOM_WORDS.intersection(folded.split(" ")):
+            intent = self._classify(folded)
+            if intent is not None:
+                answer = self._answer(intent, command, context)
+
+        with self.__lock:
+            self.__stats["fallthrough" if answer is None else answer.intent] += 1
+        return answer
+
+    def _answer(
+        self, intent: str, command: str, context: PatientContext
+    ) -> Optional[RoutedAnswer]:
+        medication_names = [item.medication_name for item in context.prescriptions]
+        medication_names += [compartment.medicine_name for compartment in context.stock]
+        match = MedicationNameIndex(medication_names).best_match(command)
+        medication = match.name if match is not None else None
+
+        if intent == TAKE_MEDICATION:
+            if match is None or match.score < 1.0:
+                return None
+            if "?" in command or NOT_A_REQUEST.search(fold_text(command)):
+                return None
+            return self._take_medication(medication, context)
+        if intent == STOCK_QUERY and medication is not None:
+            return self._stock_query(medication, context)
+        if intent in (STOCK_QUERY, LIST_STOCK):
+            return self._list_stock(context)
+        return self._list_prescriptions(context)
+
+    def _list_prescriptions(self, context: PatientContext) -> RoutedAnswer:
+        items = list()
+        for item in context.prescriptions:
+            description = f"{item.medication_name}, {item.dosage}"
+            if item.duration_time:
+                description += f" por {item.duration_time} dias"
+            if description not in items:
+                items.append(description)
+        if not items:
+            return RoutedAnswer(
+                LIST_PRESCRIPTIONS, "Você não tem prescrições cadastradas."
+            )
+        return RoutedAnswer(
+            LIST_PRESCRIPTIONS, f"Suas prescrições atuais são: {_join(items)}."
+        )
+
+    def _amounts(self, context: PatientContext) -> Dict[str, Tuple[str, int]]:
+        """
+        Returns:
+            Dict[str, Tuple[str, int]]: The name and total amount of every medication in
+            the compartments, keyed by the folded name, so the spellings of the
+            prescriptions and of the compartments match.
+        """
+        amounts: Dict[str, Tuple[str, int]] = dict()
+        for compartment in context.stock:
+            key = fold_text(compartment.medicine_name)
+            name, amount = amounts.get(key, (compartment.medicine_name, 0))
+            amounts[key] = (name, amount + compartment.amount)
+        return amounts
+
+    def _list_stock(self, context: PatientContext) -> RoutedAnswer:
+        amounts = self._amounts(context)
+        if not amounts:
+            return RoutedAnswer(LIST_STOCK, "O dispensador está vazio.")
+        items = [f"{amount} de {name}" for name, amount in amounts.values()]
+        return RoutedAnswer(LIST_STOCK, f"No dispensador você tem {_join(items)}.")
+
+    def _stock_query(self, medication: str, context: PatientContext) -> RoutedAnswer:
+        name, amount = self._amounts(context).get(
+            fold_text(medication), (medication, 0)
+        )
+        if not amount:
+            return RoutedAnswer(STOCK_QUERY, f"Você não tem {name} no dispensador.")
+        return RoutedAnswer(
+            STOCK_QUERY, f"Você tem {amount} unidades de {name} no dispensador."
+        )
+
+    def _take_medication(
+        self, medication: Optional[str], context: PatientContext
+    ) -> Optional[RoutedAnswer]:
+        """
+        Only prescribed medications named exactly in a plain request are handed out without
+        the LLM, anything else falls through.
+        """
+        prescribed = [
+            item for item in context.prescriptions if item.medication_name == medication
+        ]
+        if not prescribed:
+            return None
+        item = max(prescribed, key=lambda item: item.prescription_id)
+        suggestion = (
+            f"Certo, {item.medication_name}, {item.dosage}, conforme sua prescrição."
+        )
+        return RoutedAnswer(
+            TAKE_MEDICATION,
+            suggestion,
+            response={
+                "sugestão": suggestion,
+                "sintoma": "nenhum",
+                "medicamento_recomendado": item.medication_name,
+                "dose": item.dosage,
+            },
+        )
+
+
+intent_router = IntentRouter()
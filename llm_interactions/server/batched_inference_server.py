@@ -0,0 +1,382 @@
+"""This file implements a local inference server micro-batching the prompts of many devices over a pool of model workers"""
+
+import argparse
+import asyncio
+import functools
+import json
+import os
+import queue
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, AsyncIterator, Dict, List, Optional, Sequence, Union
+
+from langchain_core.runnables import Runnable
+
+CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
+PARENT_DIR = os.path.dirname(CURRENT_DIR)
+PROJECT_DIR = os.path.dirname(PARENT_DIR)
+sys.path.append(PROJECT_DIR)
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+
+
+def output_text(output: Any) -> str:
+    """
+    Returns:
+        str: The text of an LLM output, a string, a message or a structured response.
+    """
+    if hasattr(output, "to_response"):
+        return json.dumps(output.to_response(), ensure_ascii=False)
+    content = getattr(output, "content", output)
+    return content if isinstance(content, str) else json.dumps(content)
+
+
+@dataclass
+class _Listener:
+    chunks: asyncio.Queue = field(default_factory=asyncio.Queue)
+    closed: bool = False
+
+
+@dataclass
+class _PendingPrompt:
+    prompt: str
+    listeners: List[_Listener] = field(default_factory=list)
+
+    @property
+    def abandoned(self) -> bool:
+        return all(listener.closed for listener in self.listeners)
+
+
+class BatchedInferenceServer:
+    """
+    An asyncio TCP server sharing one local LLM between many devices.
+
+    Devices send JSON lines {"id": ..., "prompt": ...} with the rendered
+    user_interaction_prompt, and receive {"id": ..., "delta": ...} lines while the answer
+    is generated, then a final {"id": ..., "text": ...} or {"id": ..., "error": ...} line.
+    A connection can pipeline many requests, their lines are told apart by the id.
+
+    Prompts are collected into batches of up to max_batch_size, waiting at most max_wait
+    seconds after the first one, and identical prompts of a batch are generated once. A
+    local model such as llama.cpp generates one sequence at a time and is not
+    thread-safe, there is no multi-sequence decoding here: the prompts of a batch are
+    spread over a pool of model workers, each a separate copy of the model generating
+    its prompts one after the other, sorted so prompts sharing a prefix run back to back
+    and reuse its KV cache. Throughput scales with the number of workers, the memory
+    and cores they take; with a single model, batching only saves duplicated prompts.
+    The next batch fills up while the current one runs, and a prompt stops generating
+    once every device waiting for it disconnected.
+
+    Attributes:
+        max_batch_size (int): Maximum prompts per batch.
+        max_wait (float): Seconds to wait for more prompts after the first one of a batch.
+    """
+
+    def __init__(
+        self,
+        llm: Union[Runnable, Sequence[Runnable]],
+        host: str = DEFAULT_HOST,
+        port: int = DEFAULT_PORT,
+        max_batch_size: int = 8,
+        max_wait: float = 0.05,
+    ):
+        """
+        Initializes the server.
+
+        Parameters:
+            llm (Union[Runnable, Sequence[Runnable]]): The local LLM, taking a prompt
+                string, or one LLM per worker, e.g. copies of the same model.
+            host (str): Address to listen on.
+            port (int): Port to listen on, 0 picks a free one.
+            max_batch_size (int): Maximum prompts per batch.
+            max_wait (float): Seconds to wait for more prompts after the first one.
+
+        Raises:
+            ValueError: If there is no LLM, max_batch_size is not positive or max_wait is negative.
+        """
+        if max_batch_size < 1 or max_wait < 0:
+            raise ValueError(
+                "max_batch_size must be positive and max_wait not negative"
+            )
+        llms = list(llm) if isinstance(llm, (list, tuple)) else [llm]
+        if not llms:
+            raise ValueError("at least one LLM is required")
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self.__idle_llms: queue.Queue = queue.Queue()
+        for worker_llm in llms:
+            self.__idle_llms.put(worker_llm)
+        self.__executor = ThreadPoolExecutor(
+            max_workers=len(llms), thread_name_prefix="inference"
+        )
+        self.__host = host
+        self.__port = port
+        self.__queue: Optional[asyncio.Queue] = None
+        self.__server = None
+        self.__batcher = None
+        self.__lock = threading.Lock()
+        self.__stats = {
+            "requests": 0,
+            "batches": 0,
+            "generated": 0,
+            "deduplicated": 0,
+            "abandoned": 0,
+        }
+
+    @property
+    def port(self) -> int:
+        """
+        Returns:
+            int: The port the server listens on.
+        """
+        if self.__server is None:
+            return self.__port
+        return self.__server.sockets[0].getsockname()[1]
+
+    @property
+    def stats(self) -> Dict[str, float]:
+        """
+        Returns:
+            Dict[str, float]: Requests, batches, prompts generated, deduplicated and abandoned by their devices, and mean batch size.
+        """
+        with self.__lock:
+            stats = dict(self.__stats)
+        stats["mean_batch_size"] = (
+            stats["generated"] / stats["batches"] if stats["batches"] else 0.0
+        )
+        return stats
+
+    def __count(self, counter: str, amount: int = 1) -> None:
+        with self.__lock:
+            self.__stats[counter] += amount
+
+    async def start(self) -> "BatchedInferenceServer":
+        """
+        Starts listening and batching, in the running event loop.
+
+        Returns:
+            BatchedInferenceServer: The server itself.
+        """
+        self.__queue = asyncio.Queue()
+        self.__server = await asyncio.start_server(
+            self._handle_connection, self.__host, self.__port
+        )
+        self.__batcher = asyncio.ensure_future(self._batch_loop())
+        return self
+
+    async def stop(self) -> None:
+        """
+        Stops listening and cancels the batching task.
+        """
+        if self.__server is not None:
+            self.__server.close()
+            await self.__server.wait_closed()
+        if self.__batcher is not None:
+            self.__batcher.cancel()
+            try:
+                await self.__batcher
+            except asyncio.CancelledError:
+                pass
+
+    async def serve_forever(self) -> None:
+        await self.start()
+        async with self.__server:
+            await self.__server.serve_forever()
+
+    async def stream(self, prompt: str) -> AsyncIterator[str]:
+        """
+        Queues a prompt for the next batch and yields its text as it is generated.
+
+        Parameters:
+            prompt (str): The rendered prompt.
+
+        Returns:
+            AsyncIterator[str]: The generated text, chunk by chunk.
+        """
+        listener = _Listener()
+        self.__count("requests")
+        await self.__queue.put((prompt, listener))
+        try:
+            while True:
+                kind, value = await listener.chunks.get()
+                if kind == "error":
+                    raise value
+                if kind == "done":
+                    return
+                yield value
+        finally:
+            listener.closed = True
+
+    async def submit(self, prompt: str) -> str:
+        """
+        Queues a prompt for the next batch.
+
+        Parameters:
+            prompt (str): The rendered prompt.
+
+        Returns:
+            str: The generated text.
+        """
+        return "".join([chunk async for chunk in self.stream(prompt)])
+
+    async def _handle_connection(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        write_lock = asyncio.Lock()
+        tasks = set()
+
+        async def write(response: Dict[str, Any]) -> None:
+            async with write_lock:
+                writer.write(json.dumps(response, ensure_ascii=False).encode() + b"\n")
+                await writer.drain()
+
+        async def answer(request: Dict[str, Any]) -> None:
+            chunks = list()
+            stream = self.stream(request["prompt"])
+            try:
+                async for chunk in stream:
+                    chunks.append(chunk)
+                    await write({"id": request.get("id"), "delta": chunk})
+                response = {"id": request.get("id"), "text": "".join(chunks)}
+            except ConnectionError:
+                return
+            except Exception as e:
+                response = {"id": request.get("id"), "error": str(e)}
+            finally:
+                await stream.aclose()
+            try:
+                await write(response)
+            except ConnectionError:
+                pass
+
+        try:
+            while True:
+                try:
+                    line = await reader.readline()
+                except ConnectionError:
+                    line = b""
+                if not line:
+                    # the device disconnected, nobody will read the pending answers
+                    for task in tasks:
+                        task.cancel()
+                    break
+                try:
+                    request = json.loads(line)
+                    if not isinstance(request, dict) or not isinstance(
+                        request.get("prompt"), str
+                    ):
+                        raise ValueError("the request has no 'prompt' string")
+                except ValueError as e:
+                    await write({"id": None, "error": str(e)})
+                    continue
+                task = asyncio.ensure_future(answer(request))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+            if tasks:
+                await asyncio.gather(*tasks, return_exceptions=True)
+        finally:
+            writer.close()
+
+    async def _next_batch(self) -> List[_PendingPrompt]:
+        loop = asyncio.get_running_loop()
+        batch: Dict[str, _PendingPrompt] = dict()
+        requests = 0
+
+        def add(prompt: str, listener: _Listener) -> None:
+            batch.setdefault(prompt, _PendingPrompt(prompt)).listeners.append(listener)
+
+        add(*await self.__queue.get())
+        requests += 1
+        deadline = loop.time() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                add(*await asyncio.wait_for(self.__queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+            requests += 1
+        self.__count("deduplicated", requests - len(batch))
+        return list(batch.values())
+
+    async def _batch_loop(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = await self._next_batch()
+            self.__count("batches")
+            self.__count("generated", len(batch))
+            await asyncio.gather(
+                *[
+                    loop.run_in_executor(self.__executor, self._generate, loop, pending)
+                    for pending in sorted(batch, key=lambda pending: pending.prompt)
+                ]
+            )
+
+    def _generate(
+        self, loop: asyncio.AbstractEventLoop, pending: _PendingPrompt
+    ) -> None:
+        """
+        Generates a prompt on an idle model worker, sending each chunk to the waiting
+        requests as soon as it is generated, until they all disconnected.
+        """
+        publish = functools.partial(loop.call_soon_threadsafe, _publish, pending)
+        llm = self.__idle_llms.get()
+        results = None
+        try:
+            if pending.abandoned:
+                self.__count("abandoned")
+                return
+            results = iter(llm.stream(pending.prompt))
+            for chunk in results:
+                if pending.abandoned:
+                    self.__count("abandoned")
+                    return
+                text = output_text(chunk)
+                if text:
+                    publish("chunk", text)
+        except Exception as e:
+            publish("error", e)
+        else:
+            publish("done", None)
+        finally:
+            if hasattr(results, "close"):
+                results.close()
+            self.__idle_llms.put(llm)
+
+
+def _publish(pending: _PendingPrompt, kind: str, value: Any) -> None:
+    for listener in pending.listeners:
+        listener.chunks.put_nowait((kind, value))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Serves the local LLM to many devices with micro-batching."
+    )
+    parser.add_argument("--host", default=DEFAULT_HOST)
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--backend", default="llamacpp")
+    parser.add_argument("--max-batch-size", type=int, default=8)
+    parser.add_argument("--max-wait", type=float, default=0.05)
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="copies of the model generating in parallel, each takes its own memory",
+    )
+    args = parser.parse_args()
+
+    from llm_interactions.config import build_llm
+
+    server = BatchedInferenceServer(
+        [build_llm(args.backend) for _ in range(args.workers)],
+        host=args.host,
+        port=args.port,
+        max_batch_size=args.max_batch_size,
+        max_wait=args.max_wait,
+    )
+    asyncio.run(server.serve_forever())
@@ -0,0 +1,182 @@
+"""This file implements an incremental parser of the JSON object streamed by the LLM"""
+
+import json
+from typing import Any, Dict, Iterable, Iterator, List, Tuple
+
+_START = "start"
+_KEY_WAIT = "key_wait"
+_KEY = "key"
+_COLON = "colon"
+_VALUE_WAIT = "value_wait"
+_VALUE = "value"
+_AFTER_VALUE = "after_value"
+_DONE = "done"
+
+
+class IncrementalJSONFieldParser:
+    """
+    IncrementalJSONFieldParser consumes the LLM output chunk by chunk and emits every
+    top-level field of the first JSON object as soon as its value is closed, without
+    waiting for the rest of the object.
+
+    String values are emitted on their closing quote, numbers, booleans and null on the
+    following ',' or '}', nested objects and arrays on their closing bracket. Any text
+    before the first '{' (headers, markdown fences) and after the object is ignored.
+    """
+
+    def __init__(self):
+        self.__state = _START
+        self.__buffer: List[str] = list()
+        self.__key = None
+        self.__in_string = False
+        self.__escape = False
+        self.__nesting = 0
+        self.__fields: Dict[str, Any] = dict()
+
+    @property
+    def fields(self) -> Dict[str, Any]:
+        """
+        Returns:
+            Dict[str, Any]: The fields closed so far.
+        """
+        return dict(self.__fields)
+
+    @property
+    def done(self) -> bool:
+        """
+        Returns:
+            bool: Whether the closing brace of the object was consumed.
+        """
+        return self.__state == _DONE
+
+    def feed(self, chunk: str) -> List[Tuple[str, Any]]:
+        """
+        Consumes a chunk of the LLM output.
+
+        Parameters:
+            chunk (str): The next piece of text, of any length.
+
+        Returns:
+            List[Tuple[str, Any]]: The (name, value) of the fields closed by this chunk.
+
+        Raises:
+            ValueError: If a closed value is not valid JSON.
+        """
+        emitted = list()
+        for char in chunk:
+            field = self.__consume(char)
+            if field is not None:
+                emitted.append(field)
+        return emitted
+
+    def result(self) -> Dict[str, Any]:
+        """
+        Returns:
+            Dict[str, Any]: The whole parsed object.
+
+        Raises:
+            ValueError: If the object was not closed.
+        """
+        if self.__state == _START:
+            raise ValueError("No JSON object found in the LLM output.")
+        if self.__state != _DONE:
+            raise ValueError("Failed to parse JSON: the object was not closed.")
+        return self.fields
+
+    def __emit(self) -> Tuple[str, Any]:
+        raw_value = "".join(self.__buffer).strip()
+        try:
+            value = json.loads(raw_value)
+        except json.JSONDecodeError as e:
+            raise ValueError(f"Failed to parse JSON field '{self.__key}': {e}")
+        self.__fields[self.__key] = value
+        self.__buffer = list()
+        self.__state = _AFTER_VALUE
+        return self.__key, value
+
+    def __consume(self, char: str):
+        if self.__state == _DONE:
+            return None
+        if self.__state == _START:
+            if char == "{":
+                self.__state = _KEY_WAIT
+            return None
+
+        if self.__in_string:
+            self.__buffer.append(char)
+            if self.__escape:
+                self.__escape = False
+            elif char == "\\":
+                self.__escape = True
+            elif char == '"':
+                self.__in_string = False
+                if self.__state == _KEY:
+                    self.__key = json.loads("".join(self.__buffer))
+                    self.__buffer = list()
+                    self.__state = _COLON
+                elif self.__nesting == 0:
+                    return self.__emit()
+            return None
+
+        if self.__state == _KEY_WAIT:
+            if char == '"':
+                self.__state = _KEY
+                self.__in_string = True
+                self.__buffer = [char]
+            elif char == "}":
+                self.__state = _DONE
+            return None
+        if self.__state == _COLON:
+            if char == ":":
+                self.__state = _VALUE_WAIT
+            return None
+        if self.__state == _AFTER_VALUE:
+            if char == ",":
+                self.__state = _KEY_WAIT
+            elif char == "}":
+                self.__state = _DONE
+            return None
+        if self.__state == _VALUE_WAIT:
+            if char.isspace():
+                return None
+            self.__state = _VALUE
+
+        if self.__nesting == 0 and char in ",}":
+            field = self.__emit()
+            self.__state = _KEY_WAIT if char == "," else _DONE
+            return field
+        self.__buffer.append(char)
+        if char == '"':
+            self.__in_string = True
+        elif char in "{[":
+            self.__nesting += 1
+        elif char in "}]":
+            self.__nesting -= 1
+            if self.__nesting == 0:
+                return self.__emit()
+        return None
+
+
+def stream_json_fields(chunks: Iterable[Any]) -> Iterator[Tuple[str, Any]]:
+    """
+    Yields the top-level fields of the JSON object streamed by an LLM as soon as they close.
+
+    Parameters:
+        chunks (Iterable[Any]): The output of llm.stream or chain.stream, either strings
+            or message chunks with a 'content' attribute.
+
+    Returns:
+        Iterator[Tuple[str, Any]]: The (name, value) of every field, in generation order.
+
+    Raises:
+        ValueError: If the stream ends before the object is closed or holds invalid JSON.
+    """
+    parser = IncrementalJSONFieldParser()
+    for chunk in chunks:
+        content = getattr(chunk, "content", chunk)
+        if not isinstance(content, str):
+            continue
+        yield from parser.feed(content)
+        if parser.done:
+            return
+    parser.result()
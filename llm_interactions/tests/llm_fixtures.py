@@ -2,6 +2,7 @@
 
 import json
 import os
+import sqlite3
 import sys
 
 import pytest
@@ -9,16 +10,18 @@ import pytest
 CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
 PROJECT_DIR = os.path.dirname(CURRENT_DIR)
 sys.path.append(PROJECT_DIR)
+sys.path.append(os.path.dirname(PROJECT_DIR))
 
 from dotenv import load_dotenv
 
+from llm_interactions.database.sqlite_backend import create_sqlite_database
+
 load_dotenv()
 
 
 @pytest.fixture
-def mock_db_url():
-    DB_URL = f"postgresql://{os.getenv('DB_USER')}:{os.getenv('DB_PASSWORD')}@{os.getenv('DB_HOST')}:{os.getenv('DB_PORT')}/{os.getenv('DB_NAME')}"
-    return DB_URL
+def mock_db_url(mock_sqlite_db_url):
+    return mock_sqlite_db_url
 
 
 @pytest.fixture
@@ -37,3 +40,23 @@ def mock_prescription_query_response():
 @pytest.fixture
 def mock_device_id():
     return "SERENA001"
+
+
+@pytest.fixture
+def mock_sqlite_db_url(tmp_path):
+    DB_URL, _ = create_sqlite_database(str(tmp_path / "serena.db"), num_seniors=0)
+    connection = sqlite3.connect(tmp_path / "serena.db")
+    connection.executescript(
+        """
+        INSERT INTO senior VALUES (1, 1, 1, 2, 80);
+        INSERT INTO serena_device VALUES ('SERENA001', 1, 1);
+        INSERT INTO disease_diagnosis VALUES (1, 'Rinite alérgica', 1, 1, '2024-01-10');
+        INSERT INTO prescription VALUES (1, 1, 1, 1, 1, '2024-01-10 08:00:00', '2024-07-10');
+        INSERT INTO prescription_item VALUES (1, '1 comprimido', 'hour', 8, 'day', 2, 1, NULL, 'Paracetamol');
+        INSERT INTO compartment VALUES (1, 'Paracetamol', 10, 'SERENA001');
+        INSERT INTO compartment VALUES (2, 'Loratadina', 3, 'SERENA001');
+        """
+    )
+    connection.commit()
+    connection.close()
+    return DB_URL
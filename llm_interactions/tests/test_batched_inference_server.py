@@ -0,0 +1,244 @@
+"""test batched inference server"""
+
+import asyncio
+import json
+import os
+import sys
+import threading
+import time
+
+CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
+MODULE_DIR = os.path.dirname(CURRENT_DIR)
+PROJECT_DIR = os.path.dirname(MODULE_DIR)
+sys.path.append(MODULE_DIR)
+sys.path.append(PROJECT_DIR)
+
+from langchain_core.runnables import RunnableLambda
+from llm_fixtures import *
+
+from llm_interactions.backends.batched_inference_client import \
+    BatchedInferenceClient
+from llm_interactions.server.batched_inference_server import \
+    BatchedInferenceServer
+
+
+class FakeBatchLLM(RunnableLambda):
+    """
+    Streams every prompt in upper case, word by word, and records the prompts it
+    generated and how many ran at the same time.
+    """
+
+    def __init__(self):
+        super().__init__(self.answer)
+        self.prompts = list()
+        self.running = 0
+        self.max_running = 0
+        self.words = 0
+
+    def answer(self, prompt):
+        if prompt == "falha":
+            raise ValueError("generation failed")
+        return prompt.upper()
+
+    def stream(self, prompt, config=None, **kwargs):
+        self.prompts.append(prompt)
+        self.running += 1
+        self.max_running = max(self.max_running, self.running)
+        try:
+            words = self.answer(prompt).split(" ")
+            for index, word in enumerate(words):
+                time.sleep(0.001)
+                self.words += 1
+                yield word if index == 0 else f" {word}"
+        finally:
+            self.running -= 1
+
+
+async def send(port, requests):
+    """Returns the final response of every request and the deltas streamed before it."""
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    for request in requests:
+        writer.write(json.dumps(request).encode() + b"\n")
+    await writer.drain()
+    responses, deltas = list(), dict()
+    while len(responses) < len(requests):
+        response = json.loads(await reader.readline())
+        if "delta" in response:
+            deltas.setdefault(response["id"], list()).append(response["delta"])
+        else:
+            responses.append(response)
+    writer.close()
+    return responses, deltas
+
+
+def test_requests_of_many_devices_are_batched_and_streamed():
+    llm = FakeBatchLLM()
+
+    async def scenario():
+        server = await BatchedInferenceServer(
+            llm, port=0, max_batch_size=8, max_wait=0.1
+        ).start()
+        try:
+            device_responses = await asyncio.gather(
+                *[
+                    send(
+                        server.port,
+                        [{"id": device, "prompt": f"estou com dor {device}"}],
+                    )
+                    for device in range(5)
+                ]
+            )
+        finally:
+            await server.stop()
+        return server, device_responses
+
+    server, device_responses = asyncio.run(scenario())
+
+    for device, (responses, deltas) in enumerate(device_responses):
+        assert responses == [{"id": device, "text": f"ESTOU COM DOR {device}"}]
+        assert deltas[device] == ["ESTOU", " COM", " DOR", f" {device}"]
+    assert llm.prompts == sorted(f"estou com dor {device}" for device in range(5))
+    assert llm.max_running == 1
+    assert server.stats["batches"] == 1
+    assert server.stats["mean_batch_size"] == 5
+
+
+def test_batches_respect_max_size_and_deduplicate_prompts():
+    llm = FakeBatchLLM()
+
+    async def scenario():
+        server = await BatchedInferenceServer(
+            llm, port=0, max_batch_size=2, max_wait=0.1
+        ).start()
+        try:
+            responses, _ = await send(
+                server.port,
+                [
+                    {"id": 1, "prompt": "a"},
+                    {"id": 2, "prompt": "a"},
+                    {"id": 3, "prompt": "b"},
+                    {"id": 4, "prompt": "c"},
+                ],
+            )
+            return server, responses
+        finally:
+            await server.stop()
+
+    server, responses = asyncio.run(scenario())
+
+    assert sorted((r["id"], r["text"]) for r in responses) == [
+        (1, "A"),
+        (2, "A"),
+        (3, "B"),
+        (4, "C"),
+    ]
+    assert server.stats["batches"] == 2
+    assert server.stats["deduplicated"] == 1
+    assert server.stats["generated"] == 3
+
+
+def test_batch_is_spread_over_model_workers():
+    llms = [FakeBatchLLM(), FakeBatchLLM()]
+
+    async def scenario():
+        server = await BatchedInferenceServer(
+            llms, port=0, max_batch_size=8, max_wait=0.1
+        ).start()
+        try:
+            return await asyncio.gather(
+                *[
+                    send(
+                        server.port,
+                        [{"id": device, "prompt": "dor " * 20 + str(device)}],
+                    )
+                    for device in range(4)
+                ]
+            )
+        finally:
+            await server.stop()
+
+    device_responses = asyncio.run(scenario())
+
+    for device, (responses, _) in enumerate(device_responses):
+        assert responses == [{"id": device, "text": "DOR " * 20 + str(device)}]
+    assert all(llm.prompts for llm in llms)
+    assert sum(len(llm.prompts) for llm in llms) == 4
+    assert all(llm.max_running == 1 for llm in llms)
+
+
+def test_generation_stops_when_the_device_disconnects():
+    llm = FakeBatchLLM()
+
+    async def scenario():
+        server = await BatchedInferenceServer(llm, port=0, max_wait=0.01).start()
+        try:
+            reader, writer = await asyncio.open_connection("127.0.0.1", server.port)
+            request = {"id": 1, "prompt": "palavra " * 500}
+            writer.write(json.dumps(request).encode() + b"\n")
+            await writer.drain()
+            await reader.readline()
+            writer.close()
+            await writer.wait_closed()
+            for _ in range(100):
+                if server.stats["abandoned"]:
+                    break
+                await asyncio.sleep(0.01)
+            return server
+        finally:
+            await server.stop()
+
+    server = asyncio.run(scenario())
+
+    assert server.stats["abandoned"] == 1
+    assert llm.words < 500
+    assert llm.running == 0
+
+
+def test_failed_generation_and_invalid_request_return_errors():
+    async def scenario():
+        server = await BatchedInferenceServer(FakeBatchLLM(), port=0).start()
+        try:
+            reader, writer = await asyncio.open_connection("127.0.0.1", server.port)
+            writer.write(b"not json\n")
+            writer.write(json.dumps({"id": 7, "prompt": "falha"}).encode() + b"\n")
+            await writer.drain()
+            responses = [json.loads(await reader.readline()) for _ in range(2)]
+            writer.close()
+            return responses
+        finally:
+            await server.stop()
+
+    invalid, failed = asyncio.run(scenario())
+
+    assert invalid["id"] is None and "error" in invalid
+    assert failed == {"id": 7, "error": "generation failed"}
+
+
+def test_client_llm_generates_through_server():
+    ready = threading.Event()
+    state = dict()
+
+    def serve():
+        loop = asyncio.new_event_loop()
+        state["loop"] = loop
+        state["server"] = loop.run_until_complete(
+            BatchedInferenceServer(FakeBatchLLM(), port=0, max_wait=0.01).start()
+        )
+        ready.set()
+        loop.run_forever()
+
+    thread = threading.Thread(target=serve, daemon=True)
+    thread.start()
+    ready.wait(5)
+    try:
+        client = BatchedInferenceClient(port=state["server"].port, timeout=5)
+        assert client.invoke("tenho febre") == "TENHO FEBRE"
+        assert list(client.stream("tenho febre alta")) == ["TENHO", " FEBRE", " ALTA"]
+        with pytest.raises(RuntimeError):
+            client.invoke("falha")
+    finally:
+        asyncio.run_coroutine_threadsafe(state["server"].stop(), state["loop"]).result(
+            5
+        )
+        state["loop"].call_soon_threadsafe(state["loop"].stop)
+        thread.join(5)
@@ -0,0 +1,180 @@
+"""test complaint write-behind queue"""
+
+import json
+import os
+import sqlite3
+import sys
+
+CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
+MODULE_DIR = os.path.dirname(CURRENT_DIR)
+PROJECT_DIR = os.path.dirname(MODULE_DIR)
+sys.path.append(MODULE_DIR)
+sys.path.append(PROJECT_DIR)
+
+from llm_fixtures import *
+
+from llm_interactions.database import complaint_writer
+from llm_interactions.database.complaint_writer import \
+    ComplaintWriteBehindQueue
+
+
+def complaints(database_url):
+    connection = sqlite3.connect(database_url.replace("sqlite:///", ""))
+    rows = connection.execute(
+        "SELECT symptom, senior_senior_id FROM complaint ORDER BY complaint_id"
+    ).fetchall()
+    connection.close()
+    return rows
+
+
+def test_rows_are_written_in_one_batch(mock_sqlite_db_url, mock_device_id, tmp_path):
+    complaint_queue = ComplaintWriteBehindQueue(
+        mock_sqlite_db_url, spool_path=str(tmp_path / "spool.jsonl")
+    ).start()
+    complaint_queue.submit(mock_device_id, "dor de cabeça", "tome paracetamol")
+    complaint_queue.submit(mock_device_id, "alergia", "tome loratadina")
+    complaint_queue.close()
+    assert complaints(mock_sqlite_db_url) == [("dor de cabeça", 1), ("alergia", 1)]
+    assert complaint_queue.stats["batches"] == 1
+
+
+def test_rows_are_spooled_and_replayed(mock_sqlite_db_url, mock_device_id, tmp_path):
+    spool_path = str(tmp_path / "spool.jsonl")
+    offline_queue = ComplaintWriteBehindQueue(
+        f"sqlite:///{tmp_path / 'missing' / 'serena.db'}", spool_path=spool_path
+    )
+    offline_queue.submit(mock_device_id, "tosse", "beba água")
+    offline_queue.flush()
+    assert offline_queue.stats["spooled"] == 1
+    assert os.path.exists(spool_path)
+
+    online_queue = ComplaintWriteBehindQueue(mock_sqlite_db_url, spool_path=spool_path)
+    online_queue.submit(mock_device_id, "febre", "tome paracetamol")
+    online_queue.flush()
+    assert complaints(mock_sqlite_db_url) == [("febre", 1), ("tosse", 1)]
+    assert online_queue.stats["replayed"] == 1
+    assert not os.path.exists(spool_path)
+
+
+def test_bad_spooled_row_is_dead_lettered(mock_sqlite_db_url, mock_device_id, tmp_path):
+    spool_path = str(tmp_path / "spool.jsonl")
+    dead_letter_path = str(tmp_path / "dead.jsonl")
+    with open(spool_path, "w", encoding="utf-8") as spool:
+        spool.write(
+            json.dumps({"device_id": mock_device_id, "symptom": "tosse"}) + "\n"
+        )
+        spool.write("{corrupt\n")
+        spool.write(
+            json.dumps(
+                {
+                    "device_id": mock_device_id,
+                    "symptom": "febre",
+                    "suggestion": "tome paracetamol",
+                    "timestamp": "2024-01-01 08:00:00",
+                }
+            )
+            + "\n"
+        )
+    complaint_queue = ComplaintWriteBehindQueue(
+        mock_sqlite_db_url,
+        spool_path=spool_path,
+        dead_letter_path=dead_letter_path,
+        max_attempts=2,
+    )
+
+    complaint_queue.submit(mock_device_id, "alergia", "tome loratadina")
+    complaint_queue.flush()
+    assert complaints(mock_sqlite_db_url) == [("alergia", 1), ("febre", 1)]
+    assert complaint_queue.stats["dead_lettered"] == 1
+    assert os.path.exists(spool_path)
+
+    complaint_queue.submit(mock_device_id, "insônia", "evite telas")
+    complaint_queue.flush()
+    assert complaints(mock_sqlite_db_url)[-1] == ("insônia", 1)
+    assert complaint_queue.stats["dead_lettered"] == 2
+    assert not os.path.exists(spool_path)
+    with open(dead_letter_path, encoding="utf-8") as dead_letter:
+        lines = dead_letter.read().splitlines()
+    assert lines[0] == "{corrupt"
+    assert json.loads(lines[1])["attempts"] == 2
+
+
+def write_spool(spool_path, device_id, symptoms):
+    with open(spool_path, "w", encoding="utf-8") as spool:
+        for symptom in symptoms:
+            row = {
+                "device_id": device_id,
+                "symptom": symptom,
+                "suggestion": "descanse",
+                "timestamp": "2024-01-01 08:00:00",
+            }
+            spool.write(json.dumps(row, ensure_ascii=False) + "\n")
+
+
+class InterruptedSession:
+    """Stops the process, as a crash would, on the second insert of a replay."""
+
+    def __init__(self, session):
+        self.session = session
+        self.inserts = 0
+
+    def execute(self, statement, parameters=None):
+        if statement is complaint_writer.INSERT_COMPLAINT_QUERY:
+            self.inserts += 1
+            if self.inserts == 2:
+                raise KeyboardInterrupt
+        return self.session.execute(statement, parameters)
+
+    def __getattr__(self, name):
+        return getattr(self.session, name)
+
+
+def test_interrupted_replay_does_not_insert_rows_twice(
+    mock_sqlite_db_url, mock_device_id, tmp_path, monkeypatch
+):
+    spool_path = str(tmp_path / "spool.jsonl")
+    write_spool(spool_path, mock_device_id, ["tosse", "febre", "insônia"])
+    get_session = complaint_writer.get_session
+    monkeypatch.setattr(
+        complaint_writer,
+        "get_session",
+        lambda url: InterruptedSession(get_session(url)),
+    )
+    complaint_queue = ComplaintWriteBehindQueue(
+        mock_sqlite_db_url, spool_path=spool_path
+    )
+    with pytest.raises(KeyboardInterrupt):
+        complaint_queue.flush()
+    assert complaints(mock_sqlite_db_url) == [("tosse", 1)]
+
+    monkeypatch.setattr(complaint_writer, "get_session", get_session)
+    complaint_queue.flush()
+    assert complaints(mock_sqlite_db_url) == [
+        ("tosse", 1),
+        ("febre", 1),
+        ("insônia", 1),
+    ]
+    assert not os.path.exists(spool_path)
+
+
+def test_rows_of_unknown_devices_are_dead_lettered(
+    mock_sqlite_db_url, mock_device_id, tmp_path
+):
+    spool_path = str(tmp_path / "spool.jsonl")
+    dead_letter_path = str(tmp_path / "dead.jsonl")
+    write_spool(spool_path, "SERENA999", ["tosse"])
+    complaint_queue = ComplaintWriteBehindQueue(
+        mock_sqlite_db_url, spool_path=spool_path, dead_letter_path=dead_letter_path
+    )
+
+    complaint_queue.submit("SERENA999", "febre", "tome paracetamol")
+    complaint_queue.submit(mock_device_id, "alergia", "tome loratadina")
+    complaint_queue.flush()
+
+    assert complaints(mock_sqlite_db_url) == [("alergia", 1)]
+    assert complaint_queue.stats["written"] == 1
+    assert complaint_queue.stats["dead_lettered"] == 2
+    assert not os.path.exists(spool_path)
+    with open(dead_letter_path, encoding="utf-8") as dead_letter:
+        symptoms = [json.loads(line)["symptom"] for line in dead_letter]
+    assert sorted(symptoms) == ["febre", "tosse"]
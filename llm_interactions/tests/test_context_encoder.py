@@ -0,0 +1,117 @@
+"""test compact prompt context encoder"""
+
+import os
+import sys
+from datetime import datetime
+
+CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
+MODULE_DIR = os.path.dirname(CURRENT_DIR)
+PROJECT_DIR = os.path.dirname(MODULE_DIR)
+sys.path.append(MODULE_DIR)
+sys.path.append(PROJECT_DIR)
+
+from llm_fixtures import *
+
+from llm_interactions.database.patient_context import (Diagnosis,
+                                                       PatientContext,
+                                                       PrescriptionItem,
+                                                       fetch_patient_context)
+from llm_interactions.prompt_templates.context_encoder import (ContextEncoder,
+                                                               count_tokens)
+
+
+@pytest.fixture
+def mock_patient_context():
+    return PatientContext(
+        device_id="SERENA001",
+        senior_id=1,
+        user_id=1,
+        diagnoses=[
+            Diagnosis("Asma", "2015-03-01"),
+            Diagnosis("Rinite alérgica", "2024-01-10"),
+            Diagnosis("Artrite", "2020-06-15"),
+        ],
+        prescriptions=[
+            PrescriptionItem(1, "Paracetamol", "1 comprimido", 2),
+            PrescriptionItem(2, "Paracetamol", "1 comprimido", 5),
+            PrescriptionItem(2, "Loratadina", "1 comprimido", 10),
+        ],
+    )
+
+
+def test_encode_is_compact(mock_patient_context):
+    encoded = ContextEncoder().encode(mock_patient_context)
+    assert encoded.prescriptions == (
+        "medicamento|dose|dias\n"
+        "Paracetamol|1 comprimido|5\n"
+        "Loratadina|1 comprimido|10"
+    )
+    assert encoded.diagnoses.splitlines()[1] == "Rinite alérgica|2024-01-10"
+    assert encoded.total_tokens < count_tokens(
+        mock_patient_context.diagnoses_json()
+    ) + count_tokens(mock_patient_context.prescriptions_json())
+
+
+def test_encode_drops_oldest_diagnoses_first(mock_patient_context):
+    full = ContextEncoder().encode(mock_patient_context)
+    budget = full.token_counts["prescriptions"] + full.token_counts["diagnoses"] - 1
+    encoded = ContextEncoder(token_budget=budget).encode(mock_patient_context)
+    assert encoded.dropped_diagnoses >= 1
+    assert "Asma" not in encoded.diagnoses
+    assert encoded.diagnoses.endswith(f"... (+{encoded.dropped_diagnoses} omitidos)")
+    assert encoded.prescriptions == full.prescriptions
+    assert encoded.total_tokens <= budget
+
+
+def test_encode_overflow_keeps_prescriptions_and_marks_omitted_rows(
+    mock_patient_context,
+):
+    full = ContextEncoder().encode(mock_patient_context)
+    budget = full.token_counts["prescriptions"] - 1
+    encoded = ContextEncoder(token_budget=budget).encode(mock_patient_context)
+    assert encoded.prescriptions == full.prescriptions
+    assert encoded.dropped_diagnoses == 3
+    assert encoded.diagnoses == "doença|desde\n... (+3 omitidos)"
+    assert encoded.diagnoses != "nenhum"
+
+
+def test_encode_counts_tokens_per_section(mock_sqlite_db_url, mock_device_id):
+    context = fetch_patient_context(mock_sqlite_db_url, mock_device_id)
+    encoded = ContextEncoder(token_counter=len).encode(context)
+    assert encoded.token_counts == {
+        "diagnoses": len(encoded.diagnoses),
+        "prescriptions": len(encoded.prescriptions),
+    }
+    empty = ContextEncoder().encode(PatientContext("SERENA002", 2, 2))
+    assert empty.prompt_inputs() == {"diagnoses": "nenhum", "prescriptions": "nenhum"}
+
+
+def test_encoder_rejects_invalid_budget():
+    with pytest.raises(ValueError):
+        ContextEncoder(token_budget=0)
+
+
+def test_diagnoses_are_sorted_by_parsed_date():
+    context = PatientContext(
+        device_id="SERENA001",
+        senior_id=1,
+        user_id=1,
+        diagnoses=[
+            Diagnosis("Gastrite", None),
+            Diagnosis("Asma", "9/1/2024"),
+            Diagnosis("Rinite alérgica", "2023-12-31"),
+            Diagnosis("Artrite", datetime(2024, 5, 1, 10, 30)),
+            Diagnosis("Diabetes", "25/12/2023"),
+            Diagnosis("Hipertensão", "2024-02-01T08:00:00Z"),
+        ],
+        prescriptions=[],
+    )
+    rows = ContextEncoder().encode(context).diagnoses.splitlines()[1:]
+    assert [row.split("|")[0] for row in rows] == [
+        "Artrite",
+        "Hipertensão",
+        "Asma",
+        "Rinite alérgica",
+        "Diabetes",
+        "Gastrite",
+    ]
@@ -0,0 +1,44 @@
+"""test engine registry"""
+
+import json
+import os
+import sys
+
+CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
+MODULE_DIR = os.path.dirname(CURRENT_DIR)
+PROJECT_DIR = os.path.dirname(MODULE_DIR)
+sys.path.append(MODULE_DIR)
+sys.path.append(PROJECT_DIR)
+
+from llm_fixtures import *
+from tools.get_compartment_stock_tool import get_compartment_stock_by_device
+
+from llm_interactions.database.engine_registry import (configure_pool,
+                                                       dispose_engines,
+                                                       get_engine,
+                                                       get_pool_stats)
+
+
+def test_get_engine_returns_shared_engine(mock_sqlite_db_url):
+    dispose_engines()
+    assert get_engine(mock_sqlite_db_url) is get_engine(mock_sqlite_db_url)
+    stats = get_pool_stats(mock_sqlite_db_url)
+    assert stats["engine_misses"] == 1
+    assert stats["engine_hits"] == 1
+
+
+def test_tools_reuse_pooled_connection(mock_sqlite_db_url, mock_device_id):
+    dispose_engines()
+    for _ in range(3):
+        result = get_compartment_stock_by_device.invoke(
+            {"database_url": mock_sqlite_db_url, "device_id": mock_device_id}
+        )
+    assert json.loads(result)[0]["medicine_name"] == "Paracetamol"
+    stats = get_pool_stats(mock_sqlite_db_url)
+    assert stats["connects"] == 1
+    assert stats["checkouts"] == 3
+
+
+def test_configure_pool_rejects_unknown_option():
+    with pytest.raises(ValueError):
+        configure_pool(pool_timeout_typo=3)
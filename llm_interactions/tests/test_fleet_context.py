@@ -0,0 +1,97 @@
+"""test fleet context queries"""
+
+import json
+import os
+import sqlite3
+import sys
+
+CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
+MODULE_DIR = os.path.dirname(CURRENT_DIR)
+PROJECT_DIR = os.path.dirname(MODULE_DIR)
+sys.path.append(MODULE_DIR)
+sys.path.append(PROJECT_DIR)
+
+from llm_fixtures import *
+from sqlalchemy import event
+from tools.get_fleet_context_tool import get_fleet_context_by_devices
+
+from llm_interactions.cache.patient_context_cache import PatientContextCache
+from llm_interactions.database.engine_registry import get_engine
+from llm_interactions.database.fleet_context import fetch_fleet_context
+from llm_interactions.database.patient_context import fetch_patient_context
+
+
+@pytest.fixture
+def mock_fleet_db_url(mock_sqlite_db_url, tmp_path):
+    connection = sqlite3.connect(tmp_path / "serena.db")
+    connection.executescript(
+        """
+        INSERT INTO serena_device VALUES ('SERENA002', 2, 2);
+        INSERT INTO serena_device VALUES ('SERENA003', NULL, NULL);
+        INSERT INTO disease_diagnosis VALUES (2, 'Asma', 2, 2, '2023-05-02');
+        INSERT INTO disease_diagnosis VALUES (3, 'Artrite', 2, 2, '2024-02-01');
+        INSERT INTO compartment VALUES (3, 'Dipirona', 7, 'SERENA002');
+        """
+    )
+    connection.commit()
+    connection.close()
+    return mock_sqlite_db_url
+
+
+def test_fetch_fleet_context_matches_single_device(mock_fleet_db_url):
+    fleet_context = fetch_fleet_context(mock_fleet_db_url, ["SERENA001", "SERENA002"])
+    assert set(fleet_context) == {"SERENA001", "SERENA002"}
+    for device_id, context in fleet_context.items():
+        assert context == fetch_patient_context(mock_fleet_db_url, device_id)
+    assert fleet_context["SERENA002"].prescriptions == []
+    assert [d.disease_name for d in fleet_context["SERENA002"].diagnoses] == [
+        "Asma",
+        "Artrite",
+    ]
+
+
+def test_fetch_fleet_context_skips_unknown_and_unassigned_devices(mock_fleet_db_url):
+    fleet_context = fetch_fleet_context(
+        mock_fleet_db_url, ["SERENA001", "SERENA003", "SERENA404"]
+    )
+    assert list(fleet_context) == ["SERENA001"]
+    assert fetch_fleet_context(mock_fleet_db_url, []) == dict()
+
+
+def test_fetch_fleet_context_uses_constant_number_of_queries(mock_fleet_db_url):
+    statements = list()
+    engine = get_engine(mock_fleet_db_url)
+
+    def listener(*args):
+        statements.append(args[2])
+
+    event.listen(engine, "before_cursor_execute", listener)
+    try:
+        fetch_fleet_context(mock_fleet_db_url, ["SERENA001"])
+        single = len(statements)
+        statements.clear()
+        fetch_fleet_context(mock_fleet_db_url, None)
+    finally:
+        event.remove(engine, "before_cursor_execute", listener)
+    assert single == len(statements) == 4
+
+
+def test_get_fleet_context_tool(mock_fleet_db_url):
+    result = json.loads(
+        get_fleet_context_by_devices.invoke(
+            {"database_url": mock_fleet_db_url, "device_ids": ["SERENA002"]}
+        )
+    )
+    assert result["SERENA002"]["stock"] == [
+        {"stock_id": 3, "medicine_name": "Dipirona", "amount": 7}
+    ]
+
+
+def test_warm_up_preloads_the_fleet(mock_fleet_db_url):
+    def failing_loader(database_url, device_id):
+        raise AssertionError("warm devices must not hit the loader")
+
+    cache = PatientContextCache(loaders={"context": failing_loader})
+    assert cache.warm_up(mock_fleet_db_url) == 2
+    assert cache.get_context(mock_fleet_db_url, "SERENA002").senior_id == 2
+    assert cache.stats["devices"] == 2
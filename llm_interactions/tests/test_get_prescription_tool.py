@@ -1,5 +1,6 @@
 """test_get_prescription tool"""
 
+import json
 import os
 import sys
 
@@ -17,5 +18,11 @@ def test_get_prescription_by_device_return(
     result = get_prescriptions_by_device.invoke(
         {"database_url": mock_db_url, "device_id": mock_device_id}
     )
-    result = 1
-    assert result == 1
+    assert json.loads(result) == json.loads(mock_prescription_query_response)
+
+
+def test_get_prescription_by_device_unknown_device(mock_db_url):
+    result = get_prescriptions_by_device.invoke(
+        {"database_url": mock_db_url, "device_id": "SERENA404"}
+    )
+    assert result == "No senior found with device ID 'SERENA404'."
@@ -0,0 +1,240 @@
+"""test hedged llm dispatcher"""
+
+import os
+import sys
+import threading
+import time
+
+CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
+MODULE_DIR = os.path.dirname(CURRENT_DIR)
+PROJECT_DIR = os.path.dirname(MODULE_DIR)
+sys.path.append(MODULE_DIR)
+sys.path.append(PROJECT_DIR)
+
+from langchain_core.runnables import RunnableGenerator, RunnableLambda
+from llm_fixtures import *
+
+from llm_interactions.backends.hedged_dispatcher import (CircuitBreaker,
+                                                         HedgedLLMDispatcher,
+                                                         LLMTimeoutError,
+                                                         LLMUnavailableError)
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def slow_backend(answer, delay, calls=None):
+    def call(inputs):
+        if calls is not None:
+            calls.append(answer)
+        time.sleep(delay)
+        return answer
+
+    return RunnableLambda(call)
+
+
+def failing_backend(calls=None):
+    def call(inputs):
+        if calls is not None:
+            calls.append("failure")
+        raise ConnectionError("backend down")
+
+    return RunnableLambda(call)
+
+
+def test_primary_answers_before_hedge_delay():
+    calls = list()
+    dispatcher = HedgedLLMDispatcher(
+        [
+            ("gemini", slow_backend("primary", 0.01, calls)),
+            ("llamacpp", slow_backend("local", 0.01, calls)),
+        ],
+        latency_budget=1.0,
+        hedge_delay=0.5,
+    )
+
+    assert dispatcher.invoke({"command": "dor de cabeça"}) == "primary"
+    assert calls == ["primary"]
+    stats = dispatcher.stats
+    assert stats["gemini"]["wins"] == 1
+    assert stats["gemini"]["p50"] is not None
+    assert stats["llamacpp"]["calls"] == 0
+    assert stats["llamacpp"]["p99"] is None
+
+
+def test_slow_primary_is_hedged_with_next_backend():
+    dispatcher = HedgedLLMDispatcher(
+        [
+            ("gemini", slow_backend("primary", 0.5)),
+            ("llamacpp", slow_backend("local", 0.01)),
+        ],
+        latency_budget=2.0,
+        hedge_delay=0.05,
+    )
+
+    started_at = time.monotonic()
+    assert dispatcher.invoke({}) == "local"
+    assert time.monotonic() - started_at < 0.4
+    stats = dispatcher.stats
+    assert stats["llamacpp"]["hedges"] == 1
+    assert stats["llamacpp"]["wins"] == 1
+    assert stats["gemini"]["wins"] == 0
+
+
+def test_failed_primary_falls_back_without_waiting_hedge_delay():
+    dispatcher = HedgedLLMDispatcher(
+        [("gemini", failing_backend()), ("llamacpp", slow_backend("local", 0.01))],
+        latency_budget=2.0,
+        hedge_delay=1.0,
+    )
+
+    started_at = time.monotonic()
+    assert dispatcher.invoke({}) == "local"
+    assert time.monotonic() - started_at < 0.5
+    assert dispatcher.stats["gemini"]["failures"] == 1
+
+
+def test_latency_budget_raises_timeout():
+    dispatcher = HedgedLLMDispatcher(
+        [("gemini", slow_backend("primary", 0.5))],
+        latency_budget=0.05,
+        hedge_delay=0.02,
+    )
+
+    with pytest.raises(LLMTimeoutError):
+        dispatcher.invoke({})
+
+
+def test_all_backends_failing_raises_unavailable():
+    dispatcher = HedgedLLMDispatcher(
+        [("gemini", failing_backend()), ("llamacpp", failing_backend())],
+        latency_budget=1.0,
+        hedge_delay=0.5,
+    )
+
+    with pytest.raises(LLMUnavailableError):
+        dispatcher.invoke({})
+
+
+def test_circuit_opens_after_repeated_failures():
+    calls = list()
+    dispatcher = HedgedLLMDispatcher(
+        [("gemini", failing_backend(calls)), ("llamacpp", slow_backend("local", 0))],
+        latency_budget=1.0,
+        hedge_delay=0.5,
+        failure_threshold=2,
+        reset_timeout=60.0,
+    )
+
+    for _ in range(3):
+        assert dispatcher.invoke({}) == "local"
+
+    assert calls == ["failure", "failure"]
+    assert dispatcher.stats["gemini"]["circuit"] == "open"
+
+
+def test_circuit_breaker_half_open_trial():
+    clock = FakeClock()
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=10.0, clock=clock)
+
+    breaker.record_failure()
+    assert not breaker.allow()
+    clock.now = 10.0
+    assert breaker.state == "half_open"
+    assert breaker.allow()
+    assert not breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == "open"
+    clock.now = 20.0
+    assert breaker.allow()
+    breaker.record_success()
+    assert breaker.state == "closed"
+
+
+def test_stream_is_hedged_on_first_chunk():
+    release = threading.Event()
+
+    def stuck_stream(inputs):
+        for _ in inputs:
+            release.wait(1.0)
+            yield "primary"
+
+    def local_stream(inputs):
+        for _ in inputs:
+            yield '{"sugestão": '
+            yield '"Descanse."}'
+
+    dispatcher = HedgedLLMDispatcher(
+        [
+            ("gemini", RunnableGenerator(stuck_stream)),
+            ("llamacpp", RunnableGenerator(local_stream)),
+        ],
+        latency_budget=1.0,
+        hedge_delay=0.05,
+    )
+
+    assert "".join(dispatcher.stream({})) == '{"sugestão": "Descanse."}'
+    release.set()
+
+
+def test_losing_stream_is_stopped():
+    produced = list()
+    closed = threading.Event()
+
+    def slow_stream(inputs):
+        for _ in inputs:
+            try:
+                for index in range(20):
+                    time.sleep(0.1)
+                    produced.append(index)
+                    yield "primary "
+            finally:
+                closed.set()
+
+    def local_stream(inputs):
+        for _ in inputs:
+            yield "local"
+
+    dispatcher = HedgedLLMDispatcher(
+        [
+            ("gemini", RunnableGenerator(slow_stream)),
+            ("llamacpp", RunnableGenerator(local_stream)),
+        ],
+        latency_budget=1.0,
+        hedge_delay=0.05,
+    )
+
+    assert "".join(dispatcher.stream({})) == "local"
+    assert closed.wait(1.0)
+    assert len(produced) <= 2
+
+
+def test_stalled_stream_raises_timeout():
+    release = threading.Event()
+
+    def stalling_stream(inputs):
+        for _ in inputs:
+            yield '{"sugestão": '
+            release.wait(2.0)
+            yield '"Descanse."}'
+
+    dispatcher = HedgedLLMDispatcher(
+        [("gemini", RunnableGenerator(stalling_stream))],
+        latency_budget=1.0,
+        hedge_delay=0.5,
+        chunk_timeout=0.1,
+    )
+
+    chunks = list()
+    started_at = time.monotonic()
+    with pytest.raises(LLMTimeoutError):
+        for chunk in dispatcher.stream({}):
+            chunks.append(chunk)
+    assert chunks == ['{"sugestão": ']
+    assert time.monotonic() - started_at < 0.5
+    release.set()
@@ -0,0 +1,70 @@
+"""test incremental json field parser"""
+
+import json
+import os
+import sys
+
+CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
+MODULE_DIR = os.path.dirname(CURRENT_DIR)
+PROJECT_DIR = os.path.dirname(MODULE_DIR)
+sys.path.append(MODULE_DIR)
+sys.path.append(PROJECT_DIR)
+
+from langchain_core.messages import AIMessageChunk
+from llm_fixtures import *
+
+from llm_interactions.streaming.incremental_json_parser import (
+    IncrementalJSONFieldParser, stream_json_fields)
+
+
+@pytest.fixture
+def mock_llm_output():
+    return (
+        "```json\n"
+        + json.dumps(
+            {
+                "sugestão": 'Tome um "Paracetamol" e descanse, {sem} [telas].',
+                "sintoma": "dor de cabeça",
+                "medicamento_recomendado": "Paracetamol",
+                "dose": "1 comprimido",
+                "quantidade": 1,
+                "alternativas": ["Dipirona", {"nome": "Ibuprofeno"}],
+                "urgente": False,
+            },
+            ensure_ascii=False,
+            indent=2,
+        )
+        + "\n```"
+    )
+
+
+def test_fields_are_emitted_as_soon_as_they_close(mock_llm_output):
+    parser = IncrementalJSONFieldParser()
+    suggestion_end = mock_llm_output.index('",\n  "sintoma"') + 1
+    assert parser.feed(mock_llm_output[:suggestion_end]) == [
+        ("sugestão", 'Tome um "Paracetamol" e descanse, {sem} [telas].')
+    ]
+    remaining = parser.feed(mock_llm_output[suggestion_end:])
+    assert [name for name, _ in remaining] == [
+        "sintoma",
+        "medicamento_recomendado",
+        "dose",
+        "quantidade",
+        "alternativas",
+        "urgente",
+    ]
+    assert parser.result() == json.loads(mock_llm_output.strip("`json\n"))
+
+
+def test_stream_one_character_at_a_time(mock_llm_output):
+    chunks = [AIMessageChunk(content=char) for char in mock_llm_output]
+    fields = dict(stream_json_fields(chunks))
+    assert fields["alternativas"] == ["Dipirona", {"nome": "Ibuprofeno"}]
+    assert fields["quantidade"] == 1
+
+
+def test_incomplete_stream_raises():
+    with pytest.raises(ValueError):
+        list(stream_json_fields(['{"sugestão": "Descanse", "dose": ']))
+    with pytest.raises(ValueError):
+        list(stream_json_fields(["Não sei responder."]))
@@ -0,0 +1,157 @@
+"""test intent router"""
+
+import os
+import sys
+
+CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
+MODULE_DIR = os.path.dirname(CURRENT_DIR)
+PROJECT_DIR = os.path.dirname(MODULE_DIR)
+sys.path.append(MODULE_DIR)
+sys.path.append(PROJECT_DIR)
+
+from llm_fixtures import *
+
+from llm_interactions.database.patient_context import (CompartmentStock,
+                                                       PatientContext,
+                                                       PrescriptionItem,
+                                                       fetch_patient_context)
+from llm_interactions.routing.intent_router import (LIST_PRESCRIPTIONS,
+                                                    LIST_STOCK, STOCK_QUERY,
+                                                    TAKE_MEDICATION,
+                                                    IntentRouter)
+
+
+@pytest.fixture
+def mock_patient_context(mock_sqlite_db_url, mock_device_id):
+    return fetch_patient_context(mock_sqlite_db_url, mock_device_id)
+
+
+def test_list_prescriptions(mock_patient_context):
+    answer = IntentRouter().route("Quais são meus remédios?", mock_patient_context)
+    assert answer.intent == LIST_PRESCRIPTIONS
+    assert answer.speech == (
+        "Suas prescrições atuais são: Paracetamol, 1 comprimido por 2 dias."
+    )
+    assert answer.response is None
+
+
+def test_stock_queries(mock_patient_context):
+    router = IntentRouter()
+    answer = router.route("quanto tenho de loratadina", mock_patient_context)
+    assert answer.intent == STOCK_QUERY
+    assert answer.speech == "Você tem 3 unidades de Loratadina no dispensador."
+    answer = router.route("o que tem no dispensador", mock_patient_context)
+    assert answer.intent == LIST_STOCK
+    assert answer.speech == (
+        "No dispensador você tem 10 de Paracetamol e 3 de Loratadina."
+    )
+
+
+def test_take_prescribed_medication(mock_patient_context):
+    router = IntentRouter()
+    answer = router.route("quero tomar paracetamol", mock_patient_context)
+    assert answer.intent == TAKE_MEDICATION
+    assert answer.response["medicamento_recomendado"] == "Paracetamol"
+    assert answer.response["dose"] == "1 comprimido"
+    assert router.route("quero tomar loratadina", mock_patient_context) is None
+
+
+def test_symptoms_fall_through_and_hit_rate(mock_patient_context):
+    router = IntentRouter()
+    assert router.route("estou com dor de cabeça", mock_patient_context) is None
+    assert router.route("qual remédio tomo para febre", mock_patient_context) is None
+    router.route("quais são meus remédios", mock_patient_context)
+    stats = router.stats
+    assert stats["fallthrough"] == 2
+    assert stats[LIST_PRESCRIPTIONS] == 1
+    assert stats["hit_rate"] == pytest.approx(1 / 3)
+
+
+def test_embedding_fallback(mock_patient_context):
+    vectors = {
+        "me conta o que foi receitado": [1.0, 0.0],
+        "como esta o tempo hoje": [0.0, 1.0],
+    }
+    router = IntentRouter(
+        embed=lambda text: vectors.get(text, [1.0, 0.05]),
+        examples={LIST_PRESCRIPTIONS: ["quais sao meus remedios"]},
+    )
+    answer = router.route("Me conta o que foi receitado", mock_patient_context)
+    assert answer.intent == LIST_PRESCRIPTIONS
+    assert router.route("Como está o tempo hoje?", mock_patient_context) is None
+
+
+@pytest.mark.parametrize(
+    "command",
+    [
+        "não quero tomar paracetamol",
+        "nunca vou tomar paracetamol",
+        "posso tomar paracetamol com álcool?",
+        "já tomei paracetamol hoje, posso tomar de novo?",
+        "pode liberar paracetamol",
+        "quero tomar paracetamol?",
+        "quero tomar paracetamou",
+    ],
+)
+def test_take_medication_only_for_plain_exact_requests(mock_patient_context, command):
+    router = IntentRouter()
+    assert router.route(command, mock_patient_context) is None
+    assert router.stats["fallthrough"] == 1
+
+
+@pytest.mark.parametrize(
+    "command",
+    [
+        "como devo tomar o paracetamol",
+        "quando devo tomar paracetamol",
+        "quanto tempo devo tomar paracetamol",
+        "o que acontece se eu tomar paracetamol demais",
+        "qual a dose para tomar paracetamol",
+        "por que tenho que tomar paracetamol",
+        "eu devo tomar paracetamol",
+        "paracetamol eu tomo",
+    ],
+)
+def test_questions_about_taking_go_to_the_llm(mock_patient_context, command):
+    router = IntentRouter()
+    assert router.route(command, mock_patient_context) is None
+    assert router.stats[TAKE_MEDICATION] == 0
+
+
+def test_stock_question_mentioning_taking_is_not_dispensed(mock_patient_context):
+    answer = IntentRouter().route(
+        "quantos paracetamol tenho para tomar", mock_patient_context
+    )
+    assert answer.intent == STOCK_QUERY
+    assert answer.response is None
+    assert answer.speech == "Você tem 10 unidades de Paracetamol no dispensador."
+
+
+def test_stock_is_found_across_spellings():
+    context = PatientContext(
+        device_id="device",
+        senior_id=1,
+        user_id=1,
+        prescriptions=[PrescriptionItem(1, "PARACETAMOL", "1 comprimido", 5)],
+        stock=[
+            CompartmentStock(1, "Paracetamol", 6),
+            CompartmentStock(2, "paracetamól", 4),
+        ],
+    )
+    answer = IntentRouter().route("quanto tenho de PARACETAMOL", context)
+    assert answer.intent == STOCK_QUERY
+    assert answer.speech == "Você tem 10 unidades de Paracetamol no dispensador."
+
+
+def test_similar_medication_is_not_dispensed():
+    context = PatientContext(
+        device_id="device",
+        senior_id=1,
+        user_id=1,
+        prescriptions=[PrescriptionItem(1, "Prednisona", "1 comprimido", 5)],
+        stock=[CompartmentStock(1, "Prednisona", 10)],
+    )
+    router = IntentRouter()
+    assert router.route("quero tomar prednisolona", context) is None
+    answer = router.route("quero tomar prednisona", context)
+    assert answer.response["medicamento_recomendado"] == "Prednisona"
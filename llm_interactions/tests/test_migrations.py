@@ -0,0 +1,45 @@
+"""test schema creation and migrations"""
+
+import os
+import sys
+
+CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
+MODULE_DIR = os.path.dirname(CURRENT_DIR)
+PROJECT_DIR = os.path.dirname(MODULE_DIR)
+sys.path.append(MODULE_DIR)
+sys.path.append(PROJECT_DIR)
+
+from llm_fixtures import *
+from sqlalchemy import text
+
+from llm_interactions.database.engine_registry import get_engine
+from llm_interactions.database.migrations import (apply_migrations,
+                                                  create_schema,
+                                                  list_migrations)
+from llm_interactions.database.synthetic_data import seed_synthetic_data
+
+
+def test_apply_migrations_is_idempotent(tmp_path):
+    database_url = f"sqlite:///{tmp_path / 'serena.db'}"
+    create_schema(database_url)
+    assert apply_migrations(database_url) == list_migrations()
+    assert apply_migrations(database_url) == []
+    with get_engine(database_url).connect() as connection:
+        indexes = connection.execute(
+            text("SELECT name FROM sqlite_master WHERE type = 'index'")
+        ).fetchall()
+    assert ("idx_prescription_senior",) in indexes
+
+
+def test_seed_synthetic_data(tmp_path):
+    database_url = f"sqlite:///{tmp_path / 'serena.db'}"
+    create_schema(database_url)
+    device_ids = seed_synthetic_data(
+        database_url, num_seniors=20, prescriptions_per_senior=4
+    )
+    assert len(device_ids) == 20
+    with get_engine(database_url).connect() as connection:
+        prescriptions = connection.execute(
+            text("SELECT COUNT(*) FROM prescription")
+        ).scalar()
+    assert prescriptions == 80
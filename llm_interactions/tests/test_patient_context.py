@@ -0,0 +1,41 @@
+"""test patient context query"""
+
+import json
+import os
+import sys
+
+CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
+MODULE_DIR = os.path.dirname(CURRENT_DIR)
+PROJECT_DIR = os.path.dirname(MODULE_DIR)
+sys.path.append(MODULE_DIR)
+sys.path.append(PROJECT_DIR)
+
+from llm_fixtures import *
+
+from llm_interactions.database.engine_registry import get_pool_stats
+from llm_interactions.database.patient_context import fetch_patient_context
+
+
+def test_fetch_patient_context(
+    mock_sqlite_db_url, mock_device_id, mock_prescription_query_response
+):
+    context = fetch_patient_context(mock_sqlite_db_url, mock_device_id)
+    assert context.senior_id == 1
+    assert [d.disease_name for d in context.diagnoses] == ["Rinite alérgica"]
+    assert [s["medicine_name"] for s in context.stock_list()] == [
+        "Paracetamol",
+        "Loratadina",
+    ]
+    assert json.loads(context.prescriptions_json()) == json.loads(
+        mock_prescription_query_response
+    )
+
+
+def test_fetch_patient_context_is_one_round_trip(mock_sqlite_db_url, mock_device_id):
+    before = get_pool_stats(mock_sqlite_db_url)["checkouts"]
+    fetch_patient_context(mock_sqlite_db_url, mock_device_id)
+    assert get_pool_stats(mock_sqlite_db_url)["checkouts"] == before + 1
+
+
+def test_fetch_patient_context_unknown_device(mock_sqlite_db_url):
+    assert fetch_patient_context(mock_sqlite_db_url, "SERENA404") is None
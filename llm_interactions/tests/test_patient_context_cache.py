@@ -0,0 +1,87 @@
+"""test patient context cache"""
+
+import os
+import sys
+
+CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
+MODULE_DIR = os.path.dirname(CURRENT_DIR)
+PROJECT_DIR = os.path.dirname(MODULE_DIR)
+sys.path.append(MODULE_DIR)
+sys.path.append(PROJECT_DIR)
+
+from llm_fixtures import *
+
+from llm_interactions.cache.patient_context_cache import PatientContextCache
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def counting_loaders():
+    calls = {"diagnoses": 0, "prescriptions": 0}
+
+    def make_loader(section):
+        def load(database_url, device_id):
+            calls[section] += 1
+            return f"{section} of {device_id}"
+
+        return load
+
+    return calls, {section: make_loader(section) for section in calls}
+
+
+def test_cache_hit_skips_loader(counting_loaders, mock_device_id):
+    calls, loaders = counting_loaders
+    cache = PatientContextCache(loaders=loaders)
+    for _ in range(3):
+        assert cache.get_diagnoses("db", mock_device_id) == "diagnoses of SERENA001"
+    assert calls["diagnoses"] == 1
+    assert cache.stats["hits"] == 2
+
+
+def test_cache_expires_after_ttl(counting_loaders, mock_device_id):
+    calls, loaders = counting_loaders
+    clock = FakeClock()
+    cache = PatientContextCache(ttl_seconds=10, loaders=loaders, clock=clock)
+    cache.get_prescriptions("db", mock_device_id)
+    clock.now = 11
+    cache.get_prescriptions("db", mock_device_id)
+    assert calls["prescriptions"] == 2
+
+
+def test_cache_evicts_least_recently_used_device(counting_loaders):
+    calls, loaders = counting_loaders
+    cache = PatientContextCache(max_devices=2, loaders=loaders)
+    cache.get_diagnoses("db", "SERENA001")
+    cache.get_diagnoses("db", "SERENA002")
+    cache.get_diagnoses("db", "SERENA001")
+    cache.get_diagnoses("db", "SERENA003")
+    cache.get_diagnoses("db", "SERENA002")
+    assert calls["diagnoses"] == 4
+    assert cache.stats["evictions"] == 2
+
+
+def test_invalidate_reloads_and_notifies(counting_loaders, mock_device_id):
+    calls, loaders = counting_loaders
+    cache = PatientContextCache(loaders=loaders)
+    notified = list()
+    cache.add_invalidation_listener(notified.append)
+    cache.get_diagnoses("db", mock_device_id)
+    cache.invalidate(mock_device_id)
+    cache.get_diagnoses("db", mock_device_id)
+    assert calls["diagnoses"] == 2
+    assert notified == [mock_device_id]
+
+
+def test_errors_are_not_cached(mock_device_id):
+    cache = PatientContextCache(
+        loaders={"diagnoses": lambda database_url, device_id: "Error: offline"}
+    )
+    cache.get_diagnoses("db", mock_device_id)
+    assert cache.stats["devices"] == 0
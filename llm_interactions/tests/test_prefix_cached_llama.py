@@ -0,0 +1,151 @@
+"""test prefix cached llama backend"""
+
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
+MODULE_DIR = os.path.dirname(CURRENT_DIR)
+PROJECT_DIR = os.path.dirname(MODULE_DIR)
+sys.path.append(MODULE_DIR)
+sys.path.append(PROJECT_DIR)
+
+from llm_fixtures import *
+
+from llm_interactions.backends.prefix_cached_llama import (
+    PrefixCachedLlamaCpp, prompt_static_prefix)
+from llm_interactions.prompt_templates.user_interaction_template import \
+    user_interaction_prompt
+
+
+class FakeLlamaClient:
+    """
+    Mimics the llama_cpp.Llama calls used by the backend, one token per word, and
+    counts the evaluated tokens the way llama.cpp reuses the longest common prefix.
+    """
+
+    def __init__(self):
+        self.input_ids = list()
+        self.n_tokens = 0
+        self.evaluated = 0
+
+    def tokenize(self, text, add_bos=True):
+        return [hash(word) for word in text.decode("utf-8").split()]
+
+    def reset(self):
+        self.n_tokens = 0
+
+    def eval(self, tokens):
+        self.input_ids = self.input_ids[: self.n_tokens] + list(tokens)
+        self.n_tokens = len(self.input_ids)
+        self.evaluated += len(tokens)
+
+    def save_state(self):
+        return list(self.input_ids[: self.n_tokens])
+
+    def load_state(self, state):
+        self.input_ids = list(state)
+        self.n_tokens = len(state)
+
+    def create_completion(self, prompt, stream=False, **kwargs):
+        tokens = self.tokenize(prompt.encode("utf-8"))
+        common = 0
+        while (
+            common < min(self.n_tokens, len(tokens))
+            and self.input_ids[common] == tokens[common]
+        ):
+            common += 1
+        self.n_tokens = common
+        self.eval(tokens[common:] + [hash("resposta")])
+        if stream:
+            return iter([{"choices": [{"text": "{}"}]}])
+        return {"choices": [{"text": "{}"}]}
+
+
+def test_prompt_static_prefix():
+    prefix = prompt_static_prefix(user_interaction_prompt)
+    rendered = user_interaction_prompt.format(
+        diagnoses="nenhum", prescriptions="nenhum", command="dor de cabeça"
+    )
+    assert rendered.startswith(prefix)
+    assert prefix.rstrip().endswith("Histórico de doenças:")
+
+
+def test_prefix_is_evaluated_once_and_saved(tmp_path):
+    prefix = prompt_static_prefix(user_interaction_prompt)
+    prefix_tokens = len(prefix.split())
+    client = FakeLlamaClient()
+    llm = PrefixCachedLlamaCpp(
+        model_path=str(tmp_path / "model.gguf"), static_prefix=prefix, client=client
+    )
+    assert client.evaluated == prefix_tokens
+    assert os.path.exists(llm.prefix_state_path)
+
+    llm.invoke(f"{prefix} nenhum paracetamol dor de cabeça")
+    llm.invoke(f"{prefix} asma loratadina espirros")
+    # only the per-patient suffix and the generated token are evaluated
+    assert client.evaluated == prefix_tokens + (5 + 1) + (3 + 1)
+
+    restarted = FakeLlamaClient()
+    PrefixCachedLlamaCpp(
+        model_path=str(tmp_path / "model.gguf"), static_prefix=prefix, client=restarted
+    )
+    assert restarted.evaluated == 0
+
+
+def test_prefix_is_restored_after_another_prompt(tmp_path):
+    client = FakeLlamaClient()
+    llm = PrefixCachedLlamaCpp(
+        model_path=str(tmp_path / "model.gguf"),
+        static_prefix="instruções fixas da serena",
+        client=client,
+    )
+    llm.invoke("outro prompt qualquer")
+    before = client.evaluated
+    chunks = list(llm.stream("instruções fixas da serena tosse"))
+    assert chunks == ["{}"]
+    assert client.evaluated == before + 2
+
+
+class OverlapCountingClient(FakeLlamaClient):
+    """Records how many completions run at the same time."""
+
+    def __init__(self):
+        super().__init__()
+        self.running = 0
+        self.max_running = 0
+
+    def load_state(self, state):
+        self.running += 1
+        self.max_running = max(self.max_running, self.running)
+        time.sleep(0.01)
+        super().load_state(state)
+        self.running -= 1
+
+    def create_completion(self, prompt, stream=False, **kwargs):
+        self.running += 1
+        self.max_running = max(self.max_running, self.running)
+        time.sleep(0.01)
+        result = super().create_completion(prompt, stream=stream, **kwargs)
+        self.running -= 1
+        return result
+
+
+def test_concurrent_calls_do_not_interleave(tmp_path):
+    prefix = prompt_static_prefix(user_interaction_prompt)
+    client = OverlapCountingClient()
+    llm = PrefixCachedLlamaCpp(
+        model_path=str(tmp_path / "model.gguf"), static_prefix=prefix, client=client
+    )
+    prompts = [
+        user_interaction_prompt.format(
+            diagnoses=f"doença {index}", prescriptions="nenhum", command="dor"
+        )
+        for index in range(4)
+    ]
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        list(executor.map(llm.invoke, prompts))
+        list(executor.map(lambda prompt: list(llm.stream(prompt)), prompts))
+
+    assert client.max_running == 1
@@ -0,0 +1,102 @@
+"""test llm response cache"""
+
+import os
+import sys
+
+CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
+MODULE_DIR = os.path.dirname(CURRENT_DIR)
+PROJECT_DIR = os.path.dirname(MODULE_DIR)
+sys.path.append(MODULE_DIR)
+sys.path.append(PROJECT_DIR)
+
+from llm_fixtures import *
+
+from llm_interactions.cache.patient_context_cache import PatientContextCache
+from llm_interactions.cache.response_cache import (LLMResponseCache,
+                                                   context_fingerprint)
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def mock_llm_response():
+    return {
+        "sintoma": "dor de cabeça",
+        "medicamento_recomendado": "Paracetamol",
+        "dose": "1 comprimido",
+        "sugestão": "Tome um Paracetamol e descanse.",
+    }
+
+
+@pytest.fixture
+def mock_context_hash():
+    return context_fingerprint(
+        {"diagnoses": "nenhum", "prescriptions": "Paracetamol|1 comprimido|2"}
+    )
+
+
+def test_normalized_command_hits(mock_llm_response, mock_context_hash):
+    cache = LLMResponseCache()
+    assert cache.get("Estou com dor de cabeça", mock_context_hash) is None
+    cache.put("Estou com dor de cabeça", mock_context_hash, mock_llm_response)
+    assert cache.get("estou com DOR de cabeca!", mock_context_hash) == mock_llm_response
+    assert cache.stats["hits"] == 1
+    assert cache.stats["misses"] == 1
+
+
+def test_context_change_misses(mock_llm_response, mock_context_hash):
+    cache = LLMResponseCache()
+    cache.put("dor de cabeça", mock_context_hash, mock_llm_response)
+    other_context = context_fingerprint(
+        {"diagnoses": "Asma|2015-03-01", "prescriptions": "Paracetamol|1 comprimido|2"}
+    )
+    assert cache.get("dor de cabeça", other_context) is None
+
+
+def test_ttl_and_lru_eviction(mock_llm_response, mock_context_hash):
+    clock = FakeClock()
+    cache = LLMResponseCache(ttl_seconds=10, max_entries=2, clock=clock)
+    cache.put("dor de cabeça", mock_context_hash, mock_llm_response)
+    cache.put("tosse", mock_context_hash, mock_llm_response)
+    cache.get("dor de cabeça", mock_context_hash)
+    cache.put("febre", mock_context_hash, mock_llm_response)
+    assert cache.get("tosse", mock_context_hash) is None
+    assert cache.stats["evictions"] == 1
+    clock.now = 10
+    assert cache.get("dor de cabeça", mock_context_hash) is None
+
+
+def test_semantic_lookup(mock_llm_response, mock_context_hash):
+    vectors = {
+        "estou com dor de cabeca": [1.0, 0.0, 0.1],
+        "minha cabeca esta doendo": [0.98, 0.05, 0.12],
+        "quero dicas de sono": [0.0, 1.0, 0.0],
+    }
+    cache = LLMResponseCache(embed=vectors.__getitem__, similarity_threshold=0.9)
+    cache.put("Estou com dor de cabeça", mock_context_hash, mock_llm_response)
+    assert cache.get("Minha cabeça está doendo", mock_context_hash) == mock_llm_response
+    assert cache.get("Quero dicas de sono", mock_context_hash) is None
+    assert cache.stats["semantic_hits"] == 1
+
+
+def test_patient_context_invalidation(mock_llm_response, mock_context_hash):
+    cache = LLMResponseCache()
+    patient_cache = PatientContextCache(loaders=dict())
+    patient_cache.add_invalidation_listener(
+        cache.invalidate, sections=("diagnoses", "prescriptions")
+    )
+    cache.put("dor de cabeça", mock_context_hash, mock_llm_response, "SERENA001")
+    cache.put("tosse", mock_context_hash, mock_llm_response, "SERENA002")
+    patient_cache.invalidate("SERENA002", "context")
+    assert cache.get("tosse", mock_context_hash) == mock_llm_response
+    patient_cache.invalidate("SERENA001")
+    assert cache.get("dor de cabeça", mock_context_hash) is None
+    assert cache.get("tosse", mock_context_hash) == mock_llm_response
+    patient_cache.invalidate("SERENA002", "prescriptions")
+    assert cache.get("tosse", mock_context_hash) is None
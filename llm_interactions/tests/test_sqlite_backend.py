@@ -0,0 +1,52 @@
+"""test offline sqlite backend"""
+
+import json
+import os
+import sys
+
+CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
+MODULE_DIR = os.path.dirname(CURRENT_DIR)
+PROJECT_DIR = os.path.dirname(MODULE_DIR)
+sys.path.append(MODULE_DIR)
+sys.path.append(PROJECT_DIR)
+
+from llm_fixtures import *
+from sqlalchemy import text
+from tools.get_compartment_stock_tool import get_compartment_stock_by_device
+from tools.log_interaction_tool import log_interaction
+
+from llm_interactions.database.engine_registry import get_engine
+from llm_interactions.database.sqlite_backend import create_sqlite_database
+
+
+def test_create_sqlite_database(tmp_path):
+    path = str(tmp_path / "serena.db")
+    database_url, device_ids = create_sqlite_database(
+        path, num_seniors=5, prescriptions_per_senior=2
+    )
+    assert len(device_ids) == 5
+    stock = json.loads(
+        get_compartment_stock_by_device.invoke(
+            {"database_url": database_url, "device_id": device_ids[0]}
+        )
+    )
+    assert len(stock) == 6
+    with pytest.raises(FileExistsError):
+        create_sqlite_database(path)
+
+
+def test_sqlite_backend_generates_ids(mock_sqlite_db_url, mock_device_id):
+    for symptom in ["dor de cabeça", "tosse"]:
+        log_interaction.invoke(
+            {
+                "database_url": mock_sqlite_db_url,
+                "symptom": symptom,
+                "suggestion": "Beba água",
+                "device_id": mock_device_id,
+            }
+        )
+    with get_engine(mock_sqlite_db_url).connect() as connection:
+        ids = connection.execute(
+            text("SELECT complaint_id FROM complaint ORDER BY complaint_id")
+        ).fetchall()
+    assert ids == [(1,), (2,)]
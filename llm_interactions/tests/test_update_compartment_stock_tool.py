@@ -0,0 +1,77 @@
+"""test update compartment stock tools"""
+
+import json
+import os
+import sys
+
+CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
+MODULE_DIR = os.path.dirname(CURRENT_DIR)
+PROJECT_DIR = os.path.dirname(MODULE_DIR)
+sys.path.append(MODULE_DIR)
+sys.path.append(PROJECT_DIR)
+
+from llm_fixtures import *
+from tools.update_compartment_stock_amout_tool import (
+    update_compartment_stock, update_compartment_stock_batch)
+
+from llm_interactions.database.patient_context import fetch_patient_context
+
+
+def stock_amounts(database_url, device_id):
+    context = fetch_patient_context(database_url, device_id)
+    return {compartment.stock_id: compartment.amount for compartment in context.stock}
+
+
+def test_update_compartment_stock(mock_sqlite_db_url, mock_device_id):
+    result = json.loads(
+        update_compartment_stock.invoke(
+            {"database_url": mock_sqlite_db_url, "stock_id": 1, "quantity_used": 2}
+        )
+    )
+    assert result["previous_amount"] == 10
+    assert result["new_amount"] == 8
+    assert stock_amounts(mock_sqlite_db_url, mock_device_id)[1] == 8
+
+
+def test_update_compartment_stock_not_enough(mock_sqlite_db_url, mock_device_id):
+    result = json.loads(
+        update_compartment_stock.invoke(
+            {"database_url": mock_sqlite_db_url, "stock_id": 2, "quantity_used": 4}
+        )
+    )
+    assert result["error"].startswith("Not enough stock")
+    assert stock_amounts(mock_sqlite_db_url, mock_device_id)[2] == 3
+
+
+def test_update_compartment_stock_batch_fails_per_row(
+    mock_sqlite_db_url, mock_device_id
+):
+    result = json.loads(
+        update_compartment_stock_batch.invoke(
+            {
+                "database_url": mock_sqlite_db_url,
+                "quantities": {1: 1, 2: 5, 99: 1},
+            }
+        )
+    )
+    assert result["updated"] == [
+        {"stock_id": 1, "previous_amount": 10, "new_amount": 9}
+    ]
+    assert sorted(row["stock_id"] for row in result["failed"]) == [2, 99]
+    assert stock_amounts(mock_sqlite_db_url, mock_device_id) == {1: 9, 2: 3}
+
+
+def test_update_compartment_stock_batch_all_or_nothing(
+    mock_sqlite_db_url, mock_device_id
+):
+    result = json.loads(
+        update_compartment_stock_batch.invoke(
+            {
+                "database_url": mock_sqlite_db_url,
+                "quantities": {1: 1, 2: 5},
+                "all_or_nothing": True,
+            }
+        )
+    )
+    assert result["updated"] == []
+    assert stock_amounts(mock_sqlite_db_url, mock_device_id) == {1: 10, 2: 3}
@@ -0,0 +1,107 @@
+"""test structured output of the user interaction prompt"""
+
+import json
+import os
+import sys
+
+CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
+MODULE_DIR = os.path.dirname(CURRENT_DIR)
+PROJECT_DIR = os.path.dirname(MODULE_DIR)
+sys.path.append(MODULE_DIR)
+sys.path.append(PROJECT_DIR)
+
+from langchain_core.language_models.fake import FakeListLLM
+from langchain_core.language_models.fake_chat_models import (
+    FakeMessagesListChatModel, GenericFakeChatModel)
+from langchain_core.messages import AIMessage
+from langchain_core.runnables import RunnableLambda
+from llm_fixtures import *
+
+from llm_interactions.prompt_templates.user_interaction_schema import (
+    RESPONSE_FIELDS, USER_INTERACTION_JSON_SCHEMA, UserInteractionResponse,
+    build_user_interaction_agent)
+from llm_interactions.prompt_templates.user_interaction_template import \
+    user_interaction_prompt
+from llm_interactions.streaming.incremental_json_parser import \
+    IncrementalJSONFieldParser
+
+
+class FakeToolCallingChatModel(FakeMessagesListChatModel):
+    """Answers every prompt with a call of the first bound tool."""
+
+    def bind_tools(self, tools, **kwargs):
+        arguments = {
+            "sugestao": "Tome um Paracetamol e descanse.",
+            "sintoma": "dor de cabeça",
+            "medicamento_recomendado": "Paracetamol",
+            "dose": "1 comprimido",
+        }
+        message = AIMessage(
+            content="",
+            tool_calls=[{"name": tools[0].__name__, "args": arguments, "id": "call-1"}],
+        )
+        return RunnableLambda(lambda _: message)
+
+
+@pytest.fixture
+def mock_prompt_inputs():
+    return {"diagnoses": "nenhum", "prescriptions": "nenhum", "command": "dor"}
+
+
+def test_schema_matches_prompt_fields():
+    assert list(USER_INTERACTION_JSON_SCHEMA["properties"]) == RESPONSE_FIELDS
+    assert USER_INTERACTION_JSON_SCHEMA["required"] == RESPONSE_FIELDS
+    response = UserInteractionResponse(
+        sugestao="Descanse",
+        sintoma="nenhum",
+        medicamento_recomendado="nenhum",
+        dose="nenhuma",
+    )
+    assert list(response.to_response()) == RESPONSE_FIELDS
+
+
+def test_chat_models_use_native_structured_output(mock_prompt_inputs):
+    agent = build_user_interaction_agent(
+        user_interaction_prompt, FakeToolCallingChatModel(responses=[])
+    )
+    response = agent.invoke(mock_prompt_inputs)
+    assert isinstance(response, UserInteractionResponse)
+    assert response.to_response()["medicamento_recomendado"] == "Paracetamol"
+
+
+def test_text_models_are_chained_as_they_are(mock_prompt_inputs):
+    answer = json.dumps(dict.fromkeys(RESPONSE_FIELDS, "nenhum"), ensure_ascii=False)
+    agent = build_user_interaction_agent(
+        user_interaction_prompt, FakeListLLM(responses=[answer])
+    )
+    parser = IncrementalJSONFieldParser()
+    parser.feed(agent.invoke(mock_prompt_inputs))
+    assert list(parser.result()) == RESPONSE_FIELDS
+
+
+def test_streaming_chat_models_stream_the_prompt_json(mock_prompt_inputs):
+    answer = json.dumps(
+        {
+            "sugestão": "Descanse um pouco.",
+            "sintoma": "cansaço",
+            "medicamento_recomendado": "nenhum",
+            "dose": "nenhuma",
+        },
+        ensure_ascii=False,
+    )
+    agent = build_user_interaction_agent(
+        user_interaction_prompt,
+        GenericFakeChatModel(messages=iter([AIMessage(content=answer)])),
+        streaming=True,
+    )
+    parser = IncrementalJSONFieldParser()
+    chunks = list(agent.stream(mock_prompt_inputs))
+    assert len(chunks) > 1
+    suggestion_chunk = None
+    for index, chunk in enumerate(chunks):
+        for name, value in parser.feed(chunk.content):
+            if name == "sugestão":
+                suggestion_chunk = index
+                assert value == "Descanse um pouco."
+    assert suggestion_chunk < len(chunks) - 1
+    assert parser.result()["dose"] == "nenhuma"
@@ -0,0 +1,210 @@
+"""This file implements asyncio versions of the database tools"""
+
+import asyncio
+import json
+import os
+import sys
+from dataclasses import asdict
+from typing import Any, List, Optional
+
+from langchain.tools import tool
+from sqlalchemy import text
+
+CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
+PARENT_DIR = os.path.dirname(CURRENT_DIR)
+PROJECT_DIR = os.path.dirname(PARENT_DIR)
+sys.path.append(PROJECT_DIR)
+
+from llm_interactions.database.engine_registry import get_async_session
+from llm_interactions.database.patient_context import (CompartmentStock,
+                                                       Diagnosis,
+                                                       PatientContext,
+                                                       PrescriptionItem)
+
+SENIOR_QUERY = text(
+    """
+    SELECT senior_senior_id, senior_user_id
+    FROM serena_device
+    WHERE serena_device_code = :device_id
+    """
+)
+
+DIAGNOSES_QUERY = text(
+    """
+    SELECT dd.disease_name,
+            dd.diagnosed_at
+    FROM serena_device sd
+    JOIN disease_diagnosis dd ON dd.senior_senior_id = sd.senior_senior_id
+    WHERE sd.serena_device_code = :device_id
+    ORDER BY dd.disease_diagnosis_id
+    """
+)
+
+PRESCRIPTIONS_QUERY = text(
+    """
+    SELECT p.prescription_id,
+            pi.medicine_name,
+            pi.dosage,
+            pi.duration_time
+    FROM serena_device sd
+    JOIN prescription p ON p.senior_senior_id = sd.senior_senior_id
+    JOIN prescription_item pi ON p.prescription_id = pi.prescription_prescription_id
+    WHERE sd.serena_device_code = :device_id
+    ORDER BY p.prescription_id, pi.prescription_item_id
+    """
+)
+
+STOCK_QUERY = text(
+    """
+    SELECT c.stock_id,
+            c.medicine_name,
+            c.amount
+    FROM compartment c
+    WHERE c.serena_device_serena_device_code = :device_id
+    ORDER BY c.stock_id
+    """
+)
+
+
+async def _fetch_rows(database_url: str, query, device_id: str) -> List[Any]:
+    async with get_async_session(database_url) as session:
+        result = await session.execute(query, {"device_id": device_id})
+        return result.fetchall()
+
+
+async def fetch_diagnoses(database_url: str, device_id: str) -> List[Diagnosis]:
+    """
+    Fetches the diagnoses of the patient behind a device with a single joined query.
+    """
+    rows = await _fetch_rows(database_url, DIAGNOSES_QUERY, device_id)
+    return [Diagnosis(disease_name=row[0], diagnosed_at=row[1]) for row in rows]
+
+
+async def fetch_prescriptions(
+    database_url: str, device_id: str
+) -> List[PrescriptionItem]:
+    """
+    Fetches the prescription items of the patient behind a device with a single joined query.
+    """
+    rows = await _fetch_rows(database_url, PRESCRIPTIONS_QUERY, device_id)
+    return [
+        PrescriptionItem(
+            prescription_id=row[0],
+            medication_name=row[1],
+            dosage=row[2],
+            duration_time=row[3],
+        )
+        for row in rows
+    ]
+
+
+async def fetch_stock(database_url: str, device_id: str) -> List[CompartmentStock]:
+    """
+    Fetches the compartments of a device.
+    """
+    rows = await _fetch_rows(database_url, STOCK_QUERY, device_id)
+    return [
+        CompartmentStock(stock_id=row[0], medicine_name=row[1], amount=row[2])
+        for row in rows
+    ]
+
+
+async def gather_patient_context(
+    database_url: str, device_id: str
+) -> Optional[PatientContext]:
+    """
+    Runs the senior, diagnoses, prescriptions and stock queries concurrently, each on
+    its own pooled connection, so the wait is the slowest query instead of their sum.
+
+    Parameters:
+        database_url (str): A SQLAlchemy-compatible database URL.
+        device_id (str): The code of the Serena device (serena_device_code).
+
+    Returns:
+        Optional[PatientContext]: The patient context, or None if no senior uses the device.
+    """
+    senior_rows, diagnoses, prescriptions, stock = await asyncio.gather(
+        _fetch_rows(database_url, SENIOR_QUERY, device_id),
+        fetch_diagnoses(database_url, device_id),
+        fetch_prescriptions(database_url, device_id),
+        fetch_stock(database_url, device_id),
+    )
+    if not senior_rows:
+        return None
+    return PatientContext(
+        device_id=device_id,
+        senior_id=senior_rows[0][0],
+        user_id=senior_rows[0][1],
+        diagnoses=diagnoses,
+        prescriptions=prescriptions,
+        stock=stock,
+    )
+
+
+@tool
+async def aget_diagnoses_by_device(database_url: str, device_id: str) -> str:
+    """
+    Retrieves all diagnosed diseases for the patient associated with the given device ID. use everytime to generate a good response.
+
+    Parameters:
+        database_url(str): the database acess url.
+        device_id: The device identifier associated with the patient.
+
+    Returns:
+        A Json listing the diseases diagnosed for the patient.
+    """
+    try:
+        diagnoses = await fetch_diagnoses(database_url, device_id)
+        return json.dumps(
+            [asdict(diagnosis) for diagnosis in diagnoses],
+            indent=2,
+            ensure_ascii=False,
+        )
+    except Exception as e:
+        return f"Error retrieving diagnoses: {str(e)}"
+
+
+@tool
+async def aget_prescriptions_by_device(database_url: str, device_id: str) -> str:
+    """
+    Returns all prescriptions for the patient associated with a given device ID. Use this tool to see what medications the patient is already prescribed. It can be helpful in assessing what they can take for a reported symptom.
+
+    Parameters:
+        database_url(str): the database acess url.
+        device_id: The code of the Serena device (serena_device_code).
+
+    Returns:
+        A JSON string containing all prescription items for the patient.
+    """
+    try:
+        prescriptions = await fetch_prescriptions(database_url, device_id)
+        if not prescriptions:
+            return f"No prescriptions found for senior with device ID '{device_id}'."
+        return json.dumps(
+            [asdict(item) for item in prescriptions], indent=2, ensure_ascii=False
+        )
+    except Exception as e:
+        return f"Error while querying prescriptions: {str(e)}"
+
+
+@tool
+async def aget_compartment_stock_by_device(database_url: str, device_id: str) -> str:
+    """
+    Retrieves the medicines and amounts stored in each compartment of the given device.
+
+    Parameters:
+        database_url(str): the database acess url.
+        device_id: The device identifier associated with the patient.
+
+    Returns:
+        A Json listing the stock_id, medicine_name and amount of every compartment.
+    """
+    try:
+        stock = await fetch_stock(database_url, device_id)
+        return json.dumps(
+            [asdict(compartment) for compartment in stock],
+            indent=2,
+            ensure_ascii=False,
+        )
+    except Exception as e:
+        return f"Error retrieving compartment stock: {str(e)}"
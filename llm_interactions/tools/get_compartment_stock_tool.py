@@ -1,10 +1,18 @@
 """Implements compartment stock toll"""
 
 import json
+import os
+import sys
 
 from langchain.tools import tool
-from sqlalchemy import create_engine, text
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy import text
+
+CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
+PARENT_DIR = os.path.dirname(CURRENT_DIR)
+PROJECT_DIR = os.path.dirname(PARENT_DIR)
+sys.path.append(PROJECT_DIR)
+
+from llm_interactions.database.engine_registry import get_session
 
 
 @tool
@@ -20,9 +28,7 @@ def get_compartment_stock_by_device(database_url: str, device_id: str) -> json:
         A Json listing the diseases diagnosed for the patient, or a message if none are found.
     """
     try:
-        engine = create_engine(database_url, echo=True)
-        Session = sessionmaker(bind=engine)
-        session = Session()
+        session = get_session(database_url)
 
         compartment_query = text(
             """
@@ -1,11 +1,19 @@
 """This file implements the get_diagnoses_by_device tool"""
 
 import json
+import os
+import sys
 from datetime import datetime
 
 from langchain.tools import tool
-from sqlalchemy import create_engine, text
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy import text
+
+CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
+PARENT_DIR = os.path.dirname(CURRENT_DIR)
+PROJECT_DIR = os.path.dirname(PARENT_DIR)
+sys.path.append(PROJECT_DIR)
+
+from llm_interactions.database.engine_registry import get_session
 
 
 @tool
@@ -21,9 +29,7 @@ def get_diagnoses_by_device(database_url: str, device_id: str) -> json:
         A Json listing the diseases diagnosed for the patient, or a message if none are found.
     """
     try:
-        engine = create_engine(database_url, echo=False)
-        Session = sessionmaker(bind=engine)
-        session = Session()
+        session = get_session(database_url)
 
         senior_query = text(
             """
@@ -0,0 +1,43 @@
+"""This file implements the get fleet context tool"""
+
+import json
+import os
+import sys
+from dataclasses import asdict
+from typing import List
+
+from langchain.tools import tool
+
+CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
+PARENT_DIR = os.path.dirname(CURRENT_DIR)
+PROJECT_DIR = os.path.dirname(PARENT_DIR)
+sys.path.append(PROJECT_DIR)
+
+from llm_interactions.database.fleet_context import fetch_fleet_context
+
+
+@tool
+def get_fleet_context_by_devices(database_url: str, device_ids: List[str]) -> str:
+    """
+    Returns the diagnoses, prescriptions and compartment stock of the patients associated with a list of device IDs, using a fixed number of queries whatever the number of devices. Use it instead of calling the single device tools in a loop.
+
+    Parameters:
+        database_url(str): the database acess url.
+        device_ids: The codes of the Serena devices (serena_device_code).
+
+    Returns:
+        A JSON string mapping every device found to the diagnoses, prescriptions and stock of its patient.
+    """
+    try:
+        fleet_context = fetch_fleet_context(database_url, device_ids)
+        return json.dumps(
+            {
+                device_id: asdict(context)
+                for device_id, context in fleet_context.items()
+            },
+            indent=2,
+            ensure_ascii=False,
+        )
+
+    except Exception as e:
+        return f"Error retrieving fleet context: {str(e)}"
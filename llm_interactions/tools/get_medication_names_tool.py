@@ -1,11 +1,19 @@
 """This file implement get medication tool"""
 
 import json
+import os
+import sys
 from typing import Union
 
 from langchain.tools import tool
-from sqlalchemy import create_engine, text
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy import text
+
+CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
+PARENT_DIR = os.path.dirname(CURRENT_DIR)
+PROJECT_DIR = os.path.dirname(PARENT_DIR)
+sys.path.append(PROJECT_DIR)
+
+from llm_interactions.database.engine_registry import get_session
 
 
 @tool
@@ -26,9 +34,7 @@ def get_medication(database_url: str) -> str:
 
     """
     try:
-        engine = create_engine(database_url, echo=True)
-        Session = sessionmaker(bind=engine)
-        session = Session()
+        session = get_session(database_url)
 
         medication_query = text(
             """
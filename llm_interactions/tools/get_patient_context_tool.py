@@ -0,0 +1,37 @@
+"""This file implements the get patient context tool"""
+
+import json
+import os
+import sys
+from dataclasses import asdict
+
+from langchain.tools import tool
+
+CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
+PARENT_DIR = os.path.dirname(CURRENT_DIR)
+PROJECT_DIR = os.path.dirname(PARENT_DIR)
+sys.path.append(PROJECT_DIR)
+
+from llm_interactions.database.patient_context import fetch_patient_context
+
+
+@tool
+def get_patient_context_by_device(database_url: str, device_id: str) -> str:
+    """
+    Returns the diagnoses, prescriptions and compartment stock of the patient associated with the given device ID in a single lookup. Use it instead of calling the diagnoses, prescriptions and stock tools one after another.
+
+    Parameters:
+        database_url(str): the database acess url.
+        device_id: The code of the Serena device (serena_device_code).
+
+    Returns:
+        A JSON string with the diagnoses, prescriptions and stock of the patient, or a message if none is found.
+    """
+    try:
+        context = fetch_patient_context(database_url, device_id)
+        if context is None:
+            return f"No senior found with device ID '{device_id}'."
+        return json.dumps(asdict(context), indent=2, ensure_ascii=False)
+
+    except Exception as e:
+        return f"Error retrieving patient context: {str(e)}"
@@ -1,11 +1,19 @@
 """This file implements the get prescription tool"""
 
 import json
+import os
+import sys
 from datetime import datetime
 
 from langchain.tools import tool
-from sqlalchemy import create_engine, text
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy import text
+
+CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
+PARENT_DIR = os.path.dirname(CURRENT_DIR)
+PROJECT_DIR = os.path.dirname(PARENT_DIR)
+sys.path.append(PROJECT_DIR)
+
+from llm_interactions.database.engine_registry import get_session
 
 
 @tool
@@ -20,11 +28,8 @@ def get_prescriptions_by_device(database_url: str, device_id: str) -> json:
     Returns:
         A JSON string containing all prescription items for the patient.
     """
-    engine = create_engine(database_url, echo=False)
-    Session = sessionmaker(bind=engine)
-
+    session = get_session(database_url)
     try:
-        session = Session()
         senior_query = text(
             """
             SELECT senior_senior_id
@@ -5,8 +5,14 @@ import sys
 from datetime import datetime
 
 from langchain.tools import tool
-from sqlalchemy import create_engine, text
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy import text
+
+CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
+PARENT_DIR = os.path.dirname(CURRENT_DIR)
+PROJECT_DIR = os.path.dirname(PARENT_DIR)
+sys.path.append(PROJECT_DIR)
+
+from llm_interactions.database.engine_registry import get_session
 
 
 @tool
@@ -25,11 +31,8 @@ def log_interaction(
     Returns:
         A confirmation message with timestamp or error description.
     """
-    engine = create_engine(database_url, echo=True)
-    Session = sessionmaker(bind=engine)
+    session = get_session(database_url)
     try:
-        session = Session()
-
         senior_query = text(
             """
             SELECT senior_senior_id, senior_user_id
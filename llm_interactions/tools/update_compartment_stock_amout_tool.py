@@ -1,10 +1,109 @@
 """Implement updata stock tool"""
 
 import json
+import os
+import sys
+from typing import Dict, List, Tuple
 
 from langchain.tools import tool
-from sqlalchemy import create_engine, text
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy import bindparam, text
+
+CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
+PARENT_DIR = os.path.dirname(CURRENT_DIR)
+PROJECT_DIR = os.path.dirname(PARENT_DIR)
+sys.path.append(PROJECT_DIR)
+
+from llm_interactions.database.engine_registry import get_session
+
+
+def _decrement_statement(quantities: Dict[int, int]):
+    """
+    Builds one conditional UPDATE ... RETURNING for every requested compartment.
+
+    The amount check lives in the WHERE clause, so concurrent dispenses can never
+    drive a compartment below zero and rows without enough stock are simply not updated.
+    The requested rows are a UNION ALL derived table rather than a leading CTE, as
+    the sqlite3 driver only opens a transaction for statements starting with the DML verb.
+    """
+    requested = " UNION ALL ".join(
+        f"SELECT CAST(:stock_id_{index} AS INTEGER) AS stock_id, "
+        f"CAST(:quantity_used_{index} AS INTEGER) AS quantity_used"
+        for index in range(len(quantities))
+    )
+    params = dict()
+    for index, (stock_id, quantity_used) in enumerate(quantities.items()):
+        params[f"stock_id_{index}"] = stock_id
+        params[f"quantity_used_{index}"] = quantity_used
+    query = text(
+        f"""
+        UPDATE compartment
+        SET amount = compartment.amount - requested.quantity_used
+        FROM ({requested}) AS requested
+        WHERE compartment.stock_id = requested.stock_id
+            AND compartment.amount >= requested.quantity_used
+        RETURNING compartment.stock_id, compartment.amount
+        """
+    )
+    return query, params
+
+
+def decrement_compartment_stock(
+    session, quantities: Dict[int, int]
+) -> Tuple[List[dict], List[dict]]:
+    """
+    Decrements many compartments in a single statement, without committing.
+
+    Parameters:
+        session: An open SQLAlchemy session.
+        quantities (Dict[int, int]): Maps each stock_id to the quantity to subtract.
+
+    Returns:
+        Tuple[List[dict], List[dict]]: The updated rows (stock_id, previous_amount, new_amount)
+        and the failed rows (stock_id, error).
+    """
+    failed = [
+        {
+            "stock_id": stock_id,
+            "error": f"Invalid quantity {quantity_used}, it must be a non negative integer",
+        }
+        for stock_id, quantity_used in quantities.items()
+        if not isinstance(quantity_used, int) or quantity_used < 0
+    ]
+    quantities = {
+        stock_id: quantity_used
+        for stock_id, quantity_used in quantities.items()
+        if isinstance(quantity_used, int) and quantity_used >= 0
+    }
+    if not quantities:
+        return list(), failed
+
+    query, params = _decrement_statement(quantities)
+    returned = dict(session.execute(query, params).fetchall())
+    updated = [
+        {
+            "stock_id": stock_id,
+            "previous_amount": returned[stock_id] + quantities[stock_id],
+            "new_amount": returned[stock_id],
+        }
+        for stock_id in quantities
+        if stock_id in returned
+    ]
+
+    missing = [stock_id for stock_id in quantities if stock_id not in returned]
+    if missing:
+        select_query = text(
+            "SELECT stock_id, amount FROM compartment WHERE stock_id IN :stock_ids"
+        ).bindparams(bindparam("stock_ids", expanding=True))
+        current_amounts = dict(
+            session.execute(select_query, {"stock_ids": missing}).fetchall()
+        )
+        for stock_id in missing:
+            if stock_id not in current_amounts:
+                error = f"Stock ID {stock_id} not found"
+            else:
+                error = f"Not enough stock: current amount is {current_amounts[stock_id]}, tried to subtract {quantities[stock_id]}"
+            failed.append({"stock_id": stock_id, "error": error})
+    return updated, failed
 
 
 @tool
@@ -23,42 +122,18 @@ def update_compartment_stock(
         str: A success message with the new stock amount, or an error message if the operation fails.
     """
     try:
-        engine = create_engine(database_url, echo=True)
-        Session = sessionmaker(bind=engine)
-        session = Session()
-
-        select_query = text("SELECT amount FROM compartment WHERE stock_id = :stock_id")
-        result = session.execute(select_query, {"stock_id": stock_id}).fetchone()
-
-        if result is None:
-            return json.dumps(
-                {"error": f"Stock ID {stock_id} not found"}, ensure_ascii=False
-            )
-
-        current_amount = result[0]
-        new_amount = current_amount - quantity_used
-
-        if new_amount < 0:
-            return json.dumps(
-                {
-                    "error": f"Not enough stock: current amount is {current_amount}, tried to subtract {quantity_used}"
-                },
-                ensure_ascii=False,
-            )
-
-        update_query = text(
-            "UPDATE compartment SET amount = :new_amount WHERE stock_id = :stock_id"
+        session = get_session(database_url)
+
+        updated, failed = decrement_compartment_stock(
+            session, {stock_id: quantity_used}
         )
-        session.execute(update_query, {"new_amount": new_amount, "stock_id": stock_id})
+        if failed:
+            session.rollback()
+            return json.dumps({"error": failed[0]["error"]}, ensure_ascii=False)
         session.commit()
 
         return json.dumps(
-            {
-                "message": "Stock updated successfully",
-                "stock_id": stock_id,
-                "previous_amount": current_amount,
-                "new_amount": new_amount,
-            },
+            {"message": "Stock updated successfully", **updated[0]},
             ensure_ascii=False,
             indent=2,
         )
@@ -70,3 +145,45 @@ def update_compartment_stock(
 
     finally:
         session.close()
+
+
+@tool
+def update_compartment_stock_batch(
+    database_url: str, quantities: Dict[int, int], all_or_nothing: bool = False
+) -> str:
+    """
+    Subtracts the used quantities from many compartments in one transaction and one round trip.
+
+    Parameters:
+        database_url (str): SQLAlchemy database connection URL.
+        quantities (Dict[int, int]): Maps each stock_id to the quantity of medication to subtract.
+        all_or_nothing (bool): If True, nothing is updated when any compartment fails.
+
+    Returns:
+        str: A JSON with the updated compartments and the failed ones with their errors.
+    """
+    try:
+        session = get_session(database_url)
+
+        quantities = {
+            int(stock_id): quantity_used
+            for stock_id, quantity_used in quantities.items()
+        }
+        updated, failed = decrement_compartment_stock(session, quantities)
+        if failed and all_or_nothing:
+            session.rollback()
+            updated = list()
+        else:
+            session.commit()
+
+        return json.dumps(
+            {"updated": updated, "failed": failed}, ensure_ascii=False, indent=2
+        )
+
+    except Exception as e:
+        return json.dumps(
+            {"error": f"Error updating stock: {str(e)}"}, ensure_ascii=False
+        )
+
+    finally:
+        session.close()
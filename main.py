@@ -1,12 +1,28 @@
 """this file implements AI agent pipeline"""
 
+import asyncio
 import json
 import os
 import time
 
+from langchain_core.exceptions import OutputParserException
+from pydantic import ValidationError
+
+from llm_interactions.backends.hedged_dispatcher import (HedgedLLMDispatcher,
+                                                         LLMTimeoutError,
+                                                         LLMUnavailableError)
+from llm_interactions.cache.patient_context_cache import patient_context_cache
+from llm_interactions.cache.response_cache import (context_fingerprint,
+                                                   response_cache)
 from llm_interactions.config import *
+from llm_interactions.database.complaint_writer import \
+    ComplaintWriteBehindQueue
+from llm_interactions.prompt_templates.context_encoder import context_encoder
+from llm_interactions.prompt_templates.user_interaction_schema import \
+    build_user_interaction_agent
 from llm_interactions.prompt_templates.user_interaction_template import \
     user_interaction_prompt
+from llm_interactions.routing.intent_router import intent_router
 from llm_interactions.tools.get_compartment_stock_tool import \
     get_compartment_stock_by_device
 from llm_interactions.tools.get_diagnoses_tool import get_diagnoses_by_device
@@ -19,74 +35,240 @@ from llm_interactions.tools.update_compartment_stock_amout_tool import \
 from medicine_recognizer.detection_pipeline import DetectionPipeline
 from utils import (computer_vision_pipeline, dispenser_pipeline,
                    extract_quantity_from_dose, get_stock_ids_by_name,
-                   hash_option, parse_to_json)
+                   hash_option, invoke_user_interaction, parse_to_json,
+                   stream_user_interaction)
+from voice_decoder.async_voice import AsyncVoiceInterface
+from voice_decoder.speech_synthesis import build_synthesizer
+from voice_decoder.stt_backends import build_stt_backend
+from voice_decoder.tts_cache import FIXED_PHRASES, TTSCache, default_cache_dir
 from voice_decoder.voice_decoder import VoiceDecoder
+from voice_decoder.wake_word import WakeWordSpotter
 
-DATABASE_URL = f"postgresql://{os.getenv('DB_USER')}:{os.getenv('DB_PASSWORD')}@{os.getenv('DB_HOST')}:{os.getenv('DB_PORT')}/{os.getenv('DB_NAME')}"
+VOICE_CONTINUOUS_CAPTURE = (
+    os.getenv("VOICE_CONTINUOUS_CAPTURE", "true").lower() == "true"
+)
+VOICE_BARGE_IN = os.getenv("VOICE_BARGE_IN", "false").lower() == "true"
+STT_BACKEND = os.getenv("STT_BACKEND", "google").lower()
+TTS_ENGINE = os.getenv("TTS_ENGINE", "gtts").lower()
+WAKE_WORD_TEMPLATES = os.getenv(
+    "WAKE_WORD_TEMPLATES",
+    os.path.join(os.path.dirname(__file__), "voice_decoder", "wake_word_templates"),
+)
+WAKE_WORD_THRESHOLD = float(os.getenv("WAKE_WORD_THRESHOLD", "8.0"))
+WAKE_WORD_MIN_TEMPLATES = int(os.getenv("WAKE_WORD_MIN_TEMPLATES", "3"))
+DATABASE_URL = os.getenv(
+    "DATABASE_URL",
+    f"postgresql://{os.getenv('DB_USER')}:{os.getenv('DB_PASSWORD')}@{os.getenv('DB_HOST')}:{os.getenv('DB_PORT')}/{os.getenv('DB_NAME')}",
+)
+LLM_ANSWER_ERRORS = (
+    LLMTimeoutError,
+    LLMUnavailableError,
+    ValueError,
+    ValidationError,
+    OutputParserException,
+)
 
 
 def run_serena_assistent(database_url: str, device_id: str):
-    decoder = VoiceDecoder(language="pt-BR", wake_word="Serena")
-    while True:
-        if decoder.listen_for_wake_word():
-            command = decoder.audio_to_string()
-            print(command)
-            while not command.strip():
-                decoder.string_to_speech("Desculpe, não entendi. Pode repetir?")
-                command = decoder.audio_to_string()
-            user_interaction_agent = user_interaction_prompt | llm
-            diagnoses = get_diagnoses_by_device(
-                {"database_url": database_url, "device_id": device_id}
+    wake_word_spotter = WakeWordSpotter.from_directory(
+        WAKE_WORD_TEMPLATES,
+        threshold=WAKE_WORD_THRESHOLD,
+        min_templates=WAKE_WORD_MIN_TEMPLATES,
+    )
+    if not wake_word_spotter.ready:
+        print(
+            f"Only {wake_word_spotter.template_count} wake word templates in "
+            f"{WAKE_WORD_TEMPLATES}, the local wake word spotter is off and every phrase "
+            f"goes to the speech recognizer until {WAKE_WORD_MIN_TEMPLATES} phrases of "
+            "the wake word alone are enrolled"
+        )
+    decoder = VoiceDecoder(
+        language="pt-BR",
+        wake_word="Serena",
+        continuous_capture=VOICE_CONTINUOUS_CAPTURE,
+        stt_backend=build_stt_backend(STT_BACKEND, language="pt-BR"),
+        synthesize=build_synthesizer(TTS_ENGINE),
+        tts_cache=(
+            TTSCache(default_cache_dir(), build_synthesizer(TTS_ENGINE))
+            if TTS_ENGINE == "gtts"
+            else None
+        ),
+        prerender_phrases=FIXED_PHRASES,
+        wake_word_spotter=wake_word_spotter,
+        barge_in=VOICE_BARGE_IN,
+    )
+    complaint_queue = ComplaintWriteBehindQueue(database_url).start()
+    try:
+        patient_context_cache.warm_up(database_url, [device_id])
+    except Exception as e:
+        print(f"Could not warm up the patient context cache: {e}")
+    user_interaction_agent = HedgedLLMDispatcher(
+        [
+            (
+                name,
+                build_user_interaction_agent(
+                    user_interaction_prompt,
+                    backend,
+                    structured=llm_structured_output,
+                    streaming=llm_streaming,
+                ),
             )
-            prescriptions = get_prescriptions_by_device(
-                {"database_url": database_url, "device_id": device_id}
+            for name, backend in llm_backends
+        ],
+        latency_budget=llm_latency_budget,
+        hedge_delay=llm_hedge_delay,
+    )
+    voice = AsyncVoiceInterface(decoder)
+    try:
+        asyncio.run(
+            serena_conversation(
+                voice,
+                user_interaction_agent,
+                complaint_queue,
+                database_url,
+                device_id,
             )
-            user_interaction_inputs = dict()
-            user_interaction_inputs["command"] = command
-            user_interaction_inputs["diagnoses"] = diagnoses
-            user_interaction_inputs["prescriptions"] = prescriptions
-            response = user_interaction_agent.invoke(user_interaction_inputs)
-            parsed_response = parse_to_json(response)
-            log_interaction(
-                {
-                    "device_id": device_id,
-                    "database_url": database_url,
-                    "symptom": parsed_response["sintoma"],
-                    "suggestion": parsed_response["sugestão"],
-                }
+        )
+    finally:
+        voice.close()
+
+
+async def serena_conversation(
+    voice: AsyncVoiceInterface,
+    user_interaction_agent,
+    complaint_queue: ComplaintWriteBehindQueue,
+    database_url: str,
+    device_id: str,
+):
+    decoder = voice.decoder
+    while await voice.wait_for_wake_word():
+        context_task = asyncio.ensure_future(
+            patient_context_cache.aget_context(database_url, device_id)
+        )
+        command = await voice.ask("estou ouvindo no que posso ajudar")
+        print(command)
+        while not command.strip():
+            command = await voice.ask("Desculpe, não entendi. Pode repetir?")
+        patient_context = await context_task
+        if patient_context is None:
+            await voice.speak("Este dispositivo não está associado a nenhum paciente")
+            continue
+        routed_answer = intent_router.route(command, patient_context)
+        if routed_answer is not None and routed_answer.response is None:
+            await voice.speak(routed_answer.speech)
+            continue
+        user_interaction_inputs = dict()
+        user_interaction_inputs["command"] = command
+        encoded_context = context_encoder.encode(patient_context)
+        user_interaction_inputs.update(encoded_context.prompt_inputs())
+        context_hash = context_fingerprint(encoded_context.prompt_inputs())
+        if routed_answer is not None:
+            parsed_response = routed_answer.response
+        else:
+            parsed_response = response_cache.get(command, context_hash)
+        suggestion_speech = None
+        if parsed_response is None:
+            try:
+                if llm_streaming:
+                    parsed_response, suggestion_speech = await voice.run(
+                        stream_user_interaction,
+                        user_interaction_agent,
+                        user_interaction_inputs,
+                        decoder,
+                    )
+                else:
+                    parsed_response = await voice.run(
+                        invoke_user_interaction,
+                        user_interaction_agent,
+                        user_interaction_inputs,
+                    )
+            except LLM_ANSWER_ERRORS as e:
+                print(e)
+                await voice.speak(
+                    "Desculpe, não consegui responder agora. Tente novamente em instantes."
+                )
+                continue
+            response_cache.put(command, context_hash, parsed_response, device_id)
+        if suggestion_speech is None:
+            suggestion_speech = asyncio.ensure_future(
+                voice.speak(parsed_response["sugestão"])
             )
-            decoder.string_to_speech(
-                f"{parsed_response['sugestão']},você gostaria de tomar via dispenser ou utilizando a câmera"
+        else:
+            suggestion_speech = asyncio.ensure_future(voice.run(suggestion_speech.join))
+        complaint_queue.submit(
+            device_id, parsed_response["sintoma"], parsed_response["sugestão"]
+        )
+        await suggestion_speech
+        option = await voice.ask(
+            "você gostaria de tomar via dispenser ou utilizando a câmera"
+        )
+        hashed_option = hash_option(option)
+        while hashed_option is None:
+            option = await voice.ask(
+                "opção selecionada invalida, por favor fale novamente e escolha entre câmera ou dispenser"
             )
-            option = decoder.audio_to_string()
             hashed_option = hash_option(option)
-            while hashed_option is None:
-                decoder.string_to_speech(
-                    "opção selecionada invalida, por favor fale novamente e escolha entre câmera ou dispenser"
-                )
-                option = decoder.audio_to_string()
-                hashed_option = hash_option(option)
 
-            if hashed_option == 1:
-                medicine_name = parsed_response["medicamento_recomendado"]
-                quantity_used = extract_quantity_from_dose(parsed_response["dose"])
-                quantity_used_list = list()
-                quantity_used_list.append(quantity_used)
-                dispenser_pipeline(
-                    database_url,
-                    device_id,
-                    medicine_names=medicine_name,
-                    quantity_used_list=quantity_used_list,
-                    decoder=decoder,
-                )
-            if hashed_option == 2:
-                medicine_names = list()
-                medicine_names.append(parsed_response["medicamento_recomendado"])
-                computer_vision_pipeline(database_url, medicine_names, decoder)
+        if hashed_option == 1:
+            medicine_name = parsed_response["medicamento_recomendado"]
+            quantity_used = extract_quantity_from_dose(parsed_response["dose"])
+            quantity_used_list = list()
+            quantity_used_list.append(quantity_used)
+            await voice.run(
+                dispenser_pipeline,
+                database_url,
+                device_id,
+                medicine_names=medicine_name,
+                quantity_used_list=quantity_used_list,
+                decoder=decoder,
+                compartment_stock=patient_context.stock_list(),
+            )
+            patient_context_cache.invalidate(device_id, "context")
+        if hashed_option == 2:
+            medicine_names = list()
+            medicine_names.append(parsed_response["medicamento_recomendado"])
+            await voice.run(
+                computer_vision_pipeline, database_url, medicine_names, decoder
+            )
 
 
 def test_serena_assistent(database_url: str, device_id: str):
-    decoder = VoiceDecoder(language="pt-BR", wake_word="Serena")
+    decoder = VoiceDecoder(
+        language="pt-BR",
+        wake_word="Serena",
+        continuous_capture=VOICE_CONTINUOUS_CAPTURE,
+        stt_backend=build_stt_backend(STT_BACKEND, language="pt-BR"),
+        synthesize=build_synthesizer(TTS_ENGINE),
+        tts_cache=(
+            TTSCache(default_cache_dir(), build_synthesizer(TTS_ENGINE))
+            if TTS_ENGINE == "gtts"
+            else None
+        ),
+        prerender_phrases=FIXED_PHRASES,
+        wake_word_spotter=wake_word_spotter,
+    )
+    event_loop = asyncio.new_event_loop()
+    complaint_queue = ComplaintWriteBehindQueue(database_url).start()
+    try:
+        patient_context_cache.warm_up(database_url, [device_id])
+    except Exception as e:
+        print(f"Could not warm up the patient context cache: {e}")
+    user_interaction_agent = HedgedLLMDispatcher(
+        [
+            (
+                name,
+                build_user_interaction_agent(
+                    user_interaction_prompt,
+                    backend,
+                    structured=llm_structured_output,
+                    streaming=llm_streaming,
+                ),
+            )
+            for name, backend in llm_backends
+        ],
+        latency_budget=llm_latency_budget,
+        hedge_delay=llm_hedge_delay,
+    )
     while True:
         if decoder.listen_for_wake_word():
             # command = decoder.audio_to_string()
@@ -95,33 +277,61 @@ def test_serena_assistent(database_url: str, device_id: str):
             while not command.strip():
                 decoder.string_to_speech("Desculpe, não entendi. Pode repetir?")
                 command = decoder.audio_to_string()
-            user_interaction_agent = user_interaction_prompt | llm
-            diagnoses = get_diagnoses_by_device(
-                {"database_url": database_url, "device_id": device_id}
-            )
-            prescriptions = get_prescriptions_by_device(
-                {"database_url": database_url, "device_id": device_id}
+            patient_context = event_loop.run_until_complete(
+                patient_context_cache.aget_context(database_url, device_id)
             )
+            if patient_context is None:
+                decoder.string_to_speech(
+                    "Este dispositivo não está associado a nenhum paciente"
+                )
+                continue
+            routed_answer = intent_router.route(command, patient_context)
+            if routed_answer is not None and routed_answer.response is None:
+                decoder.string_to_speech(routed_answer.speech)
+                continue
             user_interaction_inputs = dict()
             user_interaction_inputs["command"] = command
-            user_interaction_inputs["diagnoses"] = diagnoses
-            user_interaction_inputs["prescriptions"] = prescriptions
-            response = user_interaction_agent.invoke(user_interaction_inputs)
-            print(response.content)
-            parsed_response = parse_to_json(response.content)
+            encoded_context = context_encoder.encode(patient_context)
+            user_interaction_inputs.update(encoded_context.prompt_inputs())
+            print(encoded_context.token_counts)
+            context_hash = context_fingerprint(encoded_context.prompt_inputs())
+            if routed_answer is not None:
+                parsed_response = routed_answer.response
+            else:
+                parsed_response = response_cache.get(command, context_hash)
+            suggestion_speech = None
+            if parsed_response is None:
+                try:
+                    if llm_streaming:
+                        parsed_response, suggestion_speech = stream_user_interaction(
+                            user_interaction_agent, user_interaction_inputs, decoder
+                        )
+                    else:
+                        parsed_response = invoke_user_interaction(
+                            user_interaction_agent, user_interaction_inputs
+                        )
+                except LLM_ANSWER_ERRORS as e:
+                    print(e)
+                    decoder.string_to_speech(
+                        "Desculpe, não consegui responder agora. Tente novamente em instantes."
+                    )
+                    continue
+                print(parsed_response)
+                response_cache.put(command, context_hash, parsed_response, device_id)
+            print(
+                response_cache.stats, intent_router.stats, user_interaction_agent.stats
+            )
+            if suggestion_speech is None:
+                decoder.string_to_speech(parsed_response["sugestão"])
+            else:
+                suggestion_speech.join()
             if parsed_response["medicamento_recomendado"].lower() == "nenhum":
-                decoder.string_to_speech(f"{parsed_response['sugestão']}")
                 continue
-            log_interaction(
-                {
-                    "device_id": device_id,
-                    "database_url": database_url,
-                    "symptom": parsed_response["sintoma"],
-                    "suggestion": parsed_response["sugestão"],
-                }
+            complaint_queue.submit(
+                device_id, parsed_response["sintoma"], parsed_response["sugestão"]
             )
             decoder.string_to_speech(
-                f"{parsed_response['sugestão']},você gostaria de tomar via dispenser ou utilizando a câmera"
+                "você gostaria de tomar via dispenser ou utilizando a câmera"
             )
             option = decoder.audio_to_string()
             hashed_option = hash_option(option)
@@ -143,7 +353,9 @@ def test_serena_assistent(database_url: str, device_id: str):
                     medicine_names=medicine_name,
                     quantity_used_list=quantity_used_list,
                     decoder=decoder,
+                    compartment_stock=patient_context.stock_list(),
                 )
+                patient_context_cache.invalidate(device_id, "context")
             if hashed_option == 2:
                 medicine_names = list()
                 medicine_names.append(parsed_response["medicamento_recomendado"])
@@ -0,0 +1,205 @@
+"""
+This file implements the MedicationNameIndex class, an in-memory fuzzy index of medication
+names used to match the noisy text extracted by the OCR pipeline.
+"""
+
+import re
+import unicodedata
+from collections import defaultdict
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Set
+
+
+def fold_text(text: str) -> str:
+    """
+    Lower-cases a text, strips its accents and keeps only letters, digits and single spaces.
+
+    Parameters:
+        text (str): The text to fold.
+
+    Returns:
+        str: The folded text, e.g. 'Dipirona Sódica' -> 'dipirona sodica'.
+    """
+    decomposed = unicodedata.normalize("NFKD", text.lower())
+    without_accents = "".join(
+        char for char in decomposed if not unicodedata.combining(char)
+    )
+    return " ".join(re.findall(r"[a-z0-9]+", without_accents))
+
+
+def trigrams(text: str) -> Set[str]:
+    """
+    Returns:
+        Set[str]: The character trigrams of a folded text, padded with spaces.
+    """
+    padded = f"  {text} "
+    return {padded[index : index + 3] for index in range(len(padded) - 2)}
+
+
+def edit_distance(first: str, second: str) -> int:
+    """
+    Returns:
+        int: The Levenshtein distance between two strings.
+    """
+    if len(first) < len(second):
+        first, second = second, first
+    previous = list(range(len(second) + 1))
+    for row, first_char in enumerate(first, start=1):
+        current = [row]
+        for column, second_char in enumerate(second, start=1):
+            current.append(
+                min(
+                    previous[column] + 1,
+                    current[column - 1] + 1,
+                    previous[column - 1] + (first_char != second_char),
+                )
+            )
+        previous = current
+    return previous[-1]
+
+
+@dataclass(frozen=True)
+class MedicationMatch:
+    """
+    A candidate medication for an OCR text.
+
+    Attributes:
+        name (str): The medication name as stored in the database.
+        score (float): Similarity between 0 and 1, 1 being an exact match.
+        matched_text (str): The folded OCR words that matched the name.
+    """
+
+    name: str
+    score: float
+    matched_text: str
+
+
+class MedicationNameIndex:
+    """
+    MedicationNameIndex keeps the medication names folded and indexed by trigrams, so an
+    OCR output can be matched against every name with typos, missing accents and
+    multi-word names in well under a millisecond.
+
+    Attributes:
+        min_score (float): Minimum similarity for a candidate to be returned.
+    """
+
+    def __init__(self, medication_names: Iterable[str], min_score: float = 0.75):
+        """
+        Builds the index.
+
+        Parameters:
+            medication_names (Iterable[str]): The medication names to index.
+            min_score (float): Minimum similarity, between 0 and 1, of a returned candidate.
+
+        Raises:
+            ValueError: If min_score is not between 0 and 1.
+        """
+        if not 0 <= min_score <= 1:
+            raise ValueError(f"min_score must be between 0 and 1, got {min_score}")
+        self.min_score = min_score
+        self.__names: Dict[str, str] = dict()
+        self.__trigram_index: Dict[str, Set[str]] = defaultdict(set)
+        self.__trigram_counts: Dict[str, int] = dict()
+        self.__max_words = 1
+        for name in medication_names:
+            folded = fold_text(name)
+            if not folded or folded in self.__names:
+                continue
+            self.__names[folded] = name
+            self.__max_words = max(self.__max_words, len(folded.split(" ")))
+            name_trigrams = trigrams(folded)
+            self.__trigram_counts[folded] = len(name_trigrams)
+            for trigram in name_trigrams:
+                self.__trigram_index[trigram].add(folded)
+
+    def __len__(self) -> int:
+        return len(self.__names)
+
+    def __contains__(self, name: str) -> bool:
+        return fold_text(name) in self.__names
+
+    def _windows(self, words: List[str]) -> Iterable[str]:
+        for size in range(1, self.__max_words + 1):
+            for start in range(len(words) - size + 1):
+                yield " ".join(words[start : start + size])
+
+    def _score(self, window: str, folded_name: str) -> float:
+        if window == folded_name:
+            return 1.0
+        distance = edit_distance(window, folded_name)
+        return 1 - distance / max(len(window), len(folded_name))
+
+    def search(self, text: str, limit: int = 5) -> List[MedicationMatch]:
+        """
+        Ranks the indexed medications found in a text.
+
+        Every run of up to as many words as the longest name is compared with the names
+        sharing trigrams with it, scored by normalized edit distance.
+
+        Parameters:
+            text (str): The OCR output or any free text.
+            limit (int): Maximum number of candidates returned.
+
+        Returns:
+            List[MedicationMatch]: The candidates with score >= min_score, best first,
+            longer matches first among equal scores.
+        """
+        words = fold_text(text).split(" ")
+        best: Dict[str, MedicationMatch] = dict()
+        for window in self._windows([word for word in words if word]):
+            window_trigrams = trigrams(window)
+            overlaps: Dict[str, int] = defaultdict(int)
+            for trigram in window_trigrams:
+                for folded_name in self.__trigram_index.get(trigram, ()):
+                    overlaps[folded_name] += 1
+            for folded_name, overlap in overlaps.items():
+                dice = (
+                    2
+                    * overlap
+                    / (len(window_trigrams) + self.__trigram_counts[folded_name])
+                )
+                if dice < self.min_score / 2:
+                    continue
+                score = self._score(window, folded_name)
+                if score < self.min_score:
+                    continue
+                if folded_name not in best or best[folded_name].score < score:
+                    best[folded_name] = MedicationMatch(
+                        name=self.__names[folded_name], score=score, matched_text=window
+                    )
+        ranked = sorted(
+            best.values(),
+            key=lambda match: (match.score, len(match.matched_text)),
+            reverse=True,
+        )
+        return ranked[:limit]
+
+    def best_match(self, text: str) -> Optional[MedicationMatch]:
+        """
+        Returns:
+            Optional[MedicationMatch]: The best candidate found in the text, if any.
+        """
+        matches = self.search(text, limit=1)
+        return matches[0] if matches else None
+
+    def identifies(self, text: str, name: str) -> bool:
+        """
+        Tells whether a text shows a given medication and no other one as likely, e.g.
+        'PREDNISONA' does not identify Prednisolona even if it is a close candidate.
+
+        Parameters:
+            text (str): The OCR output or any free text.
+            name (str): The expected medication name.
+
+        Returns:
+            bool: Whether the best candidate is the name and no different name scores as high.
+        """
+        matches = self.search(text)
+        if not matches or fold_text(matches[0].name) != fold_text(name):
+            return False
+        return not any(
+            match.score >= matches[0].score
+            for match in matches[1:]
+            if fold_text(match.name) != fold_text(name)
+        )
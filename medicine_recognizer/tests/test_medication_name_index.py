@@ -0,0 +1,86 @@
+"""
+This file contains unit tests for the MedicationNameIndex class, which matches the noisy OCR
+output against the medication names of the database.
+"""
+
+import os
+import sys
+
+import pytest
+
+CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
+MODULE_DIR = os.path.dirname(CURRENT_DIR)
+PROJECT_DIR = os.path.dirname(MODULE_DIR)
+
+sys.path.append(MODULE_DIR)
+sys.path.append(PROJECT_DIR)
+
+from medication_name_index import MedicationNameIndex, fold_text
+
+
+@pytest.fixture
+def medication_index():
+    return MedicationNameIndex(
+        ["Paracetamol", "Ibuprofeno", "Loratadina", "Dipirona Sódica", "Dipirona"]
+    )
+
+
+def test_fold_text():
+    """
+    Test that accents, case and punctuation are removed.
+    """
+    assert fold_text("  Dipirona Sódica, 500mg! ") == "dipirona sodica 500mg"
+
+
+def test_search_exact_name(medication_index):
+    """
+    Test that an exact name inside the OCR text scores 1.
+    """
+    match = medication_index.best_match("ibuprofeno 400 mg caixa com 10 comprimidos")
+    assert match.name == "Ibuprofeno"
+    assert match.score == 1.0
+
+
+def test_search_tolerates_ocr_typos(medication_index):
+    """
+    Test that a name with a missing letter is still found.
+    """
+    assert medication_index.best_match("paracetmol 750").name == "Paracetamol"
+
+
+def test_search_prefers_multi_word_names(medication_index):
+    """
+    Test that the longest name wins when several names match exactly.
+    """
+    assert (
+        medication_index.best_match("DIPIRONA SODICA gotas").name == "Dipirona Sódica"
+    )
+
+
+def test_search_without_medication(medication_index):
+    """
+    Test that unrelated text yields no candidate.
+    """
+    assert medication_index.search("medicamento generico uso adulto") == []
+
+
+def test_min_score_value_error():
+    """
+    Test that an out of range min_score raises a ValueError.
+    """
+    with pytest.raises(ValueError):
+        MedicationNameIndex(["Paracetamol"], min_score=2)
+
+
+def test_identifies_only_the_unambiguous_best_candidate():
+    """
+    Test that a close but different medication is never confirmed as the expected one.
+    """
+    medication_index = MedicationNameIndex(
+        ["Prednisona", "Prednisolona", "Loratadina", "Desloratadina"]
+    )
+    assert medication_index.identifies("PREDNISONA 20mg", "Prednisona")
+    assert not medication_index.identifies("PREDNISONA 20mg", "Prednisolona")
+    assert not medication_index.identifies("LORATADINA", "Desloratadina")
+    assert medication_index.identifies("LORATADINA", "Loratadina")
+    assert not medication_index.identifies("caixa vazia", "Loratadina")
@@ -0,0 +1,16 @@
+-- V001: índices nas chaves estrangeiras filtradas pelas tools de llm_interactions
+
+CREATE INDEX IF NOT EXISTS idx_serena_device_senior
+    ON serena_device (senior_senior_id);
+
+CREATE INDEX IF NOT EXISTS idx_disease_diagnosis_senior
+    ON disease_diagnosis (senior_senior_id);
+
+CREATE INDEX IF NOT EXISTS idx_prescription_senior
+    ON prescription (senior_senior_id);
+
+CREATE INDEX IF NOT EXISTS idx_prescription_item_prescription
+    ON prescription_item (prescription_prescription_id);
+
+CREATE INDEX IF NOT EXISTS idx_compartment_device
+    ON compartment (serena_device_serena_device_code);
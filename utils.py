@@ -2,14 +2,26 @@
 
 import json
 import re
-from typing import Any, Dict, Union
+import threading
+import time
+from typing import Any, Dict, Optional, Tuple, Union
 
+from llm_interactions.prompt_templates.user_interaction_schema import \
+    UserInteractionResponse
+from llm_interactions.streaming.incremental_json_parser import \
+    IncrementalJSONFieldParser
 from llm_interactions.tools.get_compartment_stock_tool import \
     get_compartment_stock_by_device
 from llm_interactions.tools.get_medication_names_tool import get_medication
 from llm_interactions.tools.update_compartment_stock_amout_tool import \
-    update_compartment_stock
+    update_compartment_stock_batch
 from medicine_recognizer.detection_pipeline import DetectionPipeline
+from medicine_recognizer.medication_name_index import (MedicationNameIndex,
+                                                       fold_text)
+
+MEDICATION_INDEX_TTL = 600.0
+
+_medication_indexes: Dict[str, Tuple[MedicationNameIndex, float]] = dict()
 
 
 def get_stock_ids_by_name(medicine_names, stock_data):
@@ -47,34 +59,58 @@ def extract_quantity_from_dose(dose_str):
 
 
 def hash_option(option: str) -> int:
-    if "dispenser" in option:
+    folded_option = fold_text(option)
+    if "dispenser" in folded_option or "dispensador" in folded_option:
         return 1
-    elif "câmera" in option:
+    elif "camera" in folded_option:
         return 2
     return None
 
 
+def get_medication_index(
+    database_url: str, ttl_seconds: float = MEDICATION_INDEX_TTL
+) -> MedicationNameIndex:
+    """
+    Returns the medication name index of a database, rebuilding it from the
+    medication table only when it is older than ttl_seconds.
+
+    Args:
+        database_url (str): The database access url.
+        ttl_seconds (float): Maximum age of the cached index, in seconds.
+
+    Returns:
+        MedicationNameIndex: The cached index of every medication name.
+    """
+    cached = _medication_indexes.get(database_url)
+    if cached is not None and time.monotonic() - cached[1] < ttl_seconds:
+        return cached[0]
+
+    medications = get_medication({"database_url": database_url})
+    if not isinstance(medications, list):
+        raise ValueError(f"Could not load the medication names: {medications}")
+    medication_index = MedicationNameIndex(
+        medication["medication_name"] for medication in medications
+    )
+    _medication_indexes[database_url] = (medication_index, time.monotonic())
+    return medication_index
+
+
 def computer_vision_pipeline(
     database_url: str, medicine_names: Union[str, list], decoder
 ):
-    medication_list = [
-        medication["medication_name"]
-        for medication in get_medication({"database_url": database_url})
-    ]
+    if isinstance(medicine_names, str):
+        medicine_names = [medicine_names]
+    medication_index = get_medication_index(database_url)
+    detection_pipeline = DetectionPipeline()
     for medicine in medicine_names:
         medicine_confirmation = False
-        detection_pipeline = DetectionPipeline()
         while not medicine_confirmation:
             detection_response = detection_pipeline.run_detection()
-            medication_list = [med.lower() for med in medication_list]
-            detection_response = [
-                word.lower() for word in detection_response.split(" ")
-            ]
-            medication_found = set(detection_response) & set(medication_list)
+            medication_found = medication_index.search(detection_response)
             if medication_found:
-                if medicine.lower() not in detection_response:
+                if not medication_index.identifies(detection_response, medicine):
                     decoder.string_to_speech(
-                        f"Esse não é o remédio correto, o remédio correto é {medicine}, você mostrou o {list(medication_found)[0]}"
+                        f"Esse não é o remédio correto, o remédio correto é {medicine}, você mostrou o {medication_found[0].name}"
                     )
                     continue
                 medicine_confirmation = True
@@ -91,24 +127,37 @@ def dispenser_pipeline(
     medicine_names: Union[str, list],
     quantity_used_list: list,
     decoder,
+    compartment_stock: Optional[list] = None,
 ):
-    compartment_stock = get_compartment_stock_by_device(
-        {"database_url": database_url, "device_id": device_id}
-    )
+    if compartment_stock is None:
+        compartment_stock = json.loads(
+            get_compartment_stock_by_device(
+                {"database_url": database_url, "device_id": device_id}
+            )
+        )
+    if isinstance(medicine_names, str):
+        medicine_names = [medicine_names]
     compartment_ids = get_stock_ids_by_name(medicine_names, compartment_stock)
-    if not compartment_ids or medicine_names > compartment_ids:
+    if not compartment_ids or len(compartment_ids) < len(medicine_names):
         computer_vision_pipeline(database_url, medicine_names, decoder)
-    for index in range(len(compartment_ids)):
-        compartment_id = compartment_ids[index]
-        quantity_used = quantity_used_list[index]
-
-        update_compartment_stock(
-            {
-                "database_url": database_url,
-                "stock_id": compartment_id,
-                "quantity_used": quantity_used,
-            }
+    quantities = dict()
+    for compartment_id, quantity_used in zip(compartment_ids, quantity_used_list):
+        if quantity_used is None or quantities.get(compartment_id, 0) is None:
+            # Unknown doses are passed on and reported as invalid by the update
+            quantities[compartment_id] = None
+        else:
+            quantities[compartment_id] = (
+                quantities.get(compartment_id, 0) + quantity_used
+            )
+    if quantities:
+        result = json.loads(
+            update_compartment_stock_batch(
+                {"database_url": database_url, "quantities": quantities}
+            )
         )
+        for error in result.get("failed", list()) + [result.get("error")]:
+            if error:
+                print(f"Stock not updated: {error}")
 
 
 def parse_to_json(llm_output: str) -> Dict[str, Any]:
@@ -135,3 +184,79 @@ def parse_to_json(llm_output: str) -> Dict[str, Any]:
 
     except json.JSONDecodeError as e:
         raise ValueError(f"Failed to parse JSON: {e}")
+
+
+def invoke_user_interaction(
+    user_interaction_agent, user_interaction_inputs: Dict[str, Any]
+) -> Dict[str, Any]:
+    """
+    Invokes the user interaction agent and returns its answer as a dictionary.
+
+    Args:
+        user_interaction_agent: The agent built by build_user_interaction_agent.
+        user_interaction_inputs (Dict[str, Any]): The inputs of the prompt.
+
+    Returns:
+        Dict[str, Any]: The answer, with the 'sugestão', 'sintoma', 'medicamento_recomendado' and 'dose' keys.
+
+    Raises:
+        ValueError: If there is no answer or a free text answer holds no valid JSON.
+    """
+    response = user_interaction_agent.invoke(user_interaction_inputs)
+    if response is None:
+        raise ValueError("The LLM returned no answer.")
+    if isinstance(response, UserInteractionResponse):
+        return response.to_response()
+    return parse_to_json(getattr(response, "content", response))
+
+
+def stream_user_interaction(
+    user_interaction_agent, user_interaction_inputs: Dict[str, Any], decoder=None
+) -> Tuple[Dict[str, Any], Optional[threading.Thread]]:
+    """
+    Streams the user interaction agent and parses its JSON answer field by field, speaking
+    the 'sugestão' field in the background as soon as it is generated. Native structured
+    answers are only complete at the end of the stream and are spoken then, which is why
+    build_user_interaction_agent turns them off for streaming agents.
+
+    Args:
+        user_interaction_agent: The agent built by build_user_interaction_agent.
+        user_interaction_inputs (Dict[str, Any]): The inputs of the prompt.
+        decoder (VoiceDecoder, optional): Speaks the suggestion, nothing is spoken if None.
+
+    Returns:
+        Tuple[Dict[str, Any], Optional[threading.Thread]]: The parsed answer and the thread
+        speaking the suggestion, to join before speaking anything else.
+
+    Raises:
+        ValueError: If no JSON is found or the JSON is invalid.
+    """
+    parser = IncrementalJSONFieldParser()
+    structured_response = None
+    speech = None
+
+    def speak(suggestion: str) -> threading.Thread:
+        thread = threading.Thread(
+            target=decoder.string_to_speech, args=(suggestion,), daemon=True
+        )
+        thread.start()
+        return thread
+
+    for chunk in user_interaction_agent.stream(user_interaction_inputs):
+        if isinstance(chunk, UserInteractionResponse):
+            structured_response = chunk
+            continue
+        content = getattr(chunk, "content", chunk)
+        if not isinstance(content, str) or parser.done:
+            continue
+        for name, value in parser.feed(content):
+            if name == "sugestão" and decoder is not None and speech is None:
+                speech = speak(value)
+
+    if structured_response is not None:
+        parsed_response = structured_response.to_response()
+    else:
+        parsed_response = parser.result()
+    if speech is None and decoder is not None:
+        speech = speak(parsed_response["sugestão"])
+    return parsed_response, speech
@@ -0,0 +1,114 @@
+"""This file implements the asyncio interface of the voice decoder"""
+
+import asyncio
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Optional
+
+LISTEN_TIMEOUT = 10.0
+
+
+class AsyncVoiceInterface:
+    """
+    Runs the blocking speaking, listening and wake word detection of a VoiceDecoder in
+    worker threads behind coroutines, so a conversation can overlap them with each other
+    and with context fetching and LLM calls as asyncio tasks.
+
+    Cancelling a task stops what it is doing: speech stops at the next audio chunk and
+    the wake word detection at the next phrase. Listening stops after its timeout at the
+    latest, the phrase heard meanwhile is discarded.
+    """
+
+    def __init__(self, decoder, max_workers: int = 4):
+        """
+        :param decoder: The VoiceDecoder, barge-in follows its barge_in setting.
+        :param max_workers: Threads running the blocking calls.
+        """
+        self.decoder = decoder
+        self.__executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="voice"
+        )
+
+    async def run(self, function: Callable, *args, **kwargs) -> Any:
+        """
+        Runs any blocking function in the worker threads, e.g. an LLM call.
+
+        :return: The result of the function.
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self.__executor, functools.partial(function, *args, **kwargs)
+        )
+
+    async def _run_stoppable(self, function: Callable, *args) -> Any:
+        stop = threading.Event()
+        future = asyncio.ensure_future(self.run(function, *args, stop))
+        try:
+            return await asyncio.shield(future)
+        except asyncio.CancelledError:
+            stop.set()
+            await asyncio.wait([future])
+            raise
+
+    async def speak(self, text: str, barge_in: Optional[bool] = None) -> bool:
+        """
+        Speaks a text, see VoiceDecoder.string_to_speech.
+
+        :param text: The text to speak.
+        :param barge_in: Whether speech of the user interrupts it, the decoder's setting
+            if None.
+        :return: Whether the text was spoken to the end.
+        """
+
+        def speak(text: str, stop: threading.Event) -> bool:
+            return self.decoder.string_to_speech(text, stop, barge_in)
+
+        return await self._run_stoppable(speak, text)
+
+    async def hear(self, timeout: float = LISTEN_TIMEOUT) -> str:
+        """
+        Listens for a phrase and transcribes it, see VoiceDecoder.audio_to_string.
+
+        :param timeout: Seconds to wait for the phrase to start.
+        :return: The transcript, empty if nothing was understood in time.
+        """
+        future = asyncio.ensure_future(
+            self.run(self.decoder.audio_to_string, timeout=timeout)
+        )
+        try:
+            return await asyncio.shield(future)
+        except asyncio.CancelledError:
+            future.add_done_callback(self._discard_phrase)
+            raise
+
+    def _discard_phrase(self, future: asyncio.Future) -> None:
+        if self.decoder.capture is not None:
+            self.decoder.capture.discard_pending()
+
+    async def wait_for_wake_word(self) -> bool:
+        """
+        Waits for the wake word, without acknowledging it.
+
+        :return: Whether it was detected, False when the audio source ran out.
+        """
+
+        def wait(stop: threading.Event) -> bool:
+            return self.decoder.listen_for_wake_word(stop, acknowledge=False)
+
+        return await self._run_stoppable(wait)
+
+    async def ask(self, question: str, timeout: float = LISTEN_TIMEOUT) -> str:
+        """
+        Speaks a question and listens for the answer. With barge-in, an answer given
+        while the question is spoken interrupts it and is kept.
+
+        :param question: The text to speak.
+        :param timeout: Seconds to wait for the answer to start after the question.
+        :return: The transcript of the answer.
+        """
+        await self.speak(question)
+        return await self.hear(timeout)
+
+    def close(self) -> None:
+        self.__executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,178 @@
+"""This file implements the playback of synthesized speech from memory"""
+
+import io
+import os
+import tempfile
+import threading
+import wave
+from dataclasses import dataclass
+from typing import Optional
+
+PLAYBACK_CHUNK_MS = 50
+
+
+@dataclass(frozen=True)
+class PcmAudio:
+    """
+    :param data: 16-bit interleaved samples.
+    :param sample_rate: Samples per second.
+    :param channels: Number of channels.
+    """
+
+    data: bytes
+    sample_rate: int
+    channels: int = 1
+
+    @property
+    def duration(self) -> float:
+        return len(self.data) / (2 * self.channels * self.sample_rate)
+
+
+def decode_mp3(data: bytes) -> PcmAudio:
+    """
+    Decodes MP3 audio in memory with miniaudio.
+
+    :param data: The MP3 file content.
+    :return: The decoded 16-bit samples.
+    """
+    import miniaudio
+
+    decoded = miniaudio.decode(data, output_format=miniaudio.SampleFormat.SIGNED16)
+    return PcmAudio(decoded.samples.tobytes(), decoded.sample_rate, decoded.nchannels)
+
+
+def decode_wav(data: bytes) -> PcmAudio:
+    """
+    Decodes 16-bit WAV audio in memory.
+
+    :param data: The WAV file content.
+    :return: The samples.
+    :raises ValueError: If the samples are not 16-bit.
+    """
+    with wave.open(io.BytesIO(data), "rb") as wav_file:
+        if wav_file.getsampwidth() != 2:
+            raise ValueError("only 16-bit WAV audio is supported")
+        return PcmAudio(
+            wav_file.readframes(wav_file.getnframes()),
+            wav_file.getframerate(),
+            wav_file.getnchannels(),
+        )
+
+
+def decode_audio(data: bytes) -> PcmAudio:
+    """
+    Decodes WAV or MP3 audio in memory.
+
+    :param data: The file content.
+    :return: The 16-bit samples.
+    """
+    if data[:4] == b"RIFF":
+        return decode_wav(data)
+    return decode_mp3(data)
+
+
+def synthesize_gtts(text: str, language: str = "pt") -> bytes:
+    """
+    Synthesizes speech with gTTS, without writing a file.
+
+    :param text: The text to speak.
+    :param language: The gTTS language code.
+    :return: The MP3 audio.
+    """
+    from gtts import gTTS
+
+    buffer = io.BytesIO()
+    gTTS(text=text, lang=language).write_to_fp(buffer)
+    return buffer.getvalue()
+
+
+class AudioPlayer:
+    """
+    Plays audio from memory on an output stream kept open by PyAudio, in short chunks,
+    so playback starts without writing files and can be interrupted between chunks.
+
+    When miniaudio or PyAudio are missing, the audio is played from a temporary file
+    with playsound, as before.
+    """
+
+    def __init__(self, output_device_index: Optional[int] = None):
+        """
+        :param output_device_index: PyAudio output device, the default one if None.
+        """
+        self.output_device_index = output_device_index
+        self.__pyaudio = None
+        self.__streams = dict()
+        self.__lock = threading.Lock()
+
+    def _stream(self, audio: PcmAudio):
+        key = (audio.sample_rate, audio.channels)
+        with self.__lock:
+            if self.__pyaudio is None:
+                import pyaudio
+
+                self.__pyaudio = pyaudio.PyAudio()
+            if key not in self.__streams:
+                self.__streams[key] = self.__pyaudio.open(
+                    format=self.__pyaudio.get_format_from_width(2),
+                    channels=audio.channels,
+                    rate=audio.sample_rate,
+                    output=True,
+                    output_device_index=self.output_device_index,
+                )
+            return self.__streams[key]
+
+    def play(self, audio: PcmAudio, stop: Optional[threading.Event] = None) -> bool:
+        """
+        Plays decoded audio, blocking until it ends or is stopped.
+
+        :param audio: The samples to play.
+        :param stop: Playback stops at the next chunk once this event is set.
+        :return: Whether the audio was played to the end.
+        """
+        stream = self._stream(audio)
+        chunk_bytes = 2 * audio.channels * audio.sample_rate * PLAYBACK_CHUNK_MS // 1000
+        for start in range(0, len(audio.data), chunk_bytes):
+            if stop is not None and stop.is_set():
+                return False
+            stream.write(audio.data[start : start + chunk_bytes])
+        return True
+
+    def play_encoded(
+        self,
+        data: bytes,
+        stop: Optional[threading.Event] = None,
+        decoded: Optional[PcmAudio] = None,
+    ) -> bool:
+        """
+        Plays WAV or MP3 audio held in memory.
+
+        :param data: The file content.
+        :param stop: Playback stops at the next chunk once this event is set.
+        :param decoded: The samples of data when already decoded, see decode_audio.
+        :return: Whether the audio was played to the end.
+        """
+        try:
+            return self.play(decoded or decode_audio(data), stop)
+        except ImportError:
+            pass
+
+        import playsound
+
+        suffix = ".wav" if data[:4] == b"RIFF" else ".mp3"
+        with tempfile.NamedTemporaryFile(delete=False, suffix=suffix) as fp:
+            fp.write(data)
+        try:
+            playsound.playsound(fp.name)
+        finally:
+            os.remove(fp.name)
+        return True
+
+    def close(self) -> None:
+        with self.__lock:
+            for stream in self.__streams.values():
+                stream.stop_stream()
+                stream.close()
+            self.__streams = dict()
+            if self.__pyaudio is not None:
+                self.__pyaudio.terminate()
+                self.__pyaudio = None
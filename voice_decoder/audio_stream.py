@@ -0,0 +1,490 @@
+"""This file implements continuous audio capture with voice activity detection"""
+
+import queue
+import threading
+import time
+import wave
+from dataclasses import dataclass
+from typing import Callable, Iterator, List, Optional
+
+import numpy as np
+import speech_recognition as sr
+
+SAMPLE_RATE = 16000
+SAMPLE_WIDTH = 2
+FRAME_MS = 30
+
+SPEECH_START = "speech_start"
+SPEECH_END = "speech_end"
+
+
+class RingBuffer:
+    """
+    A fixed size buffer holding the most recent 16-bit samples of the audio stream,
+    addressed by absolute sample positions.
+    """
+
+    def __init__(self, capacity: int):
+        """
+        :param capacity: Number of samples kept.
+        """
+        self.capacity = capacity
+        self.__samples = np.zeros(capacity, dtype=np.int16)
+        self.__written = 0
+        self.__lock = threading.Lock()
+
+    @property
+    def written(self) -> int:
+        """
+        :return: The total number of samples written so far.
+        """
+        with self.__lock:
+            return self.__written
+
+    def write(self, samples: np.ndarray) -> None:
+        """
+        Appends samples, overwriting the oldest ones when the buffer is full.
+
+        :param samples: The new int16 samples.
+        """
+        with self.__lock:
+            total = len(samples)
+            samples = samples[-self.capacity :]
+            start = (self.__written + total - len(samples)) % self.capacity
+            head = min(len(samples), self.capacity - start)
+            self.__samples[start : start + head] = samples[:head]
+            self.__samples[: len(samples) - head] = samples[head:]
+            self.__written += total
+
+    def read(self, start: int, end: Optional[int] = None) -> np.ndarray:
+        """
+        Reads the samples between two absolute positions, clipped to what is still held.
+
+        :param start: Position of the first sample.
+        :param end: Position after the last sample, the current position if None.
+        :return: A copy of the samples.
+        """
+        with self.__lock:
+            end = self.__written if end is None else min(end, self.__written)
+            start = max(start, self.__written - self.capacity, 0)
+            if start >= end:
+                return np.zeros(0, dtype=np.int16)
+            return self.__samples[np.arange(start, end) % self.capacity]
+
+
+class EnergyVAD:
+    """
+    A voice activity detector comparing the energy of each frame to a noise floor that
+    is tracked incrementally on the frames without speech, so no calibration pause is
+    needed and the detector follows slow changes of the room noise.
+    """
+
+    def __init__(
+        self,
+        start_ratio: float = 3.0,
+        end_ratio: float = 2.0,
+        min_energy: float = 150.0,
+        start_frames: int = 3,
+        end_frames: int = 20,
+        floor_adaptation: float = 0.05,
+    ):
+        """
+        :param start_ratio: Energy over noise floor ratio starting speech.
+        :param end_ratio: Energy over noise floor ratio below which a frame is silent.
+        :param min_energy: Minimum RMS energy of speech, for very quiet rooms.
+        :param start_frames: Consecutive voiced frames starting speech.
+        :param end_frames: Consecutive silent frames ending speech.
+        :param floor_adaptation: Weight of each silent frame in the noise floor average.
+        """
+        self.start_ratio = start_ratio
+        self.end_ratio = end_ratio
+        self.min_energy = min_energy
+        self.start_frames = start_frames
+        self.end_frames = end_frames
+        self.floor_adaptation = floor_adaptation
+        self.__floor = None
+        self.__in_speech = False
+        self.__voiced = 0
+        self.__silent = 0
+
+    @property
+    def noise_floor(self) -> Optional[float]:
+        """
+        :return: The current RMS energy of the background noise.
+        """
+        return self.__floor
+
+    @property
+    def in_speech(self) -> bool:
+        return self.__in_speech
+
+    def process(self, frame: np.ndarray) -> Optional[str]:
+        """
+        Classifies the next frame of audio.
+
+        :param frame: The int16 samples of the frame.
+        :return: SPEECH_START or SPEECH_END when the state changes, None otherwise.
+        """
+        energy = float(np.sqrt(np.mean(np.square(frame, dtype=np.float64))))
+        if self.__floor is None:
+            self.__floor = energy
+            return None
+
+        if not self.__in_speech:
+            if energy > max(self.__floor * self.start_ratio, self.min_energy):
+                self.__voiced += 1
+                if self.__voiced >= self.start_frames:
+                    self.__in_speech = True
+                    self.__silent = 0
+                    return SPEECH_START
+            else:
+                self.__voiced = 0
+                self.__floor += self.floor_adaptation * (energy - self.__floor)
+            return None
+
+        if energy < max(self.__floor * self.end_ratio, self.min_energy):
+            self.__silent += 1
+            if self.__silent >= self.end_frames:
+                self.__in_speech = False
+                self.__voiced = 0
+                return SPEECH_END
+        else:
+            self.__silent = 0
+        return None
+
+
+@dataclass
+class Utterance:
+    """
+    A segment of speech found by the voice activity detector.
+
+    :param samples: The int16 samples, with the pre-roll before the speech start.
+    :param sample_rate: Samples per second.
+    :param start: Absolute position of the first sample in the stream.
+    :param end: Absolute position after the last sample in the stream.
+    :param detected_at: time.monotonic() when the end of speech was detected.
+    """
+
+    samples: np.ndarray
+    sample_rate: int
+    start: int
+    end: int
+    detected_at: float
+
+    @property
+    def duration(self) -> float:
+        return len(self.samples) / self.sample_rate
+
+    def to_audio_data(self) -> sr.AudioData:
+        """
+        :return: The utterance as speech_recognition audio, ready for any recognizer.
+        """
+        return sr.AudioData(self.samples.tobytes(), self.sample_rate, SAMPLE_WIDTH)
+
+
+class MicrophoneSource:
+    """
+    The default microphone, read in 16-bit mono frames.
+    """
+
+    def __init__(
+        self,
+        sample_rate: int = SAMPLE_RATE,
+        device_index: Optional[int] = None,
+        chunk_size: int = SAMPLE_RATE * FRAME_MS // 1000,
+    ):
+        self.sample_rate = sample_rate
+        self.__device_index = device_index
+        self.__chunk_size = chunk_size
+        self.__microphone = None
+
+    def open(self) -> None:
+        self.__microphone = sr.Microphone(
+            device_index=self.__device_index,
+            sample_rate=self.sample_rate,
+            chunk_size=self.__chunk_size,
+        )
+        self.__microphone.__enter__()
+
+    def read(self, num_samples: int) -> bytes:
+        return self.__microphone.stream.read(num_samples)
+
+    def close(self) -> None:
+        if self.__microphone is not None:
+            self.__microphone.__exit__(None, None, None)
+            self.__microphone = None
+
+
+class WavFileSource:
+    """
+    A recorded WAV file played as if it came from the microphone, e.g. to replay a corpus
+    of commands through the voice decoder. Stereo audio is mixed down to mono.
+    """
+
+    def __init__(self, path: str, speed: float = 0.0, tail_seconds: float = 1.0):
+        """
+        :param path: The 16-bit WAV file.
+        :param speed: Playback speed over real time, e.g. 1.0 for real time, as fast as
+            possible if 0.
+        :param tail_seconds: Silence played after the recording, so the last phrase ends.
+        :raises ValueError: If the samples are not 16-bit.
+        """
+        with wave.open(path, "rb") as wav_file:
+            if wav_file.getsampwidth() != SAMPLE_WIDTH:
+                raise ValueError(f"{path} is not a 16-bit WAV file")
+            self.sample_rate = wav_file.getframerate()
+            samples = np.frombuffer(
+                wav_file.readframes(wav_file.getnframes()), dtype=np.int16
+            )
+            channels = wav_file.getnchannels()
+        if channels > 1:
+            samples = samples.reshape(-1, channels).mean(axis=1).astype(np.int16)
+        self.recording_samples = len(samples)
+        self.samples = np.concatenate(
+            [samples, np.zeros(int(self.sample_rate * tail_seconds), dtype=np.int16)]
+        )
+        self.speed = speed
+        self.position = 0
+
+    def open(self) -> None:
+        self.position = 0
+
+    def read(self, num_samples: int) -> bytes:
+        if self.speed > 0:
+            time.sleep(num_samples / self.sample_rate / self.speed)
+        chunk = self.samples[self.position : self.position + num_samples]
+        self.position += len(chunk)
+        return chunk.tobytes()
+
+    def close(self) -> None:
+        pass
+
+
+class ContinuousAudioCapture:
+    """
+    Keeps one audio stream open in a background thread, writes it into a ring buffer
+    and cuts it into utterances with a voice activity detector, so speech is captured
+    from its first frame without opening the microphone or calibrating for each phrase.
+
+    The source is any object with a sample_rate attribute and open(), read(num_samples)
+    returning 16-bit mono bytes, and close() methods. An empty read ends the capture.
+    """
+
+    def __init__(
+        self,
+        source,
+        vad: Optional[EnergyVAD] = None,
+        frame_ms: int = FRAME_MS,
+        buffer_seconds: float = 30.0,
+        pre_roll_ms: int = 300,
+        max_utterance_seconds: float = 15.0,
+    ):
+        """
+        :param source: The audio source, a MicrophoneSource by default in VoiceDecoder.
+        :param vad: The voice activity detector, an EnergyVAD by default.
+        :param frame_ms: Duration of each frame given to the detector.
+        :param buffer_seconds: Duration of audio kept in the ring buffer.
+        :param pre_roll_ms: Audio kept before the detected speech start.
+        :param max_utterance_seconds: Utterances are cut at this duration.
+        """
+        self.source = source
+        self.vad = vad or EnergyVAD()
+        self.sample_rate = source.sample_rate
+        self.frame_samples = self.sample_rate * frame_ms // 1000
+        self.buffer = RingBuffer(int(self.sample_rate * buffer_seconds))
+        self.pre_roll_samples = self.sample_rate * pre_roll_ms // 1000
+        self.max_utterance_samples = int(self.sample_rate * max_utterance_seconds)
+        self.__utterances: queue.Queue = queue.Queue()
+        self.__speech_listeners: List[queue.Queue] = list()
+        self.__speech_start_callbacks: List[Callable[[int], None]] = list()
+        self.__lock = threading.Lock()
+        self.__utterance_start = None
+        self.__discard_before = 0
+        self.__last_utterance: Optional[Utterance] = None
+        self.__stop = threading.Event()
+        self.__thread = None
+        self.__finished = threading.Event()
+
+    @property
+    def finished(self) -> bool:
+        """
+        :return: Whether the source ran out of audio or the capture was stopped.
+        """
+        return self.__finished.is_set()
+
+    def start(self) -> "ContinuousAudioCapture":
+        """
+        Opens the source and starts capturing in a background thread.
+
+        :return: The capture itself.
+        """
+        self.source.open()
+        self.__thread = threading.Thread(target=self._run, daemon=True)
+        self.__thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.__stop.set()
+        if self.__thread is not None:
+            self.__thread.join()
+            self.__thread = None
+
+    def _run(self) -> None:
+        try:
+            while not self.__stop.is_set():
+                data = self.source.read(self.frame_samples)
+                if not data:
+                    break
+                self.process_frame(np.frombuffer(data, dtype=np.int16))
+        finally:
+            self.source.close()
+            self.__finished.set()
+            self.__utterances.put(None)
+            with self.__lock:
+                for listener in self.__speech_listeners:
+                    listener.put(None)
+
+    def process_frame(self, frame: np.ndarray) -> None:
+        """
+        Writes a frame into the ring buffer and emits an utterance when speech ends.
+
+        :param frame: The int16 samples of the frame.
+        """
+        self.buffer.write(frame)
+        event = self.vad.process(frame)
+        written = self.buffer.written
+        with self.__lock:
+            if event == SPEECH_START:
+                speech_start = written - self.vad.start_frames * len(frame)
+                self.__utterance_start = max(0, speech_start - self.pre_roll_samples)
+                self.__publish(self.buffer.read(self.__utterance_start, written))
+                for callback in self.__speech_start_callbacks:
+                    callback(self.__utterance_start)
+            elif self.__utterance_start is not None:
+                self.__publish(frame)
+                if (
+                    event == SPEECH_END
+                    or written - self.__utterance_start >= self.max_utterance_samples
+                ):
+                    utterance = Utterance(
+                        samples=self.buffer.read(self.__utterance_start, written),
+                        sample_rate=self.sample_rate,
+                        start=self.__utterance_start,
+                        end=written,
+                        detected_at=time.monotonic(),
+                    )
+                    self.__utterances.put(utterance)
+                    self.__utterance_start = None
+                    for listener in self.__speech_listeners:
+                        listener.put(utterance)
+
+    def __publish(self, samples: np.ndarray) -> None:
+        for listener in self.__speech_listeners:
+            listener.put((self.__utterance_start, samples.tobytes()))
+
+    def add_speech_start_callback(self, callback: Callable[[int], None]) -> None:
+        """
+        Calls a function from the capture thread every time speech starts, e.g. to stop
+        the playback when the user talks over the assistant. It must not block.
+
+        :param callback: Called with the absolute position of the new utterance.
+        """
+        with self.__lock:
+            self.__speech_start_callbacks.append(callback)
+
+    def remove_speech_start_callback(self, callback: Callable[[int], None]) -> None:
+        with self.__lock:
+            if callback in self.__speech_start_callbacks:
+                self.__speech_start_callbacks.remove(callback)
+
+    @property
+    def last_utterance(self) -> Optional[Utterance]:
+        """
+        :return: The last utterance returned by next_utterance or streamed to its end by
+            speech_stream, e.g. to know when its end of speech was detected.
+        """
+        return self.__last_utterance
+
+    def speech_stream(self, timeout: Optional[float] = None) -> Iterator[bytes]:
+        """
+        Yields the audio of the next utterance while it is captured, from its pre-roll
+        until the end of speech, e.g. for streaming speech recognition. The utterance is
+        then not returned by next_utterance. Utterances dropped by discard_pending are
+        skipped, as in next_utterance.
+
+        :param timeout: Seconds to wait for speech to start, forever if None.
+        :return: 16-bit mono audio chunks, none on timeout.
+        """
+        listener: queue.Queue = queue.Queue()
+        with self.__lock:
+            if self.__finished.is_set():
+                return
+            if self.__utterance_start is not None:
+                listener.put(
+                    (
+                        self.__utterance_start,
+                        self.buffer.read(self.__utterance_start).tobytes(),
+                    )
+                )
+            self.__speech_listeners.append(listener)
+        deadline = None if timeout is None else time.monotonic() + timeout
+        try:
+            while True:
+                remaining = (
+                    None if deadline is None else max(deadline - time.monotonic(), 0)
+                )
+                item = listener.get(timeout=remaining)
+                if item is None:
+                    return
+                if item[0] >= self.__discard_before:
+                    break
+                while not isinstance(item, Utterance):
+                    item = listener.get()
+                    if item is None:
+                        return
+            while not isinstance(item, Utterance):
+                yield item[1]
+                item = listener.get()
+                if item is None:
+                    return
+            self.__last_utterance = item
+        except queue.Empty:
+            return
+        finally:
+            with self.__lock:
+                self.__speech_listeners.remove(listener)
+            self.__discard_before = max(self.__discard_before, self.buffer.written)
+
+    def next_utterance(self, timeout: Optional[float] = None) -> Optional[Utterance]:
+        """
+        Waits for the next utterance.
+
+        :param timeout: Seconds to wait, forever if None.
+        :return: The utterance, or None on timeout or when the capture finished.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            remaining = None if deadline is None else deadline - time.monotonic()
+            if remaining is not None and remaining <= 0:
+                return None
+            try:
+                utterance = self.__utterances.get(timeout=remaining)
+            except queue.Empty:
+                return None
+            if utterance is None:
+                self.__utterances.put(None)
+                return None
+            if utterance.start >= self.__discard_before:
+                self.__last_utterance = utterance
+                return utterance
+
+    def discard_pending(self, before: Optional[int] = None) -> None:
+        """
+        Drops the utterances started until now, e.g. the assistant's own voice picked up
+        by the microphone while it was speaking.
+
+        :param before: Drops the utterances started before this absolute position
+            instead, e.g. to keep the one that interrupted the assistant.
+        """
+        position = self.buffer.written if before is None else before
+        self.__discard_before = max(self.__discard_before, position)
@@ -0,0 +1,125 @@
+"""This file benchmarks the word error rate and real-time factor of the speech-to-text backends"""
+
+import argparse
+import glob
+import os
+import statistics
+import sys
+import time
+from typing import Dict, List, Tuple
+
+import speech_recognition as sr
+
+CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
+PARENT_DIR = os.path.dirname(CURRENT_DIR)
+PROJECT_DIR = os.path.dirname(PARENT_DIR)
+sys.path.append(PROJECT_DIR)
+
+from voice_decoder.stt_backends import (SpeechToTextBackend, build_stt_backend,
+                                        normalize_transcript, word_error_rate)
+
+
+def corpus_files(directory: str) -> List[Tuple[str, str]]:
+    """
+    Lists a corpus of recorded commands, each WAV file with its transcript in a .txt
+    file of the same name.
+
+    :param directory: The corpus folder.
+    :return: The (path, transcript) of every recording with a transcript.
+    """
+    corpus = list()
+    for path in sorted(glob.glob(os.path.join(directory, "*.wav"))):
+        transcript_path = f"{os.path.splitext(path)[0]}.txt"
+        if not os.path.exists(transcript_path):
+            continue
+        with open(transcript_path, encoding="utf-8") as transcript_file:
+            corpus.append((path, transcript_file.read().strip()))
+    return corpus
+
+
+def load_corpus(directory: str) -> List[Tuple[str, sr.AudioData, str]]:
+    """
+    Loads a corpus of recorded commands, see corpus_files.
+
+    :param directory: The corpus folder.
+    :return: The (name, audio, transcript) of every recording with a transcript.
+    """
+    corpus = list()
+    for path, transcript in corpus_files(directory):
+        with sr.AudioFile(path) as source:
+            audio = sr.Recognizer().record(source)
+        corpus.append((os.path.basename(path), audio, transcript))
+    return corpus
+
+
+def benchmark_backend(
+    backend: SpeechToTextBackend, corpus: List[Tuple[str, sr.AudioData, str]]
+) -> Dict[str, float]:
+    """
+    Transcribes the corpus with a backend.
+
+    :param backend: The backend.
+    :param corpus: The recordings, see load_corpus.
+    :return: Word error rate over the corpus, real-time factor (processing time over
+        audio duration), p50 and p95 latency in milliseconds and failures.
+    """
+    errors = reference_words = 0.0
+    audio_seconds = processing_seconds = 0.0
+    latencies = list()
+    failures = 0
+    for _, audio, transcript in corpus:
+        started_at = time.perf_counter()
+        try:
+            hypothesis = backend.transcribe(audio)
+        except (sr.UnknownValueError, sr.RequestError):
+            hypothesis = ""
+            failures += 1
+        latency = time.perf_counter() - started_at
+        words = len(normalize_transcript(transcript))
+        errors += word_error_rate(transcript, hypothesis) * words
+        reference_words += words
+        audio_seconds += len(audio.frame_data) / (
+            audio.sample_rate * audio.sample_width
+        )
+        processing_seconds += latency
+        latencies.append(latency * 1000)
+
+    latencies.sort()
+    return {
+        "wer": errors / max(reference_words, 1),
+        "rtf": processing_seconds / max(audio_seconds, 1e-9),
+        "p50_ms": statistics.median(latencies) if latencies else 0.0,
+        "p95_ms": latencies[int(len(latencies) * 0.95)] if latencies else 0.0,
+        "failures": failures,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "--corpus",
+        required=True,
+        help="folder of WAV recordings, each with its transcript in a .txt file",
+    )
+    parser.add_argument("--backends", default="google,vosk,whisper")
+    parser.add_argument("--language", default="pt-BR")
+    args = parser.parse_args()
+
+    corpus = load_corpus(args.corpus)
+    print(f"[→] {len(corpus)} recordings loaded from {args.corpus}")
+    print(f"{'backend':<10} {'WER':>7} {'RTF':>7} {'p50 ms':>9} {'p95 ms':>9} failures")
+    for name in args.backends.split(","):
+        try:
+            backend = build_stt_backend(name.strip(), language=args.language)
+        except (ImportError, ValueError, OSError) as e:
+            print(f"{name:<10} unavailable: {e}")
+            continue
+        result = benchmark_backend(backend, corpus)
+        print(
+            f"{name:<10} {result['wer']:>7.3f} {result['rtf']:>7.3f} "
+            f"{result['p50_ms']:>9.1f} {result['p95_ms']:>9.1f} {result['failures']}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,256 @@
+"""This file replays recorded commands through the voice decoder and benchmarks its wake word and recognition latency"""
+
+import argparse
+import glob
+import os
+import statistics
+import sys
+import time
+from typing import Dict, List, Optional
+
+import numpy as np
+import speech_recognition as sr
+
+CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
+PARENT_DIR = os.path.dirname(CURRENT_DIR)
+PROJECT_DIR = os.path.dirname(PARENT_DIR)
+sys.path.append(PROJECT_DIR)
+
+from voice_decoder.audio_stream import EnergyVAD, Utterance, WavFileSource
+from voice_decoder.benchmarks.benchmark_stt import corpus_files
+from voice_decoder.stt_backends import (SpeechToTextBackend, build_stt_backend,
+                                        normalize_transcript, word_error_rate)
+from voice_decoder.voice_decoder import VoiceDecoder
+from voice_decoder.wake_word import WakeWordSpotter, read_wav
+
+
+def speech_end_delay(utterance: Utterance, vad: EnergyVAD, frame_ms: int = 30) -> float:
+    """
+    :param utterance: An utterance cut by the voice activity detector.
+    :param vad: The detector, with the noise floor it ended the utterance with.
+    :param frame_ms: Duration of the frames compared to the noise floor.
+    :return: Milliseconds of audio between the last voiced frame of the utterance and
+        the end of speech decision.
+    """
+    frame = utterance.sample_rate * frame_ms // 1000
+    threshold = max((vad.noise_floor or 0.0) * vad.end_ratio, vad.min_energy)
+    voiced_end = 0
+    for start in range(0, len(utterance.samples), frame):
+        samples = utterance.samples[start : start + frame].astype(np.float64)
+        if np.sqrt(np.mean(np.square(samples))) >= threshold:
+            voiced_end = start + len(samples)
+    return (len(utterance.samples) - voiced_end) / utterance.sample_rate * 1000
+
+
+def replay_recording(
+    path: str,
+    transcript: str,
+    backend: SpeechToTextBackend,
+    wake_word: str = "Serena",
+    wake_word_spotter: Optional[WakeWordSpotter] = None,
+    speed: float = 0.0,
+) -> Dict[str, object]:
+    """
+    Replays a recording through a VoiceDecoder in place of the microphone, as the
+    assistant hears it: phrases are checked for the wake word until it is detected, as
+    listen_for_wake_word does, then the commands are transcribed by audio_to_string,
+    streaming while they are spoken with streaming backends. Latencies are measured from
+    the end of speech decision of each phrase. Streaming backends transcribe while the
+    audio arrives, so their recordings are replayed in real time when speed is 0.
+
+    :param path: The WAV file.
+    :param transcript: What is said in it.
+    :param backend: The speech-to-text backend.
+    :param wake_word: The wake word, expected when the transcript holds it.
+    :param wake_word_spotter: The offline spotter, the wake word is found in the
+        transcripts if None.
+    :param speed: Replay speed over real time, as fast as possible if 0.
+    :return: Whether the wake word was expected and detected, the wake word delay from
+        the end of its phrase to the decision, the end of speech delays and the
+        command transcription latencies in milliseconds, the transcript heard, its word
+        error rate and the recognition failures of the wake word phrases.
+    """
+    if backend.streaming and not speed:
+        speed = 1.0
+    decoder = VoiceDecoder(
+        wake_word=wake_word,
+        audio_source=WavFileSource(path, speed=speed),
+        stt_backend=backend,
+        wake_word_spotter=wake_word_spotter,
+    )
+    capture = decoder.capture
+    result = {
+        "expected": normalize_transcript(wake_word)[0]
+        in normalize_transcript(transcript),
+        "detected": False,
+        "wake_word_ms": None,
+        "end_of_speech_ms": list(),
+        "transcription_ms": list(),
+        "heard": "",
+        "wer": 0.0,
+        "failures": 0,
+    }
+    heard = list()
+    while not result["detected"]:
+        utterance = capture.next_utterance()
+        if utterance is None:
+            break
+        end_of_speech = speech_end_delay(utterance, capture.vad)
+        result["end_of_speech_ms"].append(end_of_speech)
+        audio = utterance.to_audio_data()
+        try:
+            detected = decoder.detect_wake_word(audio)
+        except sr.UnknownValueError:
+            detected = False
+        except sr.RequestError:
+            detected = False
+            result["failures"] += 1
+        if detected:
+            result["detected"] = True
+            result["wake_word_ms"] = (
+                end_of_speech + (time.monotonic() - utterance.detected_at) * 1000
+            )
+        try:
+            heard.append(backend.transcribe(audio))
+        except (sr.UnknownValueError, sr.RequestError):
+            pass
+
+    while result["detected"]:
+        previous = capture.last_utterance
+        text = decoder.audio_to_string()
+        utterance = capture.last_utterance
+        if utterance is previous:
+            break
+        result["transcription_ms"].append(
+            (time.monotonic() - utterance.detected_at) * 1000
+        )
+        result["end_of_speech_ms"].append(speech_end_delay(utterance, capture.vad))
+        if text:
+            heard.append(text)
+
+    capture.stop()
+    result["heard"] = " ".join(heard)
+    result["wer"] = word_error_rate(transcript, result["heard"])
+    return result
+
+
+def percentile(values: List[float], fraction: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(int(len(values) * fraction), len(values) - 1)]
+
+
+def benchmark_voice(
+    directory: str,
+    backend: SpeechToTextBackend,
+    wake_word: str = "Serena",
+    wake_word_spotter: Optional[WakeWordSpotter] = None,
+    speed: float = 0.0,
+) -> Dict[str, float]:
+    """
+    Replays a corpus through the voice decoder, see replay_recording.
+
+    :param directory: The corpus folder, WAV files with their transcripts in .txt files,
+        with and without the wake word.
+    :param backend: The speech-to-text backend.
+    :param wake_word: The wake word.
+    :param wake_word_spotter: The offline spotter, if any.
+    :param speed: Replay speed over real time, as fast as possible if 0.
+    :return: Recordings, wake word accuracy, false accepts and rejects, p50 and p95 of
+        the wake word delay, end of speech delay and transcription latency in
+        milliseconds, word error rate over the corpus and failures.
+    """
+    recordings = correct = false_accepts = false_rejects = failures = 0
+    errors = reference_words = 0.0
+    wake_word_ms, end_of_speech_ms, transcription_ms = list(), list(), list()
+    for path, transcript in corpus_files(directory):
+        result = replay_recording(
+            path, transcript, backend, wake_word, wake_word_spotter, speed
+        )
+        recordings += 1
+        correct += result["expected"] == result["detected"]
+        false_accepts += result["detected"] and not result["expected"]
+        false_rejects += result["expected"] and not result["detected"]
+        failures += result["failures"]
+        if result["wake_word_ms"] is not None:
+            wake_word_ms.append(result["wake_word_ms"])
+        end_of_speech_ms.extend(result["end_of_speech_ms"])
+        transcription_ms.extend(result["transcription_ms"])
+        words = len(normalize_transcript(transcript))
+        errors += result["wer"] * words
+        reference_words += words
+
+    return {
+        "recordings": recordings,
+        "wake_word_accuracy": correct / max(recordings, 1),
+        "false_accepts": false_accepts,
+        "false_rejects": false_rejects,
+        "wake_word_p50_ms": percentile(wake_word_ms, 0.5),
+        "wake_word_p95_ms": percentile(wake_word_ms, 0.95),
+        "end_of_speech_p50_ms": percentile(end_of_speech_ms, 0.5),
+        "end_of_speech_p95_ms": percentile(end_of_speech_ms, 0.95),
+        "transcription_p50_ms": percentile(transcription_ms, 0.5),
+        "transcription_p95_ms": percentile(transcription_ms, 0.95),
+        "wer": errors / max(reference_words, 1),
+        "failures": failures,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "--corpus",
+        required=True,
+        help="folder of WAV recordings, each with its transcript in a .txt file",
+    )
+    parser.add_argument("--backends", default="google,vosk,whisper")
+    parser.add_argument("--language", default="pt-BR")
+    parser.add_argument("--wake-word", default="Serena")
+    parser.add_argument(
+        "--templates", help="folder of wake word templates for the offline spotter"
+    )
+    parser.add_argument("--threshold", type=float, default=8.0)
+    parser.add_argument(
+        "--speed",
+        type=float,
+        default=0.0,
+        help="replay speed over real time, as fast as possible if 0",
+    )
+    args = parser.parse_args()
+
+    print(f"[→] {len(corpus_files(args.corpus))} recordings in {args.corpus}")
+    print(
+        f"{'backend':<10} {'wake acc':>8} {'FA':>3} {'FR':>3} {'wake p50':>9} "
+        f"{'wake p95':>9} {'EOS p50':>8} {'EOS p95':>8} {'STT p50':>8} "
+        f"{'STT p95':>8} {'WER':>6} failures"
+    )
+    for name in args.backends.split(","):
+        try:
+            backend = build_stt_backend(name.strip(), language=args.language)
+        except (ImportError, ValueError, OSError) as e:
+            print(f"{name:<10} unavailable: {e}")
+            continue
+        spotter = None
+        if args.templates:
+            templates = sorted(glob.glob(os.path.join(args.templates, "*.wav")))
+            spotter = WakeWordSpotter(
+                [read_wav(path) for path in templates], threshold=args.threshold
+            )
+        result = benchmark_voice(
+            args.corpus, backend, args.wake_word, spotter, args.speed
+        )
+        print(
+            f"{name:<10} {result['wake_word_accuracy']:>8.3f} "
+            f"{result['false_accepts']:>3} {result['false_rejects']:>3} "
+            f"{result['wake_word_p50_ms']:>9.1f} {result['wake_word_p95_ms']:>9.1f} "
+            f"{result['end_of_speech_p50_ms']:>8.1f} "
+            f"{result['end_of_speech_p95_ms']:>8.1f} "
+            f"{result['transcription_p50_ms']:>8.1f} "
+            f"{result['transcription_p95_ms']:>8.1f} "
+            f"{result['wer']:>6.3f} {result['failures']}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,204 @@
+"""This file implements the streaming text-to-speech of long answers, sentence by sentence"""
+
+import os
+import re
+import shutil
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional
+
+CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
+PROJECT_DIR = os.path.dirname(CURRENT_DIR)
+sys.path.append(PROJECT_DIR)
+
+from voice_decoder.audio_player import decode_audio, synthesize_gtts
+
+MAX_CHUNK_CHARS = 200
+MIN_CHUNK_CHARS = 20
+
+ESPEAK_VOICES = {"pt": "pt-br", "en": "en-us"}
+
+
+def split_sentences(
+    text: str,
+    max_chars: int = MAX_CHUNK_CHARS,
+    min_chars: int = MIN_CHUNK_CHARS,
+) -> List[str]:
+    """
+    Splits a text into the chunks synthesized one at a time: its sentences, joining the
+    ones shorter than min_chars with the next and splitting the ones longer than
+    max_chars at commas, then at spaces.
+
+    :param text: The text to speak.
+    :param max_chars: Longest chunk, except for words longer than it.
+    :param min_chars: Shortest chunk, except for the last one.
+    :return: The chunks, in order.
+    """
+    sentences = re.split(r"(?<=[.!?;:])\s+|\n+", text.strip())
+    pieces = list()
+    for sentence in sentences:
+        sentence = " ".join(sentence.split())
+        if not sentence:
+            continue
+        if len(sentence) <= max_chars:
+            pieces.append(sentence)
+            continue
+        for clause in re.split(r"(?<=,)\s+", sentence):
+            while len(clause) > max_chars:
+                cut = clause.rfind(" ", 0, max_chars + 1)
+                if cut <= 0:
+                    cut = clause.find(" ")
+                    if cut < 0:
+                        break
+                pieces.append(clause[:cut])
+                clause = clause[cut + 1 :]
+            pieces.append(clause)
+
+    chunks = list()
+    for piece in pieces:
+        if (
+            chunks
+            and len(chunks[-1]) < min_chars
+            and len(chunks[-1]) + len(piece) < max_chars
+        ):
+            chunks[-1] = f"{chunks[-1]} {piece}"
+        else:
+            chunks.append(piece)
+    return chunks
+
+
+def synthesize_espeak(text: str, language: str = "pt") -> bytes:
+    """
+    Synthesizes speech offline with espeak-ng, without writing a file.
+
+    :param text: The text to speak.
+    :param language: The language code, 'pt' or 'en'.
+    :return: The WAV audio.
+    :raises RuntimeError: If espeak-ng is not installed or fails.
+    """
+    executable = shutil.which("espeak-ng") or shutil.which("espeak")
+    if executable is None:
+        raise RuntimeError("espeak-ng is not installed")
+    result = subprocess.run(
+        [executable, "--stdout", "-v", ESPEAK_VOICES.get(language, language), text],
+        capture_output=True,
+        check=False,
+    )
+    if result.returncode != 0 or not result.stdout:
+        raise RuntimeError(f"espeak-ng failed: {result.stderr.decode(errors='ignore')}")
+    return result.stdout
+
+
+def build_synthesizer(name: str) -> Callable[[str, str], bytes]:
+    """
+    Selects the text-to-speech engine of the device.
+
+    :param name: 'gtts', online, or 'espeak', offline.
+    :return: The function returning the audio of (text, language).
+    :raises ValueError: If the engine is unknown.
+    """
+    if name == "gtts":
+        return synthesize_gtts
+    if name == "espeak":
+        return synthesize_espeak
+    raise ValueError(f"Unknown TTS engine '{name}', use 'gtts' or 'espeak'")
+
+
+class StreamingSpeaker:
+    """
+    Speaks a text chunk by chunk, synthesizing and decoding the next chunk in a
+    background thread while the current one plays, so the first sentence of a long
+    answer is heard after its own synthesis instead of the whole answer's.
+    """
+
+    def __init__(
+        self,
+        player,
+        synthesize: Callable[[str], bytes],
+        decode: Callable[[bytes], object] = decode_audio,
+        max_chars: int = MAX_CHUNK_CHARS,
+    ):
+        """
+        :param player: The AudioPlayer.
+        :param synthesize: Returns the audio of a chunk of text, e.g. from the TTS cache.
+        :param decode: Decodes the audio for the player, see decode_audio.
+        :param max_chars: Longest chunk, see split_sentences.
+        """
+        self.player = player
+        self.max_chars = max_chars
+        self.__synthesize = synthesize
+        self.__decode = decode
+        self.__executor = ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix="speech-synthesis"
+        )
+        self.__lock = threading.Lock()
+        self.__stats = {
+            "texts": 0,
+            "chunks": 0,
+            "interrupted": 0,
+            "first_audio_ms": 0.0,
+        }
+
+    @property
+    def stats(self) -> Dict[str, float]:
+        """
+        :return: Spoken texts and chunks, interrupted texts and the time to the first
+            audio of the last text, in milliseconds.
+        """
+        with self.__lock:
+            return dict(self.__stats)
+
+    def _prepare(self, text: str):
+        data = self.__synthesize(text)
+        try:
+            return data, self.__decode(data)
+        except ImportError:
+            return data, None
+
+    def speak(self, text: str, stop: Optional[threading.Event] = None) -> bool:
+        """
+        Speaks a text, blocking until it ends or is stopped.
+
+        :param text: The text to speak.
+        :param stop: Playback and synthesis stop at the next audio chunk once this event
+            is set.
+        :return: Whether the text was spoken to the end.
+        """
+        chunks = split_sentences(text, max_chars=self.max_chars)
+        if not chunks:
+            return True
+        started_at = time.perf_counter()
+        pending: List[Future] = [self.__executor.submit(self._prepare, chunks[0])]
+        completed = True
+        try:
+            for index in range(len(chunks)):
+                if index + 1 < len(chunks):
+                    pending.append(
+                        self.__executor.submit(self._prepare, chunks[index + 1])
+                    )
+                data, decoded = pending[index].result()
+                if stop is not None and stop.is_set():
+                    completed = False
+                    break
+                if index == 0:
+                    with self.__lock:
+                        self.__stats["first_audio_ms"] = (
+                            time.perf_counter() - started_at
+                        ) * 1000
+                if not self.player.play_encoded(data, stop, decoded):
+                    completed = False
+                    break
+        finally:
+            for future in pending:
+                future.cancel()
+            with self.__lock:
+                self.__stats["texts"] += 1
+                self.__stats["chunks"] += len(chunks)
+                self.__stats["interrupted"] += 0 if completed else 1
+        return completed
+
+    def close(self) -> None:
+        self.__executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,280 @@
+"""This file implements the speech-to-text backends of the voice decoder"""
+
+import json
+import os
+import re
+import unicodedata
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from typing import Iterable, Iterator, List, Optional
+
+import numpy as np
+import speech_recognition as sr
+
+SAMPLE_RATE = 16000
+
+
+@dataclass(frozen=True)
+class PartialTranscript:
+    """
+    :param text: The transcript so far, or of a finished segment.
+    :param final: Whether the text will not change anymore.
+    """
+
+    text: str
+    final: bool
+
+
+class SpeechToTextBackend(ABC):
+    """
+    The interface of the speech-to-text engines. Errors follow speech_recognition:
+    sr.UnknownValueError when nothing was understood, sr.RequestError when the engine
+    could not be reached.
+    """
+
+    name = "base"
+    streaming = False
+
+    @abstractmethod
+    def transcribe(self, audio: sr.AudioData) -> str:
+        """
+        :param audio: The audio of a phrase.
+        :return: The transcript.
+        """
+
+    def stream(
+        self,
+        chunks: Iterable[bytes],
+        sample_rate: int = SAMPLE_RATE,
+        partials: bool = True,
+    ) -> Iterator[PartialTranscript]:
+        """
+        Transcribes audio as it arrives. Engines without streaming transcribe everything
+        at the end.
+
+        :param chunks: 16-bit mono audio chunks, until the end of the phrase.
+        :param sample_rate: Samples per second of the chunks.
+        :param partials: Whether partial transcripts are wanted, only the final one is
+            computed otherwise.
+        :return: The partial transcripts, the last one is final.
+        """
+        data = b"".join(chunks)
+        if not data:
+            raise sr.UnknownValueError()
+        yield PartialTranscript(
+            self.transcribe(sr.AudioData(data, sample_rate, 2)), final=True
+        )
+
+
+class GoogleSTT(SpeechToTextBackend):
+    """
+    The Google Web Speech API, the cloud path used so far.
+    """
+
+    name = "google"
+
+    def __init__(
+        self, language: str = "pt-BR", recognizer: Optional[sr.Recognizer] = None
+    ):
+        self.language = language
+        self.recognizer = recognizer or sr.Recognizer()
+
+    def transcribe(self, audio: sr.AudioData) -> str:
+        return self.recognizer.recognize_google(audio, language=self.language)
+
+
+class VoskSTT(SpeechToTextBackend):
+    """
+    A CPU-only Kaldi model from Vosk, kept resident, that transcribes while the audio
+    arrives, so the transcript is ready as soon as the phrase ends.
+    """
+
+    name = "vosk"
+    streaming = True
+
+    def __init__(self, model_path: str, sample_rate: int = SAMPLE_RATE, model=None):
+        """
+        :param model_path: Folder of the Vosk model, e.g. vosk-model-small-pt-0.3.
+        :param sample_rate: Samples per second of the audio.
+        :param model: An already loaded vosk.Model, loaded from model_path if None.
+        """
+        self.sample_rate = sample_rate
+        if model is None:
+            from vosk import Model, SetLogLevel
+
+            SetLogLevel(-1)
+            model = Model(model_path)
+        self.model = model
+
+    def _recognizer(self, sample_rate: int):
+        from vosk import KaldiRecognizer
+
+        return KaldiRecognizer(self.model, sample_rate)
+
+    def transcribe(self, audio: sr.AudioData) -> str:
+        *_, transcript = self.stream(
+            [audio.get_raw_data(convert_rate=self.sample_rate, convert_width=2)],
+            self.sample_rate,
+        )
+        return transcript.text
+
+    def stream(
+        self,
+        chunks: Iterable[bytes],
+        sample_rate: int = SAMPLE_RATE,
+        partials: bool = True,
+    ) -> Iterator[PartialTranscript]:
+        recognizer = self._recognizer(sample_rate)
+        segments: List[str] = list()
+        for chunk in chunks:
+            if recognizer.AcceptWaveform(chunk):
+                segment = json.loads(recognizer.Result()).get("text", "")
+                if segment:
+                    segments.append(segment)
+                if partials:
+                    yield PartialTranscript(" ".join(segments), final=False)
+            elif partials:
+                partial = json.loads(recognizer.PartialResult()).get("partial", "")
+                yield PartialTranscript(
+                    " ".join(segments + [partial]).strip(), final=False
+                )
+        segment = json.loads(recognizer.FinalResult()).get("text", "")
+        text = " ".join(segments + [segment]).strip()
+        if not text:
+            raise sr.UnknownValueError()
+        yield PartialTranscript(text, final=True)
+
+
+class WhisperSTT(SpeechToTextBackend):
+    """
+    A quantized Whisper model run on the CPU with faster-whisper and kept resident.
+    Whisper does not stream, so partial transcripts are produced by transcribing the
+    audio received so far every partial_interval seconds, only when they are wanted.
+    """
+
+    name = "whisper"
+    streaming = True
+
+    def __init__(
+        self,
+        model_size: str = "small",
+        language: str = "pt",
+        compute_type: str = "int8",
+        cpu_threads: int = 4,
+        partial_interval: float = 1.0,
+        model=None,
+    ):
+        """
+        :param model_size: Whisper model name or path, e.g. 'base', 'small'.
+        :param language: Language code of the speech.
+        :param compute_type: CTranslate2 quantization, 'int8' for small CPUs.
+        :param cpu_threads: Threads used by the model.
+        :param partial_interval: Seconds of new audio between partial transcripts.
+        :param model: An already loaded faster_whisper.WhisperModel.
+        """
+        self.language = language.split("-")[0]
+        self.partial_interval = partial_interval
+        if model is None:
+            from faster_whisper import WhisperModel
+
+            model = WhisperModel(
+                model_size,
+                device="cpu",
+                compute_type=compute_type,
+                cpu_threads=cpu_threads,
+            )
+        self.model = model
+
+    def _transcribe_samples(self, samples: np.ndarray) -> str:
+        segments, _ = self.model.transcribe(
+            samples.astype(np.float32) / 32768.0,
+            language=self.language,
+            beam_size=1,
+            condition_on_previous_text=False,
+        )
+        return " ".join(segment.text.strip() for segment in segments).strip()
+
+    def transcribe(self, audio: sr.AudioData) -> str:
+        samples = np.frombuffer(
+            audio.get_raw_data(convert_rate=SAMPLE_RATE, convert_width=2),
+            dtype=np.int16,
+        )
+        text = self._transcribe_samples(samples)
+        if not text:
+            raise sr.UnknownValueError()
+        return text
+
+    def stream(
+        self,
+        chunks: Iterable[bytes],
+        sample_rate: int = SAMPLE_RATE,
+        partials: bool = True,
+    ) -> Iterator[PartialTranscript]:
+        received: List[bytes] = list()
+        pending_samples = 0
+        for chunk in chunks:
+            received.append(chunk)
+            pending_samples += len(chunk) // 2
+            if partials and pending_samples >= self.partial_interval * sample_rate:
+                pending_samples = 0
+                samples = np.frombuffer(b"".join(received), dtype=np.int16)
+                yield PartialTranscript(self._transcribe_samples(samples), final=False)
+        if not received:
+            raise sr.UnknownValueError()
+        audio = sr.AudioData(b"".join(received), sample_rate, 2)
+        yield PartialTranscript(self.transcribe(audio), final=True)
+
+
+def build_stt_backend(
+    name: str, language: str = "pt-BR", **kwargs
+) -> SpeechToTextBackend:
+    """
+    Builds the speech-to-text backend selected for the device.
+
+    :param name: 'google', 'vosk' or 'whisper'.
+    :param language: Language code of the speech.
+    :param kwargs: Options of the backend. Vosk reads its model folder from the
+        VOSK_MODEL_PATH env var and Whisper its model from WHISPER_MODEL by default.
+    :return: The backend.
+    :raises ValueError: If the backend is unknown.
+    """
+    if name == "google":
+        return GoogleSTT(language=language, **kwargs)
+    if name == "vosk":
+        kwargs.setdefault(
+            "model_path", os.getenv("VOSK_MODEL_PATH", "models/vosk-model-small-pt-0.3")
+        )
+        return VoskSTT(**kwargs)
+    if name == "whisper":
+        kwargs.setdefault("model_size", os.getenv("WHISPER_MODEL", "small"))
+        return WhisperSTT(language=language, **kwargs)
+    raise ValueError(f"Unknown STT backend '{name}', use 'google', 'vosk' or 'whisper'")
+
+
+def normalize_transcript(text: str) -> List[str]:
+    """
+    :return: The words of a transcript, lowercase and without accents or punctuation.
+    """
+    text = unicodedata.normalize("NFKD", text.lower())
+    text = "".join(char for char in text if not unicodedata.combining(char))
+    return re.sub(r"[^\w\s]", " ", text).split()
+
+
+def word_error_rate(reference: str, hypothesis: str) -> float:
+    """
+    :param reference: The expected transcript.
+    :param hypothesis: The transcript of the backend.
+    :return: (substitutions + deletions + insertions) / reference words.
+    """
+    reference_words = normalize_transcript(reference)
+    hypothesis_words = normalize_transcript(hypothesis)
+    distances = list(range(len(hypothesis_words) + 1))
+    for i, reference_word in enumerate(reference_words, start=1):
+        previous_diagonal, distances[0] = distances[0], i
+        for j, hypothesis_word in enumerate(hypothesis_words, start=1):
+            previous_diagonal, distances[j] = distances[j], min(
+                distances[j] + 1,
+                distances[j - 1] + 1,
+                previous_diagonal + (reference_word != hypothesis_word),
+            )
+    return distances[-1] / max(len(reference_words), 1)
@@ -0,0 +1,136 @@
+"""test asyncio voice interface"""
+
+import asyncio
+import io
+import os
+import sys
+import time
+import wave
+
+import numpy as np
+
+CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
+MODULE_DIR = os.path.dirname(CURRENT_DIR)
+PROJECT_DIR = os.path.dirname(MODULE_DIR)
+sys.path.append(PROJECT_DIR)
+
+from voice_fixtures import ArraySource, noise, tone
+
+from voice_decoder.async_voice import AsyncVoiceInterface
+from voice_decoder.audio_stream import SAMPLE_RATE
+from voice_decoder.voice_decoder import VoiceDecoder
+
+
+class FakeSTT:
+    streaming = False
+
+    def __init__(self, text):
+        self.text = text
+        self.heard = list()
+
+    def transcribe(self, audio):
+        self.heard.append(len(audio.frame_data) / (2 * audio.sample_rate))
+        return self.text
+
+
+class SlowPlayer:
+    """Plays every chunk of speech for two seconds, unless stopped."""
+
+    def __init__(self):
+        self.played = list()
+
+    def play_encoded(self, data, stop=None, decoded=None):
+        self.played.append(decoded)
+        return not stop.wait(2)
+
+
+def silent_wav(text, language):
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as wav_file:
+        wav_file.setnchannels(1)
+        wav_file.setsampwidth(2)
+        wav_file.setframerate(SAMPLE_RATE)
+        wav_file.writeframes(b"\0\0" * 160)
+    return buffer.getvalue()
+
+
+def build_decoder(samples, text, barge_in):
+    decoder = VoiceDecoder(
+        audio_source=ArraySource(samples, speed=4),
+        stt_backend=FakeSTT(text),
+        synthesize=silent_wav,
+        barge_in=barge_in,
+    )
+    decoder.speaker.player = SlowPlayer()
+    return decoder
+
+
+def test_user_speech_interrupts_playback_and_is_heard():
+    samples = np.concatenate([noise(0.5), tone(1.0), noise(1.5, seed=1)])
+    decoder = build_decoder(samples, "câmera", barge_in=True)
+    voice = AsyncVoiceInterface(decoder)
+
+    async def conversation():
+        started_at = time.perf_counter()
+        answer = await voice.ask("você gostaria de tomar via dispenser ou câmera")
+        return answer, time.perf_counter() - started_at
+
+    answer, elapsed = asyncio.run(conversation())
+
+    assert answer == "câmera"
+    assert elapsed < 1.5
+    assert 1.0 < decoder.stt_backend.heard[0] < 2.1
+    voice.close()
+    decoder.capture.stop()
+
+
+def test_without_barge_in_speech_heard_while_speaking_is_discarded():
+    samples = np.concatenate([noise(0.5), tone(0.5), noise(1.0, seed=1)])
+    decoder = build_decoder(samples, "câmera", barge_in=False)
+    voice = AsyncVoiceInterface(decoder)
+
+    async def conversation():
+        assert await voice.speak("frase")
+        return await voice.hear(timeout=0.2)
+
+    assert asyncio.run(conversation()) == ""
+    assert decoder.stt_backend.heard == []
+    voice.close()
+    decoder.capture.stop()
+
+
+def test_cancelled_speech_stops_and_overlaps_other_tasks():
+    decoder = build_decoder(noise(5), "", barge_in=False)
+    voice = AsyncVoiceInterface(decoder)
+
+    async def conversation():
+        speech = asyncio.ensure_future(voice.speak("uma frase longa"))
+        result = await voice.run(sum, [1, 2, 3])
+        await asyncio.sleep(0.1)
+        speech.cancel()
+        started_at = time.perf_counter()
+        try:
+            await speech
+        except asyncio.CancelledError:
+            return result, time.perf_counter() - started_at
+
+    result, elapsed = asyncio.run(conversation())
+
+    assert result == 6
+    assert elapsed < 0.5
+    assert decoder.speaker.stats["interrupted"] == 1
+    voice.close()
+    decoder.capture.stop()
+
+
+def test_wake_word_wait_ends_with_the_audio_source():
+    decoder = build_decoder(
+        np.concatenate([noise(0.3), tone(0.5), noise(0.8, seed=1)]),
+        "bom dia",
+        barge_in=False,
+    )
+    voice = AsyncVoiceInterface(decoder)
+
+    assert asyncio.run(voice.wait_for_wake_word()) is False
+    assert len(decoder.stt_backend.heard) == 1
+    voice.close()
@@ -0,0 +1,123 @@
+"""test continuous audio capture"""
+
+import os
+import sys
+import threading
+import time
+
+import numpy as np
+
+CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
+MODULE_DIR = os.path.dirname(CURRENT_DIR)
+PROJECT_DIR = os.path.dirname(MODULE_DIR)
+sys.path.append(PROJECT_DIR)
+
+from voice_fixtures import ArraySource, noise, tone
+
+from voice_decoder.audio_stream import (SAMPLE_RATE, SPEECH_END, SPEECH_START,
+                                        ContinuousAudioCapture, EnergyVAD,
+                                        RingBuffer)
+
+FRAME = SAMPLE_RATE * 30 // 1000
+
+
+def test_ring_buffer_keeps_most_recent_samples():
+    buffer = RingBuffer(5)
+    buffer.write(np.arange(3, dtype=np.int16))
+    buffer.write(np.arange(3, 7, dtype=np.int16))
+
+    assert buffer.written == 7
+    assert buffer.read(0).tolist() == [2, 3, 4, 5, 6]
+    assert buffer.read(4, 6).tolist() == [4, 5]
+    buffer.write(np.arange(10, 22, dtype=np.int16))
+    assert buffer.read(0).tolist() == [17, 18, 19, 20, 21]
+
+
+def test_vad_tracks_noise_floor_and_detects_speech():
+    vad = EnergyVAD(start_frames=2, end_frames=3)
+    audio = np.concatenate([noise(0.6), tone(0.3), noise(0.3)])
+    events = [
+        (index, vad.process(audio[start : start + FRAME]))
+        for index, start in enumerate(range(0, len(audio) - FRAME + 1, FRAME))
+    ]
+    events = [(index, event) for index, event in events if event is not None]
+
+    assert [event for _, event in events] == [SPEECH_START, SPEECH_END]
+    assert events[0][0] == 20 + 1
+    assert 40 <= vad.noise_floor <= 60
+
+
+def test_capture_cuts_utterances_with_pre_roll():
+    audio = np.concatenate(
+        [noise(1.0), tone(0.6), noise(1.0), tone(0.9, frequency=330), noise(1.0)]
+    )
+    source = ArraySource(audio)
+    capture = ContinuousAudioCapture(
+        source, vad=EnergyVAD(end_frames=10), pre_roll_ms=150
+    ).start()
+
+    first = capture.next_utterance(timeout=5)
+    second = capture.next_utterance(timeout=5)
+    assert capture.next_utterance(timeout=5) is None
+    capture.stop()
+
+    assert source.closed and capture.finished
+    assert abs(first.start / SAMPLE_RATE - (1.0 - 0.15)) < 0.05
+    assert abs(second.start / SAMPLE_RATE - (2.6 - 0.15)) < 0.05
+    assert 0.6 < first.duration < 1.2
+    assert 0.9 < second.duration < 1.5
+    audio_data = second.to_audio_data()
+    assert audio_data.sample_rate == SAMPLE_RATE
+    assert len(audio_data.frame_data) == 2 * len(second.samples)
+
+
+def test_discard_pending_drops_utterances_already_started():
+    capture = ContinuousAudioCapture(
+        ArraySource(np.zeros(0, dtype=np.int16)), vad=EnergyVAD(end_frames=5)
+    )
+    for start in range(0, SAMPLE_RATE, FRAME):
+        capture.process_frame(noise(0.03, seed=start))
+    for _ in range(10):
+        capture.process_frame(tone(0.03))
+    capture.discard_pending()
+    for start in range(0, SAMPLE_RATE // 2, FRAME):
+        capture.process_frame(noise(0.03, seed=start))
+    for _ in range(10):
+        capture.process_frame(tone(0.03))
+    for start in range(0, SAMPLE_RATE // 2, FRAME):
+        capture.process_frame(noise(0.03, seed=start))
+
+    utterance = capture.next_utterance(timeout=0.1)
+    assert utterance is not None and utterance.start > SAMPLE_RATE * 1.3
+    assert capture.next_utterance(timeout=0.1) is None
+
+
+def test_speech_stream_skips_discarded_utterance_in_progress():
+    capture = ContinuousAudioCapture(
+        ArraySource(np.zeros(0, dtype=np.int16)), vad=EnergyVAD(end_frames=5)
+    )
+    for start in range(0, SAMPLE_RATE, FRAME):
+        capture.process_frame(noise(0.03, seed=start))
+    for _ in range(10):
+        capture.process_frame(tone(0.03))
+    capture.discard_pending()
+
+    chunks = list()
+    consumer = threading.Thread(
+        target=lambda: chunks.extend(capture.speech_stream(timeout=5))
+    )
+    consumer.start()
+    time.sleep(0.1)
+    for _ in range(20):
+        capture.process_frame(tone(0.03))
+    for start in range(0, SAMPLE_RATE // 2, FRAME):
+        capture.process_frame(noise(0.03, seed=start))
+    for _ in range(10):
+        capture.process_frame(tone(0.03, frequency=330))
+    for start in range(0, SAMPLE_RATE // 2, FRAME):
+        capture.process_frame(noise(0.03, seed=start))
+    consumer.join(timeout=5)
+
+    samples = np.frombuffer(b"".join(chunks), dtype=np.int16)
+    assert not consumer.is_alive()
+    assert 0.3 < len(samples) / SAMPLE_RATE < 1.0
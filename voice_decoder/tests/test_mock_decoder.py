@@ -1,5 +1,147 @@
-"""this file test ia agent"""
+"""test the voice decoder replaying recorded commands"""
 
+import os
+import sys
+import wave
 
-def test_foo(a=1):
-    assert a == 1
+import numpy as np
+
+CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
+MODULE_DIR = os.path.dirname(CURRENT_DIR)
+PROJECT_DIR = os.path.dirname(MODULE_DIR)
+sys.path.append(PROJECT_DIR)
+
+from voice_fixtures import noise, tone
+
+from voice_decoder.audio_stream import SAMPLE_RATE, WavFileSource
+from voice_decoder.benchmarks.benchmark_voice import (benchmark_voice,
+                                                      replay_recording)
+from voice_decoder.stt_backends import SpeechToTextBackend
+from voice_decoder.wake_word import write_wav
+
+WAKE_WORD_AMPLITUDE = 8000
+COMMAND_AMPLITUDE = 4000
+
+
+class LoudnessSTT(SpeechToTextBackend):
+    """Hears the wake word in loud phrases and a command in the others."""
+
+    def __init__(self, wake_word="serena", command="estou com dor de cabeça"):
+        self.wake_word = wake_word
+        self.command = command
+        self.calls = 0
+
+    def transcribe(self, audio):
+        self.calls += 1
+        samples = np.frombuffer(audio.frame_data, dtype=np.int16)
+        if np.abs(samples).max() > (WAKE_WORD_AMPLITUDE + COMMAND_AMPLITUDE) / 2:
+            return self.wake_word
+        return self.command
+
+
+class StreamingLoudnessSTT(LoudnessSTT):
+    streaming = True
+    streamed = 0
+
+    def stream(self, chunks, sample_rate=SAMPLE_RATE, partials=True):
+        self.streamed += 1
+        return super().stream(chunks, sample_rate, partials)
+
+
+def write_corpus(directory):
+    recordings = {
+        "com_serena": (
+            [
+                noise(0.5),
+                tone(0.5, WAKE_WORD_AMPLITUDE),
+                noise(1.0, seed=1),
+                tone(1.0, COMMAND_AMPLITUDE),
+            ],
+            "Serena, estou com dor de cabeça.",
+        ),
+        "sem_serena": (
+            [noise(0.5), tone(1.0, COMMAND_AMPLITUDE)],
+            "Estou com dor de cabeça.",
+        ),
+    }
+    for name, (parts, transcript) in recordings.items():
+        write_wav(
+            os.path.join(directory, f"{name}.wav"), np.concatenate(parts), SAMPLE_RATE
+        )
+        with open(os.path.join(directory, f"{name}.txt"), "w", encoding="utf-8") as f:
+            f.write(transcript)
+
+
+def test_recording_replaces_the_microphone(tmp_path):
+    write_corpus(str(tmp_path))
+
+    result = replay_recording(
+        str(tmp_path / "com_serena.wav"),
+        "Serena, estou com dor de cabeça.",
+        LoudnessSTT(),
+    )
+
+    assert result["expected"] and result["detected"]
+    assert result["heard"] == "serena estou com dor de cabeça"
+    assert result["wer"] == 0
+    assert len(result["end_of_speech_ms"]) == 2
+    for delay in result["end_of_speech_ms"]:
+        assert 540 <= delay <= 660
+    assert result["wake_word_ms"] >= result["end_of_speech_ms"][0]
+
+
+def test_commands_are_transcribed_through_the_streaming_path(tmp_path):
+    write_corpus(str(tmp_path))
+    backend = StreamingLoudnessSTT()
+
+    result = replay_recording(
+        str(tmp_path / "com_serena.wav"),
+        "Serena, estou com dor de cabeça.",
+        backend,
+        speed=4.0,
+    )
+
+    assert result["detected"] and backend.streamed >= 1
+    assert result["heard"] == "serena estou com dor de cabeça"
+    assert len(result["end_of_speech_ms"]) == 2
+    assert len(result["transcription_ms"]) == 1
+    assert 0 <= result["transcription_ms"][0] < 200
+
+
+def test_benchmark_reports_wake_word_errors_and_latency(tmp_path):
+    write_corpus(str(tmp_path))
+
+    result = benchmark_voice(str(tmp_path), LoudnessSTT())
+
+    assert result["recordings"] == 2
+    assert result["wake_word_accuracy"] == 1
+    assert result["wer"] == 0
+    assert result["end_of_speech_p95_ms"] <= 660
+
+    always_wake_word = LoudnessSTT(command="serena")
+    result = benchmark_voice(str(tmp_path), always_wake_word)
+
+    assert result["false_accepts"] == 1
+    assert result["false_rejects"] == 0
+    assert result["wake_word_accuracy"] == 0.5
+    assert result["wer"] > 0
+
+
+def test_stereo_recording_is_mixed_down_and_padded(tmp_path):
+    path = str(tmp_path / "stereo.wav")
+    with wave.open(path, "wb") as wav_file:
+        wav_file.setnchannels(2)
+        wav_file.setsampwidth(2)
+        wav_file.setframerate(8000)
+        wav_file.writeframes(np.array([100, 300] * 8000, dtype=np.int16).tobytes())
+
+    source = WavFileSource(path, tail_seconds=0.5)
+    source.open()
+    samples = np.frombuffer(source.read(20000), dtype=np.int16)
+
+    assert source.sample_rate == 8000
+    assert source.recording_samples == 8000
+    assert len(samples) == 12000
+    assert samples[:8000].tolist() == [200] * 8000
+    assert not samples[8000:].any()
+    assert source.read(100) == b""
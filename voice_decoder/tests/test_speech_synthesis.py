@@ -0,0 +1,118 @@
+"""test streaming speech synthesis"""
+
+import io
+import os
+import sys
+import threading
+import time
+import wave
+
+import pytest
+
+CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
+MODULE_DIR = os.path.dirname(CURRENT_DIR)
+PROJECT_DIR = os.path.dirname(MODULE_DIR)
+sys.path.append(PROJECT_DIR)
+
+from voice_decoder.audio_player import decode_audio
+from voice_decoder.speech_synthesis import (StreamingSpeaker,
+                                            build_synthesizer, split_sentences)
+
+
+class RecordingPlayer:
+    """Plays each chunk for a fixed time, recording when every playback starts and ends."""
+
+    def __init__(self, events, duration=0.1):
+        self.events = events
+        self.duration = duration
+
+    def play_encoded(self, data, stop=None, decoded=None):
+        self.events.append(("play", decoded, time.perf_counter()))
+        if stop is not None and stop.wait(self.duration):
+            return False
+        if stop is None:
+            time.sleep(self.duration)
+        self.events.append(("played", decoded, time.perf_counter()))
+        return True
+
+
+def slow_synthesizer(events, duration=0.1):
+    def synthesize(text):
+        events.append(("synthesize", text, time.perf_counter()))
+        time.sleep(duration)
+        return text.encode("utf-8")
+
+    return synthesize
+
+
+def test_split_sentences_joins_short_and_splits_long_sentences():
+    text = (
+        "Olá. Você pode tomar dipirona agora!   Beba água, descanse e evite telas.\nOk"
+    )
+    assert split_sentences(text) == [
+        "Olá. Você pode tomar dipirona agora!",
+        "Beba água, descanse e evite telas.",
+        "Ok",
+    ]
+    long_sentence = ", ".join(["tome o remédio depois do almoço"] * 4)
+    chunks = split_sentences(long_sentence, max_chars=70)
+    assert all(len(chunk) <= 70 for chunk in chunks)
+    assert " ".join(chunks) == long_sentence
+    assert split_sentences("  ") == []
+
+
+def test_next_sentence_is_synthesized_while_the_current_one_plays():
+    events = list()
+    speaker = StreamingSpeaker(
+        RecordingPlayer(events),
+        slow_synthesizer(events),
+        decode=lambda data: data.decode("utf-8"),
+        max_chars=40,
+    )
+    text = "Primeira frase da resposta. Segunda frase da resposta. Terceira frase."
+
+    assert speaker.speak(text)
+
+    synthesized = [event for event in events if event[0] == "synthesize"]
+    played = [event for event in events if event[0] == "played"]
+    assert [event[1] for event in played] == split_sentences(text, max_chars=40)
+    assert synthesized[1][2] < played[0][2]
+    assert speaker.stats["first_audio_ms"] < 200
+    assert speaker.stats["chunks"] == 3
+    speaker.close()
+
+
+def test_stop_interrupts_the_remaining_sentences():
+    events = list()
+    speaker = StreamingSpeaker(
+        RecordingPlayer(events, duration=1),
+        slow_synthesizer(events, duration=0.01),
+        decode=lambda data: data.decode("utf-8"),
+        max_chars=40,
+    )
+    stop = threading.Event()
+    threading.Timer(0.1, stop.set).start()
+
+    started_at = time.perf_counter()
+    assert not speaker.speak("Primeira frase da resposta. Segunda frase.", stop)
+
+    assert time.perf_counter() - started_at < 0.5
+    assert [event[0] for event in events].count("play") == 1
+    assert speaker.stats["interrupted"] == 1
+    speaker.close()
+
+
+def test_wav_audio_is_decoded_in_memory():
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as wav_file:
+        wav_file.setnchannels(1)
+        wav_file.setsampwidth(2)
+        wav_file.setframerate(22050)
+        wav_file.writeframes(b"\1\0" * 22050)
+
+    audio = decode_audio(buffer.getvalue())
+
+    assert audio.sample_rate == 22050
+    assert audio.duration == 1.0
+    with pytest.raises(ValueError):
+        build_synthesizer("festival")
@@ -0,0 +1,153 @@
+"""test speech-to-text backends"""
+
+import json
+import os
+import sys
+import threading
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+import speech_recognition as sr
+
+CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
+MODULE_DIR = os.path.dirname(CURRENT_DIR)
+PROJECT_DIR = os.path.dirname(MODULE_DIR)
+sys.path.append(PROJECT_DIR)
+
+from voice_decoder.audio_stream import (SAMPLE_RATE, ContinuousAudioCapture,
+                                        EnergyVAD)
+from voice_decoder.stt_backends import (SpeechToTextBackend, VoskSTT,
+                                        WhisperSTT, build_stt_backend,
+                                        word_error_rate)
+
+
+class FakeKaldiRecognizer:
+    """Recognizes one word per chunk, and ends a segment every two chunks."""
+
+    def __init__(self):
+        self.words = list()
+
+    def AcceptWaveform(self, chunk):
+        self.words.append(f"palavra{len(self.words)}")
+        return len(self.words) % 2 == 0
+
+    def Result(self):
+        segment, self.words = " ".join(self.words), list()
+        return json.dumps({"text": segment})
+
+    def PartialResult(self):
+        return json.dumps({"partial": " ".join(self.words)})
+
+    def FinalResult(self):
+        return self.Result()
+
+
+class FakeVoskSTT(VoskSTT):
+    def _recognizer(self, sample_rate):
+        return FakeKaldiRecognizer()
+
+
+class FakeWhisperModel:
+    def __init__(self):
+        self.calls = list()
+
+    def transcribe(self, samples, **kwargs):
+        self.calls.append(len(samples))
+        text = f" {len(samples)} amostras " if len(samples) else ""
+        return [SimpleNamespace(text=text)], None
+
+
+def test_word_error_rate_ignores_case_accents_and_punctuation():
+    assert word_error_rate("Estou com dor de cabeça.", "estou com dor de cabeca") == 0
+    assert word_error_rate("quero tomar paracetamol", "quero paracetamol") == 1 / 3
+    assert word_error_rate("dor", "dor de cabeça") == 2
+    assert word_error_rate("", "") == 0
+
+
+def test_vosk_streams_partial_transcripts():
+    backend = FakeVoskSTT(model_path="unused", model=object())
+    partials = list(backend.stream([b"\0\0"] * 3))
+
+    assert [partial.text for partial in partials] == [
+        "palavra0",
+        "palavra0 palavra1",
+        "palavra0 palavra1 palavra0",
+        "palavra0 palavra1 palavra0",
+    ]
+    assert [partial.final for partial in partials] == [False, False, False, True]
+    with pytest.raises(sr.UnknownValueError):
+        list(backend.stream([]))
+
+
+def test_whisper_transcribes_growing_audio_for_partials():
+    model = FakeWhisperModel()
+    backend = WhisperSTT(language="pt-BR", partial_interval=0.5, model=model)
+    chunk = np.zeros(SAMPLE_RATE // 4, dtype=np.int16).tobytes()
+    partials = list(backend.stream([chunk] * 5))
+
+    assert backend.language == "pt"
+    assert [partial.final for partial in partials] == [False, False, True]
+    assert model.calls == [8000, 16000, 20000]
+    assert partials[-1].text == "20000 amostras"
+
+    model.calls.clear()
+    partials = list(backend.stream([chunk] * 5, partials=False))
+
+    assert [partial.final for partial in partials] == [True]
+    assert model.calls == [20000]
+
+
+def test_unknown_backend_is_rejected():
+    with pytest.raises(ValueError):
+        build_stt_backend("siri")
+    assert build_stt_backend("google", language="pt-BR").streaming is False
+    with pytest.raises(TypeError):
+        SpeechToTextBackend()
+
+
+class GatedSource:
+    """Plays silence, then a tone, once the test is listening."""
+
+    def __init__(self):
+        self.sample_rate = SAMPLE_RATE
+        self.listening = threading.Event()
+        t = np.arange(SAMPLE_RATE) / SAMPLE_RATE
+        self.audio = np.concatenate(
+            [
+                np.random.default_rng(0).normal(0, 50, SAMPLE_RATE),
+                4000 * np.sin(2 * np.pi * 220 * t),
+                np.random.default_rng(1).normal(0, 50, SAMPLE_RATE),
+            ]
+        ).astype(np.int16)
+        self.position = 0
+
+    def open(self):
+        pass
+
+    def read(self, num_samples):
+        if self.position >= SAMPLE_RATE // 2:
+            self.listening.wait(5)
+        chunk = self.audio[self.position : self.position + num_samples]
+        self.position += num_samples
+        return chunk.tobytes()
+
+    def close(self):
+        pass
+
+
+def test_speech_stream_yields_utterance_while_it_is_captured():
+    source = GatedSource()
+    capture = ContinuousAudioCapture(
+        source, vad=EnergyVAD(end_frames=10), pre_roll_ms=90
+    ).start()
+
+    stream = capture.speech_stream(timeout=5)
+    threading.Timer(0.05, source.listening.set).start()
+    chunks = list(stream)
+
+    samples = np.frombuffer(b"".join(chunks), dtype=np.int16)
+    assert len(chunks) > 10
+    assert 1.0 < len(samples) / SAMPLE_RATE < 1.6
+    assert capture.next_utterance(timeout=1) is None
+    capture.stop()
@@ -0,0 +1,109 @@
+"""test tts phrase cache"""
+
+import os
+import sys
+
+CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
+MODULE_DIR = os.path.dirname(CURRENT_DIR)
+PROJECT_DIR = os.path.dirname(MODULE_DIR)
+sys.path.append(PROJECT_DIR)
+
+from voice_decoder.tts_cache import TTSCache
+from voice_decoder.voice_decoder import VoiceDecoder
+
+
+class FakeSynthesizer:
+    def __init__(self):
+        self.calls = list()
+
+    def __call__(self, text, language):
+        self.calls.append(text)
+        return f"{language}:{text}".encode("utf-8").ljust(100, b"\0")
+
+
+def test_repeated_text_is_synthesized_once(tmp_path):
+    synthesize = FakeSynthesizer()
+    cache = TTSCache(str(tmp_path), synthesize)
+
+    first = cache.get("Desculpe, não entendi.")
+    assert cache.get("  Desculpe,  não entendi. ") == first
+    assert cache.get("Desculpe, não entendi.", "en") != first
+
+    assert synthesize.calls == ["Desculpe, não entendi.", "Desculpe, não entendi."]
+    assert cache.stats["memory_hits"] == 1
+    assert cache.stats["misses"] == 2
+
+
+def test_cache_survives_restart_from_disk(tmp_path):
+    TTSCache(str(tmp_path), FakeSynthesizer()).get("estou ouvindo")
+    synthesize = FakeSynthesizer()
+    cache = TTSCache(str(tmp_path), synthesize)
+
+    assert cache.get("estou ouvindo").startswith(b"pt:estou ouvindo")
+    assert synthesize.calls == []
+    assert cache.stats["disk_hits"] == 1
+
+
+def test_least_recently_spoken_is_evicted(tmp_path):
+    synthesize = FakeSynthesizer()
+    cache = TTSCache(str(tmp_path), synthesize, max_bytes=300, memory_entries=0)
+
+    cache.get("a")
+    cache.get("b")
+    cache.get("c")
+    cache.get("a")
+    cache.get("d")
+
+    assert cache.stats["evictions"] == 1
+    assert cache.stats["files"] == 3
+    assert len(os.listdir(tmp_path)) == 3
+    cache.get("a")
+    cache.get("b")
+    assert synthesize.calls == ["a", "b", "c", "d", "b"]
+
+
+def test_prerendered_phrases_are_pinned(tmp_path):
+    synthesize = FakeSynthesizer()
+    cache = TTSCache(str(tmp_path), synthesize, max_bytes=200, memory_entries=0)
+    cache.prerender(["estou ouvindo no que posso ajudar"])
+
+    for text in ["um", "dois", "três"]:
+        cache.get(text)
+    cache.get("estou ouvindo no que posso ajudar")
+
+    assert synthesize.calls == [
+        "estou ouvindo no que posso ajudar",
+        "um",
+        "dois",
+        "três",
+    ]
+    assert cache.stats["memory_hits"] == 1
+
+
+def test_unwritable_folder_keeps_serving_from_memory(tmp_path):
+    blocker = tmp_path / "file"
+    blocker.write_bytes(b"")
+    synthesize = FakeSynthesizer()
+    cache = TTSCache(str(blocker / "tts"), synthesize)
+
+    first = cache.get("estou ouvindo")
+    assert cache.get("estou ouvindo") == first
+    cache.prerender(["Pode repetir?"])
+    cache.get("Pode repetir?")
+
+    assert synthesize.calls == ["estou ouvindo", "Pode repetir?"]
+    assert cache.stats["memory_hits"] == 2
+    assert cache.stats["files"] == 0
+
+
+def test_decoder_prerenders_the_spoken_sentences(tmp_path):
+    synthesize = FakeSynthesizer()
+    cache = TTSCache(str(tmp_path), synthesize, memory_entries=0)
+    decoder = VoiceDecoder(tts_cache=cache)
+    decoder._prerender(["Desculpe, não entendi. Pode repetir?"])
+
+    decoder._synthesize("Desculpe, não entendi.")
+    decoder._synthesize("Pode repetir?")
+
+    assert synthesize.calls == ["Desculpe, não entendi.", "Pode repetir?"]
+    assert cache.stats["memory_hits"] == 2
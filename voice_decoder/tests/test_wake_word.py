@@ -0,0 +1,162 @@
+"""test offline wake word spotter"""
+
+import os
+import sys
+import threading
+import time
+
+import numpy as np
+import speech_recognition as sr
+
+CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
+MODULE_DIR = os.path.dirname(CURRENT_DIR)
+PROJECT_DIR = os.path.dirname(MODULE_DIR)
+sys.path.append(PROJECT_DIR)
+
+from voice_decoder.voice_decoder import (MAX_AUTO_ENROLLED_TEMPLATES,
+                                         VoiceDecoder)
+from voice_decoder.wake_word import (SAMPLE_RATE, WakeWordSpotter, mfcc,
+                                     subsequence_dtw)
+
+
+def tones(frequencies, seconds=0.15, amplitude=3000, seed=0):
+    """A fake spoken word, a sequence of tones over some noise."""
+    rng = np.random.default_rng(seed)
+    t = np.arange(int(SAMPLE_RATE * seconds)) / SAMPLE_RATE
+    signal = np.concatenate(
+        [amplitude * np.sin(2 * np.pi * frequency * t) for frequency in frequencies]
+    )
+    return (signal + rng.normal(0, 30, len(signal))).astype(np.int16)
+
+
+WAKE_WORD = [300, 800, 1500]
+
+
+def test_mfcc_shape():
+    features = mfcc(np.zeros(SAMPLE_RATE, dtype=np.int16))
+    assert features.shape == (98, 12)
+
+
+def test_subsequence_dtw_finds_template_inside_query():
+    template = np.array([[0.0], [1.0], [2.0]])
+    query = np.array([[5.0], [5.0], [0.0], [1.0], [1.0], [2.0], [5.0]])
+    assert subsequence_dtw(template, query) == 0.0
+    assert subsequence_dtw(template, np.array([[5.0], [5.0]])) > 0
+
+
+def test_spotter_separates_wake_word_from_other_phrases():
+    spotter = WakeWordSpotter([tones(WAKE_WORD)])
+    phrase_with_wake_word = np.concatenate(
+        [
+            tones([100], seconds=0.3, amplitude=50, seed=1),
+            tones(WAKE_WORD, seconds=0.17, amplitude=6000, seed=2),
+            tones([2500, 600], seed=3),
+        ]
+    )
+    other_phrase = tones([2500, 600, 1200, 400], seed=4)
+
+    positive = spotter.score(phrase_with_wake_word)
+    negative = spotter.score(other_phrase)
+    assert positive * 2 < negative
+
+    spotter.threshold = (positive + negative) / 2
+    spotter.verify_margin = 0
+    assert spotter.detect(phrase_with_wake_word).detected
+    assert not spotter.detect(other_phrase).detected
+    assert spotter.stats["detections"] == 1
+    assert spotter.stats["rejections"] == 1
+
+
+def test_verification_counts_false_accepts_and_rejects():
+    spotter = WakeWordSpotter([tones(WAKE_WORD)], threshold=1.0, verify_margin=100)
+    near_miss = spotter.detect(tones([2500, 600, 1200]))
+    assert near_miss.near_miss and not near_miss.detected
+
+    spotter.record_verification(near_miss, confirmed=True)
+    hit = spotter.detect(tones(WAKE_WORD, seed=5))
+    spotter.record_verification(hit, confirmed=False)
+
+    assert spotter.stats["false_rejects"] == 1
+    assert spotter.stats["false_accepts"] == int(hit.detected)
+
+
+def test_enrolled_templates_are_saved_and_loaded(tmp_path):
+    spotter = WakeWordSpotter(directory=str(tmp_path))
+    assert not spotter.ready
+    spotter.enroll(tones(WAKE_WORD), save=True)
+    spotter.enroll(tones(WAKE_WORD, seed=6), save=True)
+
+    loaded = WakeWordSpotter.from_directory(str(tmp_path))
+    assert loaded.template_count == 2
+    assert loaded.score(tones(WAKE_WORD)) == spotter.score(tones(WAKE_WORD))
+
+
+class ScriptedSTT:
+    streaming = False
+
+    def __init__(self, text=None, error=None):
+        self.text = text
+        self.error = error
+        self.done = threading.Event()
+
+    def transcribe(self, audio):
+        try:
+            if self.error is not None:
+                raise self.error
+            return self.text
+        finally:
+            self.done.set()
+
+
+def wake_word_audio(seed=0):
+    return sr.AudioData(tones(WAKE_WORD, seed=seed).tobytes(), SAMPLE_RATE, 2)
+
+
+def test_spotted_wake_word_wakes_without_the_recognizer():
+    backend = ScriptedSTT(error=sr.RequestError("offline"))
+    spotter = WakeWordSpotter([tones(WAKE_WORD)], threshold=1000.0)
+    decoder = VoiceDecoder(
+        wake_word="Serena", stt_backend=backend, wake_word_spotter=spotter
+    )
+
+    assert decoder.detect_wake_word(wake_word_audio())
+    assert backend.done.wait(5)
+    time.sleep(0.05)
+    assert spotter.stats["false_accepts"] == 0
+
+
+def test_background_verification_counts_false_accepts():
+    backend = ScriptedSTT(text="bom dia")
+    spotter = WakeWordSpotter([tones(WAKE_WORD)], threshold=1000.0)
+    decoder = VoiceDecoder(
+        wake_word="Serena", stt_backend=backend, wake_word_spotter=spotter
+    )
+
+    assert decoder.detect_wake_word(wake_word_audio())
+    deadline = time.monotonic() + 5
+    while spotter.stats["false_accepts"] == 0 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert spotter.stats["false_accepts"] == 1
+
+
+def test_auto_enrollment_collects_several_templates(tmp_path):
+    backend = ScriptedSTT(text="Serena")
+    spotter = WakeWordSpotter(
+        directory=str(tmp_path), threshold=1000.0, min_templates=3
+    )
+    decoder = VoiceDecoder(
+        wake_word="Serena", stt_backend=backend, wake_word_spotter=spotter
+    )
+
+    for seed in range(3):
+        assert not spotter.ready
+        assert decoder.detect_wake_word(wake_word_audio(seed))
+    assert spotter.template_count == 3 and spotter.ready
+
+    for seed in range(3, 10):
+        backend.done.clear()
+        assert decoder.detect_wake_word(wake_word_audio(seed))
+        assert backend.done.wait(5)
+        time.sleep(0.05)
+    assert spotter.template_count == MAX_AUTO_ENROLLED_TEMPLATES
+    assert len(os.listdir(tmp_path)) == MAX_AUTO_ENROLLED_TEMPLATES
@@ -0,0 +1,48 @@
+"""this implements the audio helpers shared by the voice decoder tests"""
+
+import os
+import sys
+import time
+
+import numpy as np
+
+CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
+MODULE_DIR = os.path.dirname(CURRENT_DIR)
+PROJECT_DIR = os.path.dirname(MODULE_DIR)
+sys.path.append(PROJECT_DIR)
+
+from voice_decoder.audio_stream import SAMPLE_RATE
+
+
+def noise(seconds, level=50, seed=0):
+    rng = np.random.default_rng(seed)
+    return rng.normal(0, level, int(SAMPLE_RATE * seconds)).astype(np.int16)
+
+
+def tone(seconds, amplitude=4000, frequency=220):
+    t = np.arange(int(SAMPLE_RATE * seconds)) / SAMPLE_RATE
+    return (amplitude * np.sin(2 * np.pi * frequency * t)).astype(np.int16)
+
+
+class ArraySource:
+    """Plays samples as fast as possible, or speed times faster than real time."""
+
+    def __init__(self, samples, speed=0.0):
+        self.sample_rate = SAMPLE_RATE
+        self.samples = samples
+        self.speed = speed
+        self.position = 0
+        self.closed = False
+
+    def open(self):
+        self.position = 0
+
+    def read(self, num_samples):
+        if self.speed:
+            time.sleep(num_samples / SAMPLE_RATE / self.speed)
+        chunk = self.samples[self.position : self.position + num_samples]
+        self.position += num_samples
+        return chunk.tobytes()
+
+    def close(self):
+        self.closed = True
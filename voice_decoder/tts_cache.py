@@ -0,0 +1,200 @@
+"""This file implements a disk-backed LRU cache of synthesized speech"""
+
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, Iterable
+
+FIXED_PHRASES = [
+    "estou ouvindo no que posso ajudar",
+    "Desculpe, não entendi. Pode repetir?",
+    "você gostaria de tomar via dispenser ou utilizando a câmera",
+    "opção selecionada invalida, por favor fale novamente e escolha entre câmera ou dispenser",
+    "Este dispositivo não está associado a nenhum paciente",
+    "Desculpe, não consegui responder agora. Tente novamente em instantes.",
+    "Esse é o remédio certo pode tomar",
+    "O Remédio mostrado está fora da base de dados",
+]
+
+
+def tts_key(text: str, language: str) -> str:
+    """
+    :return: The cache key of a text spoken in a language, ignoring surrounding and repeated spaces.
+    """
+    normalized = " ".join(text.split())
+    return hashlib.sha256(f"{language}\0{normalized}".encode("utf-8")).hexdigest()
+
+
+class TTSCache:
+    """
+    TTSCache keeps the synthesized audio of every spoken text in a folder, bounded in
+    size and evicting the least recently spoken texts first, and the most recent ones in
+    memory, so repeated phrases are played without calling the TTS service.
+
+    The recency of the files is their modification time, so the LRU order survives
+    restarts. Pre-rendered phrases are pinned in memory and never evicted from disk.
+    When the folder cannot be created or written, e.g. a full or read-only disk, the
+    audio is still served from memory.
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        synthesize: Callable[[str, str], bytes],
+        max_bytes: int = 50 * 1024 * 1024,
+        memory_entries: int = 32,
+    ):
+        """
+        :param directory: Folder of the cached audio files.
+        :param synthesize: Returns the audio of (text, language), e.g. synthesize_gtts.
+        :param max_bytes: Maximum total size of the files.
+        :param memory_entries: Unpinned audio kept in memory.
+        """
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.memory_entries = memory_entries
+        self.__synthesize = synthesize
+        self.__lock = threading.Lock()
+        self.__memory: "OrderedDict[str, bytes]" = OrderedDict()
+        self.__pinned: Dict[str, bytes] = dict()
+        self.__stats = {
+            "memory_hits": 0,
+            "disk_hits": 0,
+            "misses": 0,
+            "evictions": 0,
+        }
+        self.__files: "OrderedDict[str, int]" = OrderedDict()
+        try:
+            os.makedirs(directory, exist_ok=True)
+            files = [
+                (entry.name[: -len(".mp3")], entry.stat())
+                for entry in os.scandir(directory)
+                if entry.is_file() and entry.name.endswith(".mp3")
+            ]
+        except OSError as e:
+            print(f"TTS cache folder unavailable, caching in memory only: {e}")
+            files = list()
+        files.sort(key=lambda file: file[1].st_mtime)
+        for key, file_stat in files:
+            self.__files[key] = file_stat.st_size
+
+    @property
+    def stats(self) -> Dict[str, int]:
+        """
+        :return: Memory and disk hits, misses, evictions, files and their total size.
+        """
+        with self.__lock:
+            stats = dict(self.__stats)
+            stats["files"] = len(self.__files)
+            stats["bytes"] = sum(self.__files.values())
+        return stats
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.mp3")
+
+    def get(self, text: str, language: str = "pt") -> bytes:
+        """
+        Returns the audio of a text, synthesizing and caching it on a miss.
+
+        :param text: The text to speak.
+        :param language: The TTS language code.
+        :return: The audio file content.
+        """
+        key = tts_key(text, language)
+        with self.__lock:
+            audio = self.__pinned.get(key)
+            if audio is None:
+                audio = self.__memory.get(key)
+                if audio is not None:
+                    self.__memory.move_to_end(key)
+            if audio is not None:
+                self.__stats["memory_hits"] += 1
+                self.__touch(key)
+                return audio
+            if key in self.__files:
+                try:
+                    with open(self._path(key), "rb") as audio_file:
+                        audio = audio_file.read()
+                except OSError:
+                    del self.__files[key]
+                else:
+                    self.__stats["disk_hits"] += 1
+                    self.__touch(key)
+                    self.__remember(key, audio)
+                    return audio
+            self.__stats["misses"] += 1
+
+        audio = self.__synthesize(text, language)
+        with self.__lock:
+            self.__store(key, audio)
+            self.__remember(key, audio)
+        return audio
+
+    def prerender(self, phrases: Iterable[str], language: str = "pt") -> None:
+        """
+        Synthesizes the phrases missing from the cache and pins all of them in memory.
+
+        :param phrases: The fixed phrases of the assistant, e.g. FIXED_PHRASES.
+        :param language: The TTS language code.
+        """
+        for phrase in phrases:
+            audio = self.get(phrase, language)
+            with self.__lock:
+                self.__pinned[tts_key(phrase, language)] = audio
+
+    def __touch(self, key: str) -> None:
+        if key in self.__files:
+            self.__files.move_to_end(key)
+            try:
+                os.utime(self._path(key))
+            except OSError:
+                pass
+
+    def __remember(self, key: str, audio: bytes) -> None:
+        if key in self.__pinned:
+            return
+        self.__memory[key] = audio
+        self.__memory.move_to_end(key)
+        while len(self.__memory) > self.memory_entries:
+            self.__memory.popitem(last=False)
+
+    def __store(self, key: str, audio: bytes) -> None:
+        temporary_path = f"{self._path(key)}.tmp"
+        try:
+            with open(temporary_path, "wb") as audio_file:
+                audio_file.write(audio)
+            os.replace(temporary_path, self._path(key))
+        except OSError as e:
+            print(f"Could not write the TTS cache file, keeping it in memory: {e}")
+            try:
+                os.remove(temporary_path)
+            except OSError:
+                pass
+            return
+        self.__files[key] = len(audio)
+        self.__files.move_to_end(key)
+
+        total = sum(self.__files.values())
+        for old_key in list(self.__files):
+            if total <= self.max_bytes:
+                break
+            if old_key == key or old_key in self.__pinned:
+                continue
+            total -= self.__files.pop(old_key)
+            self.__memory.pop(old_key, None)
+            try:
+                os.remove(self._path(old_key))
+            except OSError:
+                pass
+            self.__stats["evictions"] += 1
+
+
+def default_cache_dir() -> str:
+    """
+    :return: The TTS_CACHE_DIR env var, or a folder in the user cache directory.
+    """
+    return os.getenv(
+        "TTS_CACHE_DIR",
+        os.path.join(os.path.expanduser("~"), ".cache", "serena", "tts"),
+    )
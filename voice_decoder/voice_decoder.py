@@ -1,10 +1,22 @@
 """This file implements voice recognizer pipeline"""
 
-import tempfile
+import os
+import sys
+import threading
 
-import playsound
+import numpy as np
 import speech_recognition as sr
-from gtts import gTTS
+
+CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
+PROJECT_DIR = os.path.dirname(CURRENT_DIR)
+sys.path.append(PROJECT_DIR)
+
+from voice_decoder.audio_player import AudioPlayer, synthesize_gtts
+from voice_decoder.audio_stream import ContinuousAudioCapture, MicrophoneSource
+from voice_decoder.speech_synthesis import StreamingSpeaker, split_sentences
+from voice_decoder.stt_backends import GoogleSTT
+
+MAX_AUTO_ENROLLED_TEMPLATES = 5
 
 
 class VoiceDecoder:
@@ -13,43 +25,168 @@ class VoiceDecoder:
     speech-to-text conversion, and text-to-speech synthesis.
     """
 
-    def __init__(self, language: str = "en-us", wake_word: str = "Serana"):
+    def __init__(
+        self,
+        language: str = "en-us",
+        wake_word: str = "Serana",
+        continuous_capture: bool = False,
+        audio_source=None,
+        wake_word_spotter=None,
+        verify_wake_word: bool = True,
+        stt_backend=None,
+        tts_cache=None,
+        prerender_phrases=None,
+        synthesize=None,
+        barge_in: bool = False,
+    ):
         """
         Initializes the VoiceDecoder with language and wake word.
 
         :param language: Language code for speech recognition (default is 'pt-BR').
         :param wake_word: The word used to activate the assistant.
+        :param continuous_capture: Keeps the microphone open in a background thread and
+            cuts phrases with voice activity detection, instead of opening it and
+            calibrating for ambient noise for every phrase.
+        :param audio_source: Source of the continuous capture instead of the microphone,
+            e.g. recorded audio. Implies continuous_capture.
+        :param wake_word_spotter: Offline WakeWordSpotter, phrases are only sent to the
+            speech recognizer after it spots the wake word. Until it is ready, phrases
+            recognized as the wake word alone are enrolled as templates, and afterwards
+            verified detections of the wake word alone, up to MAX_AUTO_ENROLLED_TEMPLATES.
+        :param verify_wake_word: Whether spotted wake words, and near misses, are checked by
+            the speech recognizer in the background, to count false accepts and rejects.
+        :param stt_backend: The SpeechToTextBackend, Google by default, see build_stt_backend.
+        :param tts_cache: TTSCache of the synthesized speech, every text is synthesized
+            again if None.
+        :param prerender_phrases: Phrases synthesized into the cache in the background at
+            startup, e.g. FIXED_PHRASES, split into the sentences that are spoken.
+        :param synthesize: Returns the audio of (text, language), gTTS by default, see
+            build_synthesizer. Without a TTS cache, texts are synthesized with it.
+        :param barge_in: Whether speech of the user interrupts the assistant, with the
+            continuous capture, keeping the interrupting phrase for the next command.
+            Needs a microphone with echo cancellation or a headset, or the assistant's
+            own voice interrupts it.
         """
         self.recognizer = sr.Recognizer()
         self.language = language
         self.wake_word = wake_word.lower()
+        self.stt_backend = stt_backend or GoogleSTT(language, self.recognizer)
+        self.wake_word_spotter = wake_word_spotter
+        self.verify_wake_word = verify_wake_word
+        self.tts_cache = tts_cache
+        self.barge_in = barge_in
+        self.synthesize = synthesize or synthesize_gtts
+        self.player = AudioPlayer()
+        self.speaker = StreamingSpeaker(self.player, self._synthesize)
+        self.capture = None
+        if continuous_capture or audio_source is not None:
+            self.capture = ContinuousAudioCapture(
+                audio_source or MicrophoneSource()
+            ).start()
+        if tts_cache is not None and prerender_phrases:
+            threading.Thread(
+                target=self._prerender, args=(list(prerender_phrases),), daemon=True
+            ).start()
+
+    def _prerender(self, phrases) -> None:
+        chunks = [
+            chunk
+            for phrase in phrases
+            for chunk in split_sentences(phrase, max_chars=self.speaker.max_chars)
+        ]
+        try:
+            self.tts_cache.prerender(chunks, "pt")
+        except Exception as e:
+            print(f"Could not pre-render the fixed phrases: {e}")
 
-    def string_to_speech(self, text: str) -> None:
+    def listen(self, timeout=None) -> sr.AudioData:
         """
-        Converts a text string to speech and plays it using gTTS.
+        Waits for the next phrase, from the continuous capture when enabled.
+
+        :param timeout: Seconds to wait for a phrase, forever if None.
+        :return: The audio of the phrase.
+        :raises sr.WaitTimeoutError: If no phrase arrived within the timeout.
+        """
+        if self.capture is not None:
+            utterance = self.capture.next_utterance(timeout)
+            if utterance is None:
+                raise sr.WaitTimeoutError("listening timed out")
+            return utterance.to_audio_data()
+        with sr.Microphone() as source:
+            self.recognizer.adjust_for_ambient_noise(source)
+            return self.recognizer.listen(source, timeout=timeout)
+
+    def _synthesize(self, text: str) -> bytes:
+        if self.tts_cache is not None:
+            return self.tts_cache.get(text, "pt")
+        return self.synthesize(text, "pt")
+
+    def string_to_speech(self, text: str, stop=None, barge_in=None) -> bool:
+        """
+        Converts a text string to speech sentence by sentence, synthesizing the next
+        sentence, or taking it from the TTS cache, while the current one plays from memory.
 
         :param text: The string to be spoken.
+        :param stop: threading.Event interrupting the speech once set, if given.
+        :param barge_in: Whether speech of the user interrupts the assistant, the
+            decoder's barge_in if None.
+        :return: Whether the text was spoken to the end.
         """
-        tts = gTTS(text=text, lang="pt")
-        with tempfile.NamedTemporaryFile(delete=True, suffix=".mp3") as fp:
-            tts.save(fp.name)
-            playsound.playsound(fp.name)
+        barge_in = self.barge_in if barge_in is None else barge_in
+        if not barge_in or self.capture is None:
+            completed = self.speaker.speak(text, stop)
+            if self.capture is not None:
+                self.capture.discard_pending()
+            return completed
+
+        stop = stop or threading.Event()
+        interruptions = list()
 
-    def audio_to_string(self) -> str:
+        def interrupt(position: int) -> None:
+            interruptions.append(position)
+            stop.set()
+
+        self.capture.add_speech_start_callback(interrupt)
+        try:
+            completed = self.speaker.speak(text, stop)
+        finally:
+            self.capture.remove_speech_start_callback(interrupt)
+        if interruptions:
+            print("Interrupted by the user.")
+            self.capture.discard_pending(before=interruptions[-1])
+        else:
+            self.capture.discard_pending()
+        return completed
+
+    def audio_to_string(self, on_partial=None, timeout=None) -> str:
         """
-        Listens from the microphone and converts the audio to a text string.
+        Listens from the microphone and converts the audio to a text string. With the
+        continuous capture and a streaming backend, the audio is transcribed while the
+        phrase is spoken.
 
+        :param on_partial: Called with every partial transcript, if given.
+        :param timeout: Seconds to wait for the phrase to start, forever if None.
         :return: The recognized text or an empty string if recognition fails.
         """
-        with sr.Microphone() as source:
-            print("Listening for a command...")
-            self.recognizer.adjust_for_ambient_noise(source)
-            audio = self.recognizer.listen(source)
-
+        print("Listening for a command...")
         try:
-            text = self.recognizer.recognize_google(audio, language=self.language)
+            if self.capture is not None and self.stt_backend.streaming:
+                text = ""
+                for partial in self.stt_backend.stream(
+                    self.capture.speech_stream(timeout),
+                    self.capture.sample_rate,
+                    partials=on_partial is not None,
+                ):
+                    text = partial.text
+                    if on_partial is not None and not partial.final:
+                        on_partial(partial.text)
+            else:
+                text = self.stt_backend.transcribe(self.listen(timeout))
             print(f"You said: {text}")
             return text
+        except sr.WaitTimeoutError:
+            print("No audio captured.")
+            return ""
         except sr.UnknownValueError:
             print("Could not understand the audio.")
             return ""
@@ -57,29 +194,96 @@ class VoiceDecoder:
             print(f"Error with the recognition service: {e}")
             return ""
 
-    def listen_for_wake_word(self) -> None:
+    def listen_for_wake_word(self, stop=None, acknowledge: bool = True) -> bool:
         """
         Continuously listens for the wake word. Once detected, listens for a command and responds.
+
+        :param stop: threading.Event ending the wait once set, if given.
+        :param acknowledge: Whether the assistant says it is listening once detected.
+        :return: Whether the wake word was detected, False if stopped or when the audio
+            source ran out.
         """
         print("Waiting for wake word...")
 
-        while True:
-            with sr.Microphone() as source:
-                self.recognizer.adjust_for_ambient_noise(source)
-                try:
-                    audio = self.recognizer.listen(source, timeout=2)
-                    phrase = self.recognizer.recognize_google(
-                        audio, language=self.language
-                    ).lower()
-                    print(f"Heard: {phrase}")
-
-                    if self.wake_word in phrase:
-                        print("Wake word detected!")
+        while stop is None or not stop.is_set():
+            try:
+                if self.detect_wake_word(self.listen(timeout=2)):
+                    print("Wake word detected!")
+                    if acknowledge:
                         self.string_to_speech("estou ouvindo no que posso ajudar")
-                        return True
-                except sr.WaitTimeoutError:
-                    pass
-                except sr.UnknownValueError:
-                    pass
-                except sr.RequestError as e:
-                    print(f"Connection error: {e}")
+                    return True
+            except sr.WaitTimeoutError:
+                if self.capture is not None and self.capture.finished:
+                    return False
+            except sr.UnknownValueError:
+                pass
+            except sr.RequestError as e:
+                print(f"Connection error: {e}")
+        return False
+
+    def detect_wake_word(self, audio: sr.AudioData) -> bool:
+        """
+        Decides whether a phrase holds the wake word, with the offline spotter once it has
+        templates, with the speech recognizer otherwise.
+
+        :param audio: The audio of the phrase.
+        :return: Whether the phrase holds the wake word.
+        :raises sr.UnknownValueError: If the speech recognizer understood nothing.
+        :raises sr.RequestError: If the speech recognizer could not be reached.
+        """
+        if self.wake_word_spotter is not None and self.wake_word_spotter.ready:
+            return self.spot_wake_word(audio)
+        phrase = self.stt_backend.transcribe(audio).lower()
+        print(f"Heard: {phrase}")
+        if phrase.strip() == self.wake_word:
+            self.enroll_wake_word(audio)
+        return self.wake_word in phrase
+
+    def _samples(self, audio: sr.AudioData) -> np.ndarray:
+        return np.frombuffer(
+            audio.get_raw_data(
+                convert_rate=self.wake_word_spotter.sample_rate, convert_width=2
+            ),
+            dtype=np.int16,
+        )
+
+    def spot_wake_word(self, audio: sr.AudioData) -> bool:
+        """
+        Looks for the wake word offline. When verification is enabled, hits and near
+        misses are also handed to the speech recognizer in the background, only to count
+        false accepts and rejects, so waking up never waits for it or needs the network.
+
+        :param audio: The audio of the phrase.
+        :return: Whether the phrase holds the wake word.
+        """
+        result = self.wake_word_spotter.detect(self._samples(audio))
+        if self.verify_wake_word and (result.detected or result.near_miss):
+            threading.Thread(
+                target=self._verify_wake_word, args=(audio, result), daemon=True
+            ).start()
+        return result.detected
+
+    def _verify_wake_word(self, audio: sr.AudioData, result) -> None:
+        try:
+            phrase = self.stt_backend.transcribe(audio).lower()
+        except sr.UnknownValueError:
+            phrase = ""
+        except sr.RequestError as e:
+            print(f"Wake word not verified: {e}")
+            return
+        print(f"Heard: {phrase} (wake word score {result.score:.2f})")
+        self.wake_word_spotter.record_verification(result, self.wake_word in phrase)
+        if result.detected and phrase.strip() == self.wake_word:
+            self.enroll_wake_word(audio)
+
+    def enroll_wake_word(self, audio: sr.AudioData) -> None:
+        """
+        Adds a phrase holding only the wake word to the templates of the spotter.
+
+        :param audio: The audio of the phrase.
+        """
+        if (
+            self.wake_word_spotter is not None
+            and self.wake_word_spotter.template_count < MAX_AUTO_ENROLLED_TEMPLATES
+        ):
+            self.wake_word_spotter.enroll(self._samples(audio), save=True)
@@ -0,0 +1,276 @@
+"""This file implements an offline wake word spotter matching MFCC templates with DTW"""
+
+import glob
+import os
+import threading
+import wave
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Dict, List, Optional
+
+import numpy as np
+
+SAMPLE_RATE = 16000
+
+
+@lru_cache(maxsize=8)
+def mel_filterbank(num_filters: int, nfft: int, sample_rate: int) -> np.ndarray:
+    """
+    :return: The (num_filters, nfft // 2 + 1) triangular filters spaced on the mel scale.
+    """
+
+    def hz_to_mel(hz):
+        return 2595 * np.log10(1 + hz / 700)
+
+    def mel_to_hz(mel):
+        return 700 * (10 ** (mel / 2595) - 1)
+
+    mels = np.linspace(hz_to_mel(0), hz_to_mel(sample_rate / 2), num_filters + 2)
+    bins = np.floor((nfft + 1) * mel_to_hz(mels) / sample_rate).astype(int)
+    filters = np.zeros((num_filters, nfft // 2 + 1))
+    for index in range(1, num_filters + 1):
+        left, center, right = bins[index - 1], bins[index], bins[index + 1]
+        if center > left:
+            filters[index - 1, left:center] = (np.arange(left, center) - left) / (
+                center - left
+            )
+        if right > center:
+            filters[index - 1, center:right] = (right - np.arange(center, right)) / (
+                right - center
+            )
+    return filters
+
+
+def mfcc(
+    samples: np.ndarray,
+    sample_rate: int = SAMPLE_RATE,
+    num_coefficients: int = 13,
+    num_filters: int = 26,
+    frame_ms: int = 25,
+    hop_ms: int = 10,
+) -> np.ndarray:
+    """
+    Computes the mel-frequency cepstral coefficients of an audio signal. The first
+    coefficient, which only follows the loudness, is dropped.
+
+    :param samples: The int16 or float samples.
+    :param sample_rate: Samples per second.
+    :param num_coefficients: Coefficients computed per frame, including the dropped one.
+    :param num_filters: Mel filters.
+    :param frame_ms: Duration of each analysis frame.
+    :param hop_ms: Step between frames.
+    :return: A (frames, num_coefficients - 1) array.
+    """
+    signal = np.asarray(samples, dtype=np.float64)
+    signal = np.append(signal[:1], signal[1:] - 0.97 * signal[:-1])
+    frame_length = sample_rate * frame_ms // 1000
+    hop = sample_rate * hop_ms // 1000
+    if len(signal) < frame_length:
+        signal = np.pad(signal, (0, frame_length - len(signal)))
+    num_frames = 1 + (len(signal) - frame_length) // hop
+    indices = np.arange(frame_length)[None, :] + hop * np.arange(num_frames)[:, None]
+    frames = signal[indices] * np.hamming(frame_length)
+
+    nfft = 1 << (frame_length - 1).bit_length()
+    power = np.abs(np.fft.rfft(frames, nfft)) ** 2 / nfft
+    energies = np.log(
+        np.maximum(power @ mel_filterbank(num_filters, nfft, sample_rate).T, 1e-10)
+    )
+    basis = np.cos(
+        np.pi
+        * np.arange(num_coefficients)[:, None]
+        * (2 * np.arange(num_filters) + 1)
+        / (2 * num_filters)
+    )
+    return (energies @ basis.T)[:, 1:]
+
+
+def subsequence_dtw(template: np.ndarray, query: np.ndarray) -> float:
+    """
+    Aligns a template with the best matching part of a longer query, i.e. the query may
+    hold anything before and after the wake word.
+
+    :param template: The (n, d) features of the wake word.
+    :param query: The (m, d) features of the audio.
+    :return: The alignment cost per template frame, lower is closer.
+    """
+    cost = np.sqrt(np.sum((template[:, None, :] - query[None, :, :]) ** 2, axis=-1))
+    accumulated = cost[0].copy()
+    for row in cost[1:]:
+        previous = accumulated
+        accumulated = np.empty_like(previous)
+        accumulated[0] = previous[0] + row[0]
+        diagonal_or_up = np.minimum(previous[1:], previous[:-1]) + row[1:]
+        for column in range(1, len(row)):
+            accumulated[column] = min(
+                diagonal_or_up[column - 1], accumulated[column - 1] + row[column]
+            )
+    return float(accumulated.min() / len(template))
+
+
+def read_wav(path: str) -> np.ndarray:
+    """
+    :param path: A 16-bit mono WAV file.
+    :return: Its int16 samples.
+    """
+    with wave.open(path, "rb") as wav_file:
+        return np.frombuffer(wav_file.readframes(wav_file.getnframes()), dtype=np.int16)
+
+
+def write_wav(path: str, samples: np.ndarray, sample_rate: int = SAMPLE_RATE) -> None:
+    with wave.open(path, "wb") as wav_file:
+        wav_file.setnchannels(1)
+        wav_file.setsampwidth(2)
+        wav_file.setframerate(sample_rate)
+        wav_file.writeframes(np.asarray(samples, dtype=np.int16).tobytes())
+
+
+@dataclass(frozen=True)
+class WakeWordResult:
+    """
+    :param detected: Whether the score is under the threshold.
+    :param near_miss: Whether the score is over the threshold but within the verify margin.
+    :param score: The best DTW cost among the templates.
+    """
+
+    detected: bool
+    near_miss: bool
+    score: float
+
+
+class WakeWordSpotter:
+    """
+    Spots the wake word on the device, by aligning the MFCCs of each utterance with
+    recorded templates of the wake word, so the room audio is never sent to the cloud
+    recognizer unless the wake word was likely spoken.
+
+    Hits can be verified by the full speech recognizer, which counts false accepts, and
+    near misses, scoring just above the threshold, are verified too, which counts false
+    rejects.
+    """
+
+    def __init__(
+        self,
+        templates: Optional[List[np.ndarray]] = None,
+        threshold: float = 8.0,
+        verify_margin: float = 1.5,
+        sample_rate: int = SAMPLE_RATE,
+        search_seconds: float = 2.0,
+        directory: Optional[str] = None,
+        min_templates: int = 1,
+    ):
+        """
+        :param templates: int16 recordings of the wake word alone.
+        :param threshold: Maximum DTW cost of a detection, lower is stricter.
+        :param verify_margin: Scores up to threshold + verify_margin are near misses.
+        :param sample_rate: Samples per second of the templates and the audio.
+        :param search_seconds: Only the beginning of each utterance is searched.
+        :param directory: Folder where enrolled templates are saved as WAV files.
+        :param min_templates: Templates needed before the spotter is ready, more of them
+            cover more voices and ways of saying the wake word.
+        """
+        self.threshold = threshold
+        self.verify_margin = verify_margin
+        self.sample_rate = sample_rate
+        self.search_seconds = search_seconds
+        self.directory = directory
+        self.min_templates = min_templates
+        self.__features: List[np.ndarray] = list()
+        self.__lock = threading.Lock()
+        self.__stats = {
+            "detections": 0,
+            "rejections": 0,
+            "near_misses": 0,
+            "false_accepts": 0,
+            "false_rejects": 0,
+        }
+        for template in templates or []:
+            self.enroll(template)
+
+    @classmethod
+    def from_directory(cls, directory: str, **kwargs) -> "WakeWordSpotter":
+        """
+        :param directory: Folder holding the templates as 16-bit mono WAV files.
+        :return: A spotter with every template of the folder, none if it does not exist.
+        """
+        paths = sorted(glob.glob(os.path.join(directory, "*.wav")))
+        return cls([read_wav(path) for path in paths], directory=directory, **kwargs)
+
+    @property
+    def ready(self) -> bool:
+        """
+        :return: Whether at least min_templates templates were enrolled.
+        """
+        return len(self.__features) >= max(self.min_templates, 1)
+
+    @property
+    def template_count(self) -> int:
+        return len(self.__features)
+
+    @property
+    def stats(self) -> Dict[str, int]:
+        """
+        :return: Detections, rejections, near misses, false accepts and false rejects.
+        """
+        with self.__lock:
+            return dict(self.__stats)
+
+    def enroll(self, samples: np.ndarray, save: bool = False) -> None:
+        """
+        Adds a recording of the wake word alone as a template.
+
+        :param samples: The int16 samples.
+        :param save: Whether to also write the template into the directory.
+        """
+        samples = np.asarray(samples, dtype=np.int16)
+        features = mfcc(samples, self.sample_rate)
+        with self.__lock:
+            self.__features.append(features)
+            index = len(self.__features) - 1
+        if save and self.directory is not None:
+            os.makedirs(self.directory, exist_ok=True)
+            write_wav(
+                os.path.join(self.directory, f"template_{index:03d}.wav"),
+                samples,
+                self.sample_rate,
+            )
+
+    def score(self, samples: np.ndarray) -> float:
+        """
+        :param samples: The int16 samples of an utterance.
+        :return: The best DTW cost of any template within the beginning of the utterance.
+        """
+        features = mfcc(
+            samples[: int(self.search_seconds * self.sample_rate)], self.sample_rate
+        )
+        return min(subsequence_dtw(template, features) for template in self.__features)
+
+    def detect(self, samples: np.ndarray) -> WakeWordResult:
+        """
+        :param samples: The int16 samples of an utterance.
+        :return: Whether the utterance starts with the wake word.
+        :raises ValueError: If no template was enrolled.
+        """
+        if not self.ready:
+            raise ValueError("no wake word template enrolled")
+        score = self.score(samples)
+        detected = score <= self.threshold
+        near_miss = not detected and score <= self.threshold + self.verify_margin
+        with self.__lock:
+            self.__stats["detections" if detected else "rejections"] += 1
+            self.__stats["near_misses"] += near_miss
+        return WakeWordResult(detected, near_miss, score)
+
+    def record_verification(self, result: WakeWordResult, confirmed: bool) -> None:
+        """
+        Counts the outcome of verifying a detection or a near miss with the full
+        speech recognizer.
+
+        :param result: The result of detect.
+        :param confirmed: Whether the transcript holds the wake word.
+        """
+        with self.__lock:
+            if result.detected and not confirmed:
+                self.__stats["false_accepts"] += 1
+            elif not result.detected and confirmed:
+                self.__stats["false_rejects"] += 1